@@ -0,0 +1,75 @@
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.transform import cleansing
+from src.utils.helpers import generate_unified_id, parse_date, standardize_phone, validate_email
+
+
+def sample_patients(rows: int, seed: int = 42) -> pd.DataFrame:
+    raw = pd.concat([
+        pd.read_csv("data/raw/hospital-a/patients.csv", dtype=str),
+        pd.read_csv("data/raw/hospital-b/patients.csv", dtype=str).rename(
+            columns={"F_Name": "FirstName", "L_Name": "LastName"}
+        )
+    ], ignore_index=True)
+    idx = np.random.default_rng(seed).integers(0, len(raw), rows)
+    df = raw.iloc[idx][["FirstName", "LastName", "PhoneNumber", "DOB"]].reset_index(drop=True)
+    df["Email"] = df["FirstName"].str.lower() + "." + df["LastName"].str.lower() + "@example.com"
+    return df
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def run(rows: int, scalar_rows: int):
+    df = sample_patients(rows)
+    scalar = df.head(scalar_rows)
+    dob = pd.to_datetime(df["DOB"], format="%Y-%m-%d", errors="coerce")
+    scalar_dob = dob.head(scalar_rows)
+
+    cases = {
+        "phone": (
+            lambda: scalar["PhoneNumber"].map(standardize_phone),
+            lambda: cleansing.normalize_phone(df["PhoneNumber"])
+        ),
+        "email": (
+            lambda: scalar["Email"].map(validate_email),
+            lambda: cleansing.validate_email(df["Email"])
+        ),
+        "dates": (
+            lambda: scalar["DOB"].map(parse_date),
+            lambda: cleansing.parse_dates(df["DOB"])
+        ),
+        "age": (
+            lambda: scalar_dob.apply(lambda x: int((pd.Timestamp.now() - x).days // 365.25) if pd.notnull(x) else None),
+            lambda: cleansing.compute_age(dob)
+        ),
+        "identity_key": (
+            lambda: [generate_unified_id(f, l, d) for f, l, d in zip(scalar["FirstName"], scalar["LastName"], scalar["DOB"])],
+            lambda: cleansing.identity_key(df["FirstName"], df["LastName"], dob)
+        )
+    }
+
+    print(f"{'case':<14}{'row-wise s/1M':>16}{'vectorized s/1M':>18}{'speedup':>10}")
+    for name, (row_wise, vectorized) in cases.items():
+        row_per_million = timed(row_wise) * 1_000_000 / scalar_rows
+        vec_per_million = timed(vectorized) * 1_000_000 / rows
+        print(f"{name:<14}{row_per_million:>16.2f}{vec_per_million:>18.2f}{row_per_million / vec_per_million:>9.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Row-wise helpers vs. vectorized cleansing, normalized per million rows")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--scalar-rows", type=int, default=100_000,
+                        help="rows timed for the row-wise helpers (extrapolated to 1M)")
+    args = parser.parse_args()
+    run(args.rows, min(args.scalar_rows, args.rows))
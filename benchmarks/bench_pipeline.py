@@ -0,0 +1,156 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+import pytest
+from conftest import OUTPUT_DIRS, ROOT
+
+from src.analytics.ar_aging import ARAnalytics
+from src.analytics.rcm_analytics import RCMAnalytics
+from src.extract.extractor import Extractor
+from src.load.loader import Loader
+from src.models.dimensional_model import DimensionalModel
+from src.models.reconciliation import ClaimReconciler
+from src.transform.identity import IdentityResolver
+from src.transform.transformer import Transformer
+from src.utils.profiling import count_rows
+from src.utils.storage import LayerStore
+
+PIPELINE_ENV = {
+    "HOSPITALS_CONFIG": "data/raw/hospitals.json",
+    "USE_MYSQL": "false",
+    "INCREMENTAL_EXTRACT": "false",
+    "INCREMENTAL_LOAD": "false",
+    "LOAD_BACKEND": "sqlite",
+    "ANALYTICS_BACKEND": "local",
+    "PIPELINE_CACHE": "false"
+}
+
+
+@pytest.fixture(scope="module")
+def state(workdir):
+    with pytest.MonkeyPatch.context() as mp:
+        for key, value in PIPELINE_ENV.items():
+            mp.setenv(key, value)
+        yield {"store": LayerStore()}
+
+
+def require(state, key):
+    if key not in state:
+        pytest.skip(f"upstream stage did not produce '{key}'")
+    return state[key]
+
+
+def test_extract(bench, state):
+    store = state["store"]
+    with bench.measure("extract") as metrics:
+        extractor = Extractor()
+        bronze = extractor.run()
+        extractor.close()
+        for key, df in bronze.items():
+            store.write("bronze", key, df)
+        metrics["rows"] = count_rows(bronze)
+    assert len(bronze["transactions"]) > 0 and len(bronze["claims"]) > 0
+    state["bronze"] = bronze
+
+
+def test_transform(bench, state):
+    bronze = require(state, "bronze")
+    store = state["store"]
+    with bench.measure("transform") as metrics:
+        silver = Transformer().run(bronze)
+        for key, df in silver.items():
+            store.write("silver", f"{key}_cleaned", df)
+        metrics["rows"] = count_rows(silver)
+    assert len(silver["transactions"]) > 0
+    state["silver"] = silver
+    del state["bronze"]
+
+
+def test_identity(bench, state):
+    silver = require(state, "silver")
+    with bench.measure("identity") as metrics:
+        identity = IdentityResolver().resolve(silver["patients"])
+        state["store"].write("silver", "patient_identity", identity)
+        metrics["rows"] = len(identity)
+    assert identity["enterprise_patient_id"].notna().all()
+    silver["patient_identity"] = identity
+
+
+def test_model(bench, state):
+    silver = require(state, "silver")
+    store = state["store"]
+    with bench.measure("model") as metrics:
+        model = DimensionalModel(store=store)
+        gold = model.run(silver)
+        for key, df in gold.items():
+            if key not in model.persisted:
+                store.write("gold", key, df)
+        metrics["rows"] = count_rows(gold)
+    assert len(gold["fact_transactions"]) > 0
+    state["gold"] = list(gold)
+    del state["silver"]
+
+
+def test_reconciliation(bench, state):
+    require(state, "gold")
+    with bench.measure("reconciliation") as metrics:
+        summary = ClaimReconciler(state["store"]).run()
+        metrics["rows"] = int(summary["rows"].sum())
+    assert not summary.empty
+
+
+def test_load(bench, state):
+    gold = require(state, "gold")
+    store = state["store"]
+    tables = {f"{key}_cleaned": (lambda key=key: store.read("silver", f"{key}_cleaned"))
+              for key in ["patients", "transactions", "claims", "providers", "cptcodes"]}
+    for key in gold:
+        tables[key] = lambda key=key: store.read("gold", key)
+
+    with bench.measure("load") as metrics:
+        loader = Loader(backend="sqlite")
+        loader.load_tables(tables)
+        metrics["rows"] = sum(entry["rows"] for entry in loader.load_report)
+    assert len(loader.load_report) == len(tables)
+
+
+def test_analytics(bench, state):
+    require(state, "gold")
+    with bench.measure("analytics") as metrics:
+        kpis = RCMAnalytics(backend="local", store=state["store"]).run_analytics()
+        metrics["rows"] = count_rows(kpis)
+    assert kpis
+
+
+def test_ar_aging(bench, state):
+    require(state, "gold")
+    with bench.measure("ar_aging") as metrics:
+        results = ARAnalytics(store=state["store"], materialize=False).run()
+        metrics["rows"] = count_rows(results)
+    assert "agg_ar_summary" in results and "agg_claim_denials" in results
+
+
+def test_full_pipeline(bench, workdir):
+    # Runs main.py in a fresh interpreter so the measured peak covers the whole run and nothing is shared.
+    for name in OUTPUT_DIRS:
+        shutil.rmtree(os.path.join(workdir, name), ignore_errors=True)
+    env = {**os.environ, **PIPELINE_ENV, "RUN_REPORT_PATH": "logs/run_report.json"}
+
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, os.path.join(ROOT, "main.py")], cwd=workdir, env=env,
+                               capture_output=True, text=True)
+    seconds = time.perf_counter() - start
+    assert completed.returncode == 0, completed.stderr[-4000:]
+
+    with open(os.path.join(workdir, "logs", "run_report.json")) as f:
+        report = json.load(f)
+    extracted = sum(s["rows_out"] or 0 for s in report["stages"] if s["stage"] == "extract" and s["table"] is None)
+    bench.record("pipeline", wall_seconds=round(seconds, 4), cpu_seconds=None, peak_rss_mb=report["peak_rss_mb"],
+                 worker_peak_rss_mb=report.get("worker_peak_rss_mb"), rss_growth_mb=None, rows=extracted or None,
+                 rows_per_sec=round(extracted / seconds) if extracted else None)
+    for task in report["tasks"]:
+        bench.record(f"pipeline.{task['task']}", wall_seconds=task["seconds"], cpu_seconds=None,
+                     peak_rss_mb=None, rss_growth_mb=None, rows=None, rows_per_sec=None)
@@ -0,0 +1,227 @@
+import json
+import os
+import platform
+import shutil
+import sys
+import threading
+import time
+from contextlib import contextmanager
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.utils.profiling import rss_mb
+from src.utils.synthetic_data import SyntheticDataGenerator
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BENCH_DIR, ".data")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+HISTORY_PATH = os.path.join(RESULTS_DIR, "history.jsonl")
+LATEST_PATH = os.path.join(RESULTS_DIR, "latest.json")
+BASELINE_PATH = os.path.join(RESULTS_DIR, "baseline.json")
+OUTPUT_DIRS = ["data/bronze", "data/silver", "data/gold", "data/cache", "data/state", "data/warehouse", "logs"]
+METRICS = {"wall_seconds": 0.05, "peak_rss_mb": 16}
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("benchmarks")
+    group.addoption("--bench-scales", default=os.getenv("BENCH_SCALES", "1,10"),
+                    help="comma separated data scales relative to the sample data (default 1,10)")
+    group.addoption("--bench-hospitals", type=int, default=int(os.getenv("BENCH_HOSPITALS", 2)),
+                    help="number of synthetic hospitals (default 2)")
+    group.addoption("--bench-seed", type=int, default=42)
+    group.addoption("--bench-tolerance", type=float, default=float(os.getenv("BENCH_TOLERANCE", 0.25)),
+                    help="relative slowdown or memory growth reported as a regression (default 0.25)")
+    group.addoption("--bench-save-baseline", action="store_true",
+                    help="store this run as the baseline later runs are compared with")
+    group.addoption("--bench-fail-on-regression", action="store_true",
+                    help="exit non-zero when a regression is found")
+
+
+def pytest_generate_tests(metafunc):
+    if "scale" in metafunc.fixturenames:
+        scales = [float(s) for s in metafunc.config.getoption("bench_scales").split(",") if s.strip()]
+        metafunc.parametrize("scale", scales, ids=[f"{s:g}x" for s in scales], scope="module")
+
+
+def pytest_configure(config):
+    config.bench_results = []
+
+
+class RSSSampler(threading.Thread):
+    # ru_maxrss never drops, so per-stage peaks come from sampling current RSS.
+    def __init__(self, interval=0.02):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = rss_mb() or 0.0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.peak = max(self.peak, rss_mb() or 0.0)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.peak = max(self.peak, rss_mb() or 0.0)
+        return self.peak
+
+
+class BenchRecorder:
+    def __init__(self, config, scale, hospitals):
+        self.config = config
+        self.scale = scale
+        self.hospitals = hospitals
+
+    def record(self, stage, **metrics):
+        result = {"stage": stage, "scale": self.scale, "hospitals": self.hospitals, **metrics}
+        self.config.bench_results.append(result)
+        return result
+
+    @contextmanager
+    def measure(self, stage):
+        metrics = {"rows": None}
+        start_rss = rss_mb() or 0.0
+        sampler = RSSSampler()
+        sampler.start()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield metrics
+        finally:
+            wall_seconds = time.perf_counter() - wall
+            cpu_seconds = time.process_time() - cpu
+            peak = sampler.stop()
+        self.record(
+            stage,
+            wall_seconds=round(wall_seconds, 4),
+            cpu_seconds=round(cpu_seconds, 4),
+            peak_rss_mb=round(peak, 1),
+            rss_growth_mb=round(peak - start_rss, 1),
+            rows=metrics["rows"],
+            rows_per_sec=round(metrics["rows"] / wall_seconds) if metrics["rows"] and wall_seconds > 0 else None
+        )
+
+
+def generate_data(workdir, scale, hospitals, seed):
+    raw_dir = os.path.join(workdir, "data", "raw")
+    marker = os.path.join(raw_dir, ".generated.json")
+    params = {"scale": scale, "hospitals": hospitals, "seed": seed}
+    if os.path.exists(marker) and os.path.exists(os.path.join(raw_dir, "hospitals.json")):
+        with open(marker) as f:
+            if json.load(f) == params:
+                return raw_dir
+    shutil.rmtree(raw_dir, ignore_errors=True)
+    SyntheticDataGenerator(output_dir=raw_dir, scale=scale, hospitals=hospitals, seed=seed).generate()
+    with open(marker, "w") as f:
+        json.dump(params, f)
+    return raw_dir
+
+
+@pytest.fixture(scope="module")
+def workdir(request, scale):
+    # Generated data is kept between sessions; pipeline outputs are cleared so every stage starts cold.
+    config = request.config
+    hospitals = config.getoption("bench_hospitals")
+    path = os.path.join(DATA_DIR, f"scale_{scale:g}_h{hospitals}")
+    generate_data(path, scale, hospitals, config.getoption("bench_seed"))
+    for name in OUTPUT_DIRS:
+        shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield path
+    finally:
+        os.chdir(previous)
+
+
+@pytest.fixture(scope="module")
+def bench(request, scale):
+    return BenchRecorder(request.config, scale, request.config.getoption("bench_hospitals"))
+
+
+def result_key(result):
+    return f"{result['stage']}@{result['scale']:g}x/h{result['hospitals']}"
+
+
+def load_reference():
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            return "baseline", json.load(f)
+    if os.path.exists(HISTORY_PATH):
+        with open(HISTORY_PATH) as f:
+            lines = [line for line in f if line.strip()]
+        if lines:
+            return "previous run", json.loads(lines[-1])
+    return None, None
+
+
+def compare(results, reference, tolerance):
+    previous = {result_key(r): r for r in reference["results"]}
+    regressions = []
+    for result in results:
+        before = previous.get(result_key(result))
+        if before is None:
+            continue
+        for metric, floor in METRICS.items():
+            old, new = before.get(metric), result.get(metric)
+            # Small absolute changes are noise at low scales, whatever their ratio.
+            if old and new and new > old * (1 + tolerance) and new - old > floor:
+                regressions.append({"key": result_key(result), "metric": metric, "before": old, "after": new,
+                                    "change": round(new / old - 1, 3)})
+    return regressions
+
+
+def pytest_sessionfinish(session, exitstatus):
+    config = session.config
+    if not getattr(config, "bench_results", None):
+        return
+    run = {
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "results": config.bench_results
+    }
+    label, reference = load_reference()
+    config.bench_reference = label
+    config.bench_regressions = compare(run["results"], reference, config.getoption("bench_tolerance")) if reference else []
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(HISTORY_PATH, "a") as f:
+        f.write(json.dumps(run) + "\n")
+    with open(LATEST_PATH, "w") as f:
+        json.dump(run, f, indent=2)
+    if config.getoption("bench_save_baseline"):
+        shutil.copyfile(LATEST_PATH, BASELINE_PATH)
+
+    if config.bench_regressions and config.getoption("bench_fail_on_regression") and exitstatus == 0:
+        session.exitstatus = 1
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    results = getattr(config, "bench_results", None)
+    if not results:
+        return
+    write = terminalreporter.write_line
+    terminalreporter.section("pipeline benchmarks")
+    width = max(len(result_key(r)) for r in results) + 2
+    columns = [("wall_seconds", "wall s", "{:.2f}"), ("cpu_seconds", "cpu s", "{:.2f}"), ("peak_rss_mb", "peak MB", "{:.0f}"),
+               ("rows", "rows", "{}"), ("rows_per_sec", "rows/s", "{}")]
+    write(f"{'stage':<{width}}" + "".join(f"{label:>10}" for _, label, _ in columns))
+    for result in results:
+        cells = [fmt.format(result[key]) if result.get(key) is not None else "-" for key, _, fmt in columns]
+        write(f"{result_key(result):<{width}}" + "".join(f"{cell:>10}" for cell in cells))
+
+    reference = getattr(config, "bench_reference", None)
+    if reference is None:
+        write(f"No earlier results to compare with; saved to {LATEST_PATH}")
+        return
+    regressions = getattr(config, "bench_regressions", [])
+    if not regressions:
+        write(f"No regressions against the {reference} (tolerance {config.getoption('bench_tolerance'):.0%})")
+        return
+    write(f"{len(regressions)} regressions against the {reference}:", red=True)
+    for r in regressions:
+        write(f"  {r['key']} {r['metric']}: {r['before']} -> {r['after']} (+{r['change']:.0%})", red=True)
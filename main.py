@@ -1,70 +1,135 @@
 import os
 from src.extract.extractor import Extractor
-from src.transform.transformer import Transformer
 from src.load.loader import Loader
 from src.utils.logger import init_logger
 from src.models.dimensional_model import DimensionalModel
-from src.utils.generate_schema_summary import generate_schema_summary
+from src.models.reconciliation import ClaimReconciler
+from src.utils.generate_schema_summary import generate_schema_summary, schema_rows
+from src.utils.storage import LayerStore
+from src.transform.identity import IDENTITY_COLUMNS, IdentityResolver
 from src.analytics.rcm_analytics import RCMAnalytics
+from src.analytics.ar_aging import AR_TABLES, ARAnalytics
+from src.utils.dag import DAG
+from src.utils.shards import ShardPool
+from src.utils.profiling import profiler
 
 logger = init_logger()
 
+SCHEMA_SUMMARY_PATH = "data/schema_summary.csv"
+SILVER_TABLES = ["patients", "transactions", "claims", "providers", "cptcodes"]
+GOLD_TABLES = [
+    "dim_patients_scd", "dim_providers", "dim_procedures", "dim_date",
+    "fact_transactions", "fact_claims", "agg_daily_revenue", "agg_monthly_payor_revenue",
+    "agg_daily_claims", "agg_daily_patients"
+]
+RECONCILIATION_TABLE = "fact_claim_reconciliation"
+
 def ensure_directories():
     os.makedirs("data/bronze", exist_ok=True)
     os.makedirs("data/silver", exist_ok=True)
     os.makedirs("data/gold", exist_ok=True)
 
+def extract_reference(extractor, store):
+    cptcodes = extractor.extract_cptcodes()
+    store.write("bronze", "cptcodes", cptcodes)
+    path = store.write("silver", "cptcodes_cleaned", cptcodes)
+    logger.info(f"Saved Silver table: {path}")
+    return cptcodes
+
+def resolve_identity(store):
+    # Runs centrally: matching patients across hospitals needs every shard's silver patients.
+    def run(*shards):
+        identity = IdentityResolver().resolve(store.read("silver", "patients_cleaned", columns=IDENTITY_COLUMNS))
+        path = store.write("silver", "patient_identity", identity)
+        logger.info(f"Saved Silver table: {path}")
+        return identity
+    return run
+
+def build_gold(store):
+    # Shards only pass their table fingerprints; the merged silver tables are read back from the store.
+    # Likewise the gold tables stay in the store and the task only returns their columns, dtypes and row counts.
+    def run(cptcodes, patient_identity, *shards):
+        model = DimensionalModel(store=store)
+        dims_facts = model.run({
+            "patients": store.read("silver", "patients_cleaned"),
+            "transactions": store.read("silver", "transactions_cleaned"),
+            "claims": store.read("silver", "claims_cleaned"),
+            "providers": store.read("silver", "providers_cleaned"),
+            "cptcodes": cptcodes,
+            "patient_identity": patient_identity
+        })
+
+        for key, df in dims_facts.items():
+            if key in model.persisted:
+                logger.info(f"Updated Gold table in place: {store.path('gold', key)} ({len(df)} changed rows)")
+                continue
+            path = store.write("gold", key, df)
+            logger.info(f"Saved Gold table: {path}")
+        return schema_rows(dims_facts)
+    return run
+
+def load_warehouse(store, gold_tables):
+    def run():
+        tables = {f"{key}_cleaned": (lambda key=key: store.read("silver", f"{key}_cleaned")) for key in SILVER_TABLES}
+        for key in gold_tables:
+            tables[key] = lambda key=key: store.read("gold", key)
+        Loader().load_tables(tables)
+    return run
+
+def commit_watermarks(extractor):
+    def run(*shard_watermarks):
+        for marks in shard_watermarks:
+            for row in marks.itertuples(index=False):
+                extractor.watermarks.stage(row.source, row.table, row.value)
+        extractor.watermarks.commit()
+    return run
+
+def build_pipeline(store, extractor, shards) -> DAG:
+    hospitals = [extractor.sources[key] for key in extractor.hospitals]
+    # Every shard task only waits on its process, so keep a thread free for each hospital.
+    dag = DAG(max_workers=max(int(os.getenv("PIPELINE_WORKERS", 4)), len(hospitals) + 1))
+
+    dag.task("cptcodes", lambda: extract_reference(extractor, store), cache=False)
+    shard_tasks = [f"shard_{hospital['key']}" for hospital in hospitals]
+    for name, hospital in zip(shard_tasks, hospitals):
+        dag.task(name, shards.task(hospital), cache=False)
+
+    shard_tables = [f"{name}:tables" for name in shard_tasks]
+    silver = ["cptcodes"] + shard_tables
+    ar_materialize = os.getenv("AR_MATERIALIZE", "false").lower() == "true"
+    ar_tables = AR_TABLES if ar_materialize else []
+    dag.task("identity", resolve_identity(store), shard_tables, valid=lambda: store.exists("silver", "patient_identity"))
+    dag.task("model", build_gold(store), ["cptcodes", "identity"] + shard_tables,
+             valid=lambda: all(store.exists("gold", key) for key in GOLD_TABLES))
+    dag.task("schema_summary", lambda schema: generate_schema_summary(schema, output_path=SCHEMA_SUMMARY_PATH),
+             ["model"], valid=lambda: os.path.exists(SCHEMA_SUMMARY_PATH))
+    dag.task("reconciliation", lambda *shards: ClaimReconciler(store).run(), shard_tables,
+             valid=lambda: store.exists("gold", RECONCILIATION_TABLE))
+    dag.task("ar_aging", lambda: ARAnalytics(store=store, materialize=ar_materialize).run(), after=["model"], cache=False)
+    dag.task("load", load_warehouse(store, GOLD_TABLES + [RECONCILIATION_TABLE] + ar_tables),
+             after=silver + ["model", "reconciliation"] + (["ar_aging"] if ar_materialize else []))
+    dag.task("analytics", lambda: RCMAnalytics(store=store).run_analytics(), after=["model"], cache=False)
+    dag.task("commit_watermarks", commit_watermarks(extractor), [f"{name}:watermarks" for name in shard_tasks],
+             after=["load", "analytics", "ar_aging"], cache=False)
+    return dag
+
 def main():
     logger.info("ETL Pipeline started")
     ensure_directories()
 
+    store = LayerStore()
     extractor = Extractor()
-    data_dict = extractor.run()
-
-    for key, df in data_dict.items():
-        df.to_csv(f"data/bronze/{key}.csv", index=False)
-        logger.info(f"Saved Bronze CSV: data/bronze/{key}.csv")
-
-    transformer = Transformer()
-    clean_data = transformer.run(data_dict)
-
-    for key, df in clean_data.items():
-        cleaned_name = f"{key}_cleaned"
-        df.to_csv(f"data/silver/{cleaned_name}.csv", index=False)
-        logger.info(f"Saved Silver CSV: data/silver/{cleaned_name}.csv")
-
-    model = DimensionalModel()
-    dims_facts = model.run(clean_data)
-
-    for key, df in dims_facts.items():
-        df.to_csv(f"data/gold/{key}.csv", index=False)
-        logger.info(f"Saved Gold CSV: data/gold/{key}.csv")
-
-    loader = Loader()
-
-    for key, df in clean_data.items():
-        cleaned_name = f"{key}_cleaned"
-        loader.load_table(df, cleaned_name)
-
-    for key, df in dims_facts.items():
-        partition_field = None
-        cluster_fields = None
-
-        if key == "fact_transactions":
-            partition_field = "transaction_date"
-            cluster_fields = ["unified_patient_id"]
-        elif key == "fact_claims":
-            partition_field = "claim_date"
-
-        loader.load_table(df, key, partition_field=partition_field, cluster_fields=cluster_fields)
-
-    generate_schema_summary(dims_facts, output_path="data/schema_summary.csv")
-    logger.info("Schema summary saved to data/schema_summary.csv")
-
-    analytics = RCMAnalytics()
-    analytics.run_analytics()
+    shards = ShardPool()
+    dag = build_pipeline(store, extractor, shards)
+    try:
+        dag.run()
+    finally:
+        shards.close()
+        profiler.log_summary()
+        path = profiler.write_report(extra={"tasks": dag.report})
+        logger.info(f"Run report saved to {path}")
 
     logger.info("ETL Pipeline completed successfully")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,302 @@
+import os
+import numpy as np
+import pandas as pd
+from src.analytics.kpi_engine import LocalKPIEngine
+from src.models.schema_definitions import apply_schema, column_names, concat_frames
+from src.utils.logger import get_logger
+from src.utils.profiling import profiler
+
+logger = get_logger(__name__)
+
+DIMENSIONS = ["source_db", "payorid", "deptid", "providerid"]
+TRANSACTION_COLUMNS = ["servicedate", "paiddate", "amount", "paidamount"]
+CLAIM_COLUMNS = ["servicedate", "claim_date", "claimstatus", "claimamount"]
+AR_TABLES = ["agg_ar_summary", "agg_ar_aging", "agg_claim_denials", "agg_collection_rolling"]
+AGING_BUCKETS = ["0-30", "31-60", "61-90", "90+"]
+AGING_EDGES = [30, 60, 90]
+ROLLING_WINDOWS = [30, 90]
+DENIED_STATUSES = ["Denied"]
+# Days in AR divides the open balance by the average daily charges over this many days.
+CHARGE_DAYS = 90
+DAY_NS = 86_400_000_000_000
+
+
+def day_numbers(dates: pd.Series) -> np.ndarray:
+    # Whole days since the epoch as floats, so missing dates stay NaN through the arithmetic.
+    values = dates.to_numpy(dtype="datetime64[ns]")
+    days = values.astype("datetime64[D]").astype(np.int64).astype(float)
+    days[np.isnat(values)] = np.nan
+    return days
+
+
+def parse_groupings(value: str) -> list:
+    # "source_db;source_db,payorid" -> [["source_db"], ["source_db", "payorid"]]
+    return [[col.strip() for col in grouping.split(",") if col.strip()] for grouping in value.split(";") if grouping.strip()]
+
+
+def group_codes(df: pd.DataFrame, columns: list):
+    # Dense code per distinct combination of values (missing values group together), and the
+    # combinations themselves in code order.
+    combined, span = np.zeros(len(df), dtype=np.int64), 1
+    for col in columns:
+        codes, uniques = pd.factorize(df[col], use_na_sentinel=False)
+        size = max(len(uniques), 1)
+        if span * size >= 2 ** 62:
+            combined = pd.factorize(combined)[0]
+            span = int(combined.max()) + 1
+        combined, span = combined * size + codes, span * size
+    codes = pd.factorize(combined)[0]
+    first = pd.Series(codes).drop_duplicates().index.to_numpy()
+    return codes, df[columns].iloc[first].reset_index(drop=True)
+
+
+def group_sum(codes: np.ndarray, values, groups: int) -> np.ndarray:
+    return np.bincount(codes, weights=values, minlength=groups)
+
+
+def ratio(numerator: np.ndarray, denominator: np.ndarray, scale=1.0) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator > 0, numerator * scale / denominator, np.nan)
+
+
+class ARAnalytics:
+    def __init__(self, store=None, frames=None, groupings=None, as_of=None, materialize=None):
+        self.store = store
+        self.source = LocalKPIEngine(store=store, frames=frames)
+        self.groupings = groupings or parse_groupings(os.getenv("AR_GROUPINGS", ";".join(DIMENSIONS)))
+        as_of = as_of or os.getenv("AR_AS_OF")
+        self.as_of = pd.Timestamp(as_of) if as_of else None
+        self.materialize = materialize if materialize is not None else os.getenv("AR_MATERIALIZE", "false").lower() == "true"
+
+    def load(self, table, columns):
+        dimensions = list(dict.fromkeys(col for grouping in self.groupings for col in grouping))
+        df = self.source.load(table, dimensions + columns)
+        if df is None or df.empty:
+            return None
+        missing = [col for col in columns if col not in df.columns]
+        if missing:
+            logger.warning(f"Skipping {table} AR metrics, columns missing: {missing}")
+            return None
+        return df
+
+    def groups(self, df: pd.DataFrame):
+        for grouping in self.groupings:
+            columns = [col for col in grouping if col in df.columns]
+            if not columns:
+                continue
+            codes, keys = group_codes(df, columns)
+            keys.insert(0, "grouping", ",".join(columns))
+            yield codes, keys
+
+    def ledger(self, df: pd.DataFrame) -> dict:
+        # Per-row AR state, worked out once and shared by every grouping.
+        service, paid_on = day_numbers(df["servicedate"]), day_numbers(df["paiddate"])
+        amount = df["amount"].fillna(0).to_numpy(dtype=float)
+        paid = df["paidamount"].fillna(0).to_numpy(dtype=float)
+        known = np.r_[service, paid_on]
+        known = known[~np.isnan(known)]
+        if self.as_of is not None:
+            as_of = float(self.as_of.normalize().value // DAY_NS)
+        elif len(known):
+            as_of = float(known.max())
+        else:
+            logger.warning("No transaction has a service or paid date, reporting AR as of today")
+            as_of = float(pd.Timestamp.today().normalize().value // DAY_NS)
+
+        # Point-in-time AR: charges billed by the as-of date, less what was paid by then.
+        billed = service <= as_of
+        settled = billed & (paid_on <= as_of)
+        balance = np.where(billed, np.clip(amount - np.where(settled, paid, 0.0), 0.0, None), 0.0)
+        lag = paid_on - service
+        timely = settled & (lag >= 0)
+        backdated = int((lag < 0).sum())
+        if backdated:
+            logger.warning(f"{backdated} transactions were paid before their service date; they are left out of days to payment")
+        open_items = np.flatnonzero(balance > 0.005)
+
+        # Rolling windows work on day offsets padded by the longest window, see collections().
+        charged, dated = np.flatnonzero(~np.isnan(service)), np.flatnonzero(~np.isnan(paid_on))
+        days = np.r_[service[charged], paid_on[dated]]
+        pad = max(ROLLING_WINDOWS)
+        first_day = int(days.min()) if len(days) else 0
+        return {
+            "as_of_date": pd.Timestamp(int(as_of), unit="D"),
+            "billed": billed,
+            "timely": timely,
+            "charges": np.where(billed, amount, 0.0),
+            "payments": np.where(settled, paid, 0.0),
+            "recent_charges": np.where(billed & (service > as_of - CHARGE_DAYS), amount, 0.0),
+            "balance": balance,
+            "payment_days": np.where(timely, lag, 0.0),
+            "open": open_items,
+            "bucket": np.searchsorted(AGING_EDGES, as_of - service[open_items], side="left"),
+            "charged": charged,
+            "charge_day": service[charged].astype(np.int64) - first_day + pad,
+            "charge_amount": amount[charged],
+            "dated": dated,
+            "payment_day": paid_on[dated].astype(np.int64) - first_day + pad,
+            "payment_amount": paid[dated],
+            "first_day": first_day,
+            "span": int(days.max()) - first_day + 1 + pad if len(days) else 0
+        }
+
+    def receivables(self, codes, keys, ledger):
+        groups = len(keys)
+        summary = keys.copy()
+        summary["as_of_date"] = ledger["as_of_date"]
+        summary["transactions"] = group_sum(codes, ledger["billed"], groups).astype(np.int64)
+        summary["paid_transactions"] = group_sum(codes, ledger["timely"], groups).astype(np.int64)
+        summary["charges"] = group_sum(codes, ledger["charges"], groups)
+        summary["payments"] = group_sum(codes, ledger["payments"], groups)
+        summary["ar_balance"] = group_sum(codes, ledger["balance"], groups)
+        summary["avg_daily_charges"] = group_sum(codes, ledger["recent_charges"], groups) / CHARGE_DAYS
+        summary["days_in_ar"] = ratio(summary["ar_balance"].to_numpy(), summary["avg_daily_charges"].to_numpy())
+        summary["avg_days_to_payment"] = ratio(group_sum(codes, ledger["payment_days"], groups),
+                                               summary["paid_transactions"].to_numpy())
+
+        open_items = ledger["open"]
+        cells = codes[open_items] * len(AGING_BUCKETS) + ledger["bucket"]
+        counts = np.bincount(cells, minlength=groups * len(AGING_BUCKETS))
+        balances = np.bincount(cells, weights=ledger["balance"][open_items], minlength=groups * len(AGING_BUCKETS))
+        present = np.flatnonzero(counts)
+        aging = keys.iloc[present // len(AGING_BUCKETS)].reset_index(drop=True)
+        aging["aging_bucket"] = pd.Categorical.from_codes(present % len(AGING_BUCKETS), categories=AGING_BUCKETS)
+        aging["as_of_date"] = ledger["as_of_date"]
+        aging["open_items"] = counts[present]
+        aging["open_balance"] = balances[present]
+        return summary, aging
+
+    def collections(self, codes, keys, ledger):
+        # Charges land on their service date and payments on their paid date. Each (group, day) pair is
+        # a slot in one sorted key space padded by the longest window, so a window start never crosses
+        # into the previous group and every rolling sum is a difference of running totals.
+        span = ledger["span"]
+        if not span:
+            return None
+        charge_slots = codes[ledger["charged"]] * span + ledger["charge_day"]
+        payment_slots = codes[ledger["dated"]] * span + ledger["payment_day"]
+        slot_count = len(keys) * span
+        if slot_count <= len(charge_slots) + len(payment_slots):
+            # Small enough to count every slot densely and keep the ones with activity.
+            used = np.bincount(charge_slots, minlength=slot_count) + np.bincount(payment_slots, minlength=slot_count)
+            slot_keys = np.flatnonzero(used)
+            daily_charges = np.bincount(charge_slots, weights=ledger["charge_amount"], minlength=slot_count)[slot_keys]
+            daily_payments = np.bincount(payment_slots, weights=ledger["payment_amount"], minlength=slot_count)[slot_keys]
+        else:
+            slots, slot_keys = pd.factorize(np.concatenate([charge_slots, payment_slots]))
+            order = np.argsort(slot_keys)
+            rank = np.empty_like(order)
+            rank[order] = np.arange(len(order))
+            slot_keys, slots = slot_keys[order], rank[slots]
+            daily_charges = np.bincount(slots[:len(charge_slots)], weights=ledger["charge_amount"], minlength=len(slot_keys))
+            daily_payments = np.bincount(slots[len(charge_slots):], weights=ledger["payment_amount"], minlength=len(slot_keys))
+
+        rolling = keys.iloc[slot_keys // span].reset_index(drop=True)
+        day = slot_keys % span - max(ROLLING_WINDOWS) + ledger["first_day"]
+        rolling["date"] = day.astype("datetime64[D]").astype("datetime64[ns]")
+        rolling["charges"] = daily_charges
+        rolling["payments"] = daily_payments
+        charge_totals, payment_totals = np.r_[0.0, np.cumsum(daily_charges)], np.r_[0.0, np.cumsum(daily_payments)]
+        end = np.arange(1, len(slot_keys) + 1)
+        for window in ROLLING_WINDOWS:
+            start = np.searchsorted(slot_keys, slot_keys - (window - 1), side="left")
+            window_charges = charge_totals[end] - charge_totals[start]
+            window_payments = payment_totals[end] - payment_totals[start]
+            rolling[f"charges_{window}d"] = window_charges
+            rolling[f"payments_{window}d"] = window_payments
+            rolling[f"collection_rate_{window}d"] = ratio(window_payments, window_charges, 100.0)
+        return rolling
+
+    def denials(self, codes, keys, claims):
+        groups = len(keys)
+        denied = claims["claimstatus"].isin(DENIED_STATUSES).to_numpy(dtype=bool)
+        amount = claims["claimamount"].fillna(0).to_numpy(dtype=float)
+        lag = day_numbers(claims["claim_date"]) - day_numbers(claims["servicedate"])
+        timely = lag >= 0
+
+        result = keys.copy()
+        result["claims"] = np.bincount(codes, minlength=groups)
+        result["denied_claims"] = group_sum(codes, denied, groups).astype(np.int64)
+        result["claimamount"] = group_sum(codes, amount, groups)
+        result["denied_amount"] = group_sum(codes, np.where(denied, amount, 0.0), groups)
+        result["denial_rate"] = ratio(result["denied_claims"].to_numpy(), result["claims"].to_numpy(), 100.0)
+        result["dated_claims"] = group_sum(codes, timely, groups).astype(np.int64)
+        result["avg_claim_lag_days"] = ratio(group_sum(codes, np.where(timely, lag, 0.0), groups), result["dated_claims"].to_numpy())
+        return result
+
+    def finish(self, frames: list, name: str) -> pd.DataFrame:
+        frames = [df for df in frames if df is not None]
+        if not frames:
+            return None
+        df = concat_frames(frames)
+        return apply_schema(df[[col for col in column_names("gold", name) if col in df.columns]], "gold", name)
+
+    def compute(self) -> dict:
+        results = {}
+        transactions = self.load("fact_transactions", TRANSACTION_COLUMNS)
+        if transactions is not None:
+            ledger = self.ledger(transactions)
+            summaries, agings, rollings = [], [], []
+            for codes, keys in self.groups(transactions):
+                summary, aging = self.receivables(codes, keys, ledger)
+                summaries.append(summary)
+                agings.append(aging)
+                rollings.append(self.collections(codes, keys, ledger))
+            results["agg_ar_summary"] = self.finish(summaries, "agg_ar_summary")
+            results["agg_ar_aging"] = self.finish(agings, "agg_ar_aging")
+            results["agg_collection_rolling"] = self.finish(rollings, "agg_collection_rolling")
+
+        claims = self.load("fact_claims", CLAIM_COLUMNS)
+        if claims is not None:
+            denials = [self.denials(codes, keys, claims) for codes, keys in self.groups(claims)]
+            results["agg_claim_denials"] = self.finish(denials, "agg_claim_denials")
+        return {name: df for name, df in results.items() if df is not None}
+
+    def log_summary(self, results: dict):
+        summary = results.get("agg_ar_summary")
+        if summary is not None and not summary.empty:
+            # Every grouping partitions the same rows, so any one of them adds up to the totals.
+            totals = summary[summary["grouping"] == summary["grouping"].iloc[0]]
+            balance = totals["ar_balance"].sum()
+            days_in_ar = float(ratio(balance, totals["avg_daily_charges"].sum()))
+            days_to_payment = float(ratio((totals["avg_days_to_payment"] * totals["paid_transactions"]).sum(), totals["paid_transactions"].sum()))
+            logger.info(f"AR as of {summary['as_of_date'].iloc[0]:%Y-%m-%d}: balance {balance:.2f}, "
+                        f"days in AR {days_in_ar:.1f}, average days to payment {days_to_payment:.1f}")
+            by_hospital = summary[summary["grouping"] == "source_db"]
+            if not by_hospital.empty:
+                logger.info(f"Days in AR by Hospital:\n{by_hospital[['source_db', 'ar_balance', 'days_in_ar', 'avg_days_to_payment']].to_string(index=False)}")
+
+        aging = results.get("agg_ar_aging")
+        if aging is not None and not aging.empty:
+            totals = aging[aging["grouping"] == aging["grouping"].iloc[0]]
+            buckets = totals.groupby("aging_bucket", observed=False)["open_balance"].sum()
+            logger.info(f"AR Aging:\n{buckets.to_string()}")
+
+        denials = results.get("agg_claim_denials")
+        if denials is not None and not denials.empty:
+            totals = denials[denials["grouping"] == denials["grouping"].iloc[0]]
+            dated = totals["dated_claims"]
+            lag = float(ratio((totals["avg_claim_lag_days"].fillna(0) * dated).sum(), dated.sum()))
+            logger.info(f"Average Claim Processing Time: {lag:.1f} days")
+            by_payor = denials[denials["grouping"] == "payorid"]
+            if not by_payor.empty:
+                top = by_payor.sort_values("claims", ascending=False).head(10)
+                logger.info(f"Denial Rate by Payor:\n{top[['payorid', 'claims', 'denied_claims', 'denial_rate']].to_string(index=False)}")
+
+        rolling = results.get("agg_collection_rolling")
+        if rolling is not None and not rolling.empty:
+            latest = rolling[rolling["grouping"] == "source_db"].sort_values("date").groupby("source_db", observed=True).tail(1)
+            if not latest.empty:
+                columns = ["source_db", "date"] + [f"collection_rate_{window}d" for window in ROLLING_WINDOWS]
+                logger.info(f"Latest Rolling Collection Rates by Hospital:\n{latest[columns].to_string(index=False)}")
+
+    def run(self) -> dict:
+        with profiler.stage("analytics", "ar_aging") as record:
+            results = self.compute()
+            record["rows_out"] = sum(len(df) for df in results.values())
+        self.log_summary(results)
+        if self.materialize and self.store is not None:
+            for name, df in results.items():
+                path = self.store.write("gold", name, df)
+                logger.info(f"Saved Gold table: {path}")
+        return results
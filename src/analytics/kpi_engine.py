@@ -0,0 +1,162 @@
+import pandas as pd
+from src.models.aggregates import UNDATED_KEY
+from src.utils.hll import HLL_ERROR, hll_decode, hll_estimate, hll_merge
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+TRANSACTION_COLUMNS = ["source_db", "payorid", "date_key", "transaction_date", "amount", "paidamount", "unified_patient_id"]
+CLAIM_COLUMNS = ["claimstatus", "claimamount", "paidamount"]
+PATIENT_COLUMNS = ["unified_patient_id", "enterprise_patient_id", "is_current"]
+DAILY_REVENUE_COLUMNS = ["source_db", "month_key", "revenue", "paid", "transactions"]
+PAYOR_REVENUE_COLUMNS = ["payorid", "revenue", "paid", "transactions"]
+DAILY_CLAIM_COLUMNS = ["claimstatus", "claims", "claimamount", "paidamount"]
+PARITY_KPIS = ["total_revenue", "total_paid", "transaction_count", "claim_count", "approval_rate", "denial_rate", "transacting_patients"]
+
+
+class LocalKPIEngine:
+    def __init__(self, store=None, frames=None):
+        self.store = store
+        self.frames = frames or {}
+
+    def load(self, table, columns) -> pd.DataFrame:
+        if table in self.frames:
+            df = self.frames[table]
+            return df[[col for col in columns if col in df.columns]]
+        if self.store is None or not self.store.exists("gold", table):
+            return None
+        try:
+            return self.store.read("gold", table, columns=columns)
+        except Exception as e:
+            logger.warning(f"Column projection failed for gold.{table}, reading all columns: {e}")
+            df = self.store.read("gold", table)
+            return df[[col for col in columns if col in df.columns]]
+
+    def _month(self, df: pd.DataFrame) -> pd.Series:
+        if "date_key" in df.columns:
+            return (df["date_key"] // 100).astype("Int32")
+        dates = df["transaction_date"]
+        return (dates.dt.year * 100 + dates.dt.month).astype("Int32")
+
+    def _revenue_kpis(self, base: pd.DataFrame, by_payor: pd.DataFrame) -> dict:
+        def rollup(frame, level):
+            return frame.groupby(level=level, observed=True, dropna=False)[["revenue", "paid", "transactions"]].sum().reset_index()
+
+        total_revenue = float(base["revenue"].sum())
+        total_paid = float(base["paid"].sum())
+        return {
+            "total_revenue": total_revenue,
+            "total_paid": total_paid,
+            "collection_rate": total_paid * 100.0 / total_revenue if total_revenue else None,
+            "transaction_count": int(base["transactions"].sum()),
+            "revenue_by_hospital": rollup(base, "source_db"),
+            "revenue_by_payor": rollup(by_payor, "payorid").sort_values("revenue", ascending=False, ignore_index=True),
+            "revenue_by_month": rollup(base, "month").sort_values("month", ignore_index=True)
+        }
+
+    def transaction_kpis(self, df: pd.DataFrame) -> dict:
+        # One grouped pass; every revenue rollup is derived from this small aggregate.
+        base = df.assign(month=self._month(df)).groupby(
+            ["source_db", "payorid", "month"], observed=True, dropna=False
+        ).agg(revenue=("amount", "sum"), paid=("paidamount", "sum"), transactions=("amount", "size"))
+        kpis = self._revenue_kpis(base, base)
+        kpis["transacting_patients"] = int(df["unified_patient_id"].nunique())
+        return kpis
+
+    def daily_revenue_kpis(self, daily: pd.DataFrame, by_payor: pd.DataFrame, patients: pd.DataFrame = None) -> dict:
+        # The undated bucket reports under a missing month, as undated fact rows do.
+        month = daily["month_key"].where(daily["month_key"] != UNDATED_KEY // 100)
+        base = daily.drop(columns=["month_key"]).assign(month=month).groupby(
+            ["source_db", "month"], observed=True, dropna=False
+        )[["revenue", "paid", "transactions"]].sum()
+        kpis = self._revenue_kpis(base, by_payor.set_index("payorid"))
+        if patients is not None:
+            kpis["transacting_patients"] = int(hll_estimate(hll_merge(hll_decode(patients["patients_hll"].tolist()))))
+        return kpis
+
+    def _claim_kpis(self, by_status: pd.DataFrame) -> dict:
+        total = int(by_status["claims"].sum())
+        claims = by_status["claims"]
+
+        def rate(status):
+            return float(claims.get(status, 0)) * 100.0 / total if total else None
+
+        return {
+            "claim_count": total,
+            "approval_rate": rate("Approved"),
+            "denial_rate": rate("Denied"),
+            "claims_by_status": by_status.reset_index()
+        }
+
+    def claim_kpis(self, df: pd.DataFrame) -> dict:
+        return self._claim_kpis(df.groupby("claimstatus", observed=True, dropna=False).agg(
+            claims=("claimstatus", "size"), claimamount=("claimamount", "sum"), paidamount=("paidamount", "sum")
+        ))
+
+    def daily_claim_kpis(self, daily: pd.DataFrame) -> dict:
+        return self._claim_kpis(daily.groupby("claimstatus", observed=True, dropna=False)[["claims", "claimamount", "paidamount"]].sum())
+
+    def patient_kpis(self, df: pd.DataFrame) -> dict:
+        if "is_current" in df.columns:
+            df = df[df["is_current"].astype(bool)]
+        if "enterprise_patient_id" not in df.columns:
+            return {"unique_patients": int(df["unified_patient_id"].nunique())}
+        # Patients resolved across hospitals count once; records without an enterprise ID count on their own.
+        unresolved = df["enterprise_patient_id"].isna()
+        return {"unique_patients": int(df["enterprise_patient_id"].nunique() + df.loc[unresolved, "unified_patient_id"].nunique())}
+
+    def compute(self) -> dict:
+        results = {}
+        daily_revenue = self.load("agg_daily_revenue", DAILY_REVENUE_COLUMNS)
+        payor_revenue = self.load("agg_monthly_payor_revenue", PAYOR_REVENUE_COLUMNS)
+        if daily_revenue is not None and payor_revenue is not None:
+            results.update(self.daily_revenue_kpis(daily_revenue, payor_revenue, self.load("agg_daily_patients", ["patients_hll"])))
+        else:
+            transactions = self.load("fact_transactions", TRANSACTION_COLUMNS)
+            if transactions is not None:
+                results.update(self.transaction_kpis(transactions))
+
+        daily_claims = self.load("agg_daily_claims", DAILY_CLAIM_COLUMNS)
+        if daily_claims is not None:
+            results.update(self.daily_claim_kpis(daily_claims))
+        else:
+            claims = self.load("fact_claims", CLAIM_COLUMNS)
+            if claims is not None:
+                results.update(self.claim_kpis(claims))
+
+        patients = self.load("dim_patients_scd", PATIENT_COLUMNS)
+        if patients is not None:
+            results.update(self.patient_kpis(patients))
+        return results
+
+    def parity(self, tolerance=1e-6) -> pd.DataFrame:
+        # Recomputes the headline KPIs from the fact tables and compares them with the aggregate-based ones.
+        aggregate, facts = {}, {}
+        daily_revenue = self.load("agg_daily_revenue", DAILY_REVENUE_COLUMNS)
+        payor_revenue = self.load("agg_monthly_payor_revenue", PAYOR_REVENUE_COLUMNS)
+        transactions = self.load("fact_transactions", TRANSACTION_COLUMNS)
+        if daily_revenue is not None and payor_revenue is not None and transactions is not None:
+            aggregate.update(self.daily_revenue_kpis(daily_revenue, payor_revenue, self.load("agg_daily_patients", ["patients_hll"])))
+            facts.update(self.transaction_kpis(transactions))
+        daily_claims = self.load("agg_daily_claims", DAILY_CLAIM_COLUMNS)
+        claims = self.load("fact_claims", CLAIM_COLUMNS)
+        if daily_claims is not None and claims is not None:
+            aggregate.update(self.daily_claim_kpis(daily_claims))
+            facts.update(self.claim_kpis(claims))
+
+        rows = []
+        for kpi in PARITY_KPIS:
+            if aggregate.get(kpi) is None or facts.get(kpi) is None:
+                continue
+            # Distinct patients come from HyperLogLog sketches, exact only while they are sparse.
+            allowed = 3 * HLL_ERROR if kpi == "transacting_patients" else tolerance
+            value, expected = float(aggregate[kpi]), float(facts[kpi])
+            rows.append({"kpi": kpi, "aggregate": value, "fact": expected,
+                         "match": abs(value - expected) <= allowed * max(abs(expected), 1.0)})
+        result = pd.DataFrame(rows, columns=["kpi", "aggregate", "fact", "match"])
+        mismatched = result[~result["match"].astype(bool)]
+        if mismatched.empty:
+            logger.info(f"Aggregate KPIs match the fact tables ({len(result)} checked)")
+        else:
+            logger.warning(f"Aggregate KPIs differ from the fact tables:\n{mismatched.to_string(index=False)}")
+        return result
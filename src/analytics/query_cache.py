@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import re
+import time
+import pandas as pd
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+QUERY_CACHE_DIR = "data/cache/queries"
+TABLE_PATTERN = re.compile(r"`([\w\-]+\.[\w]+\.[\w$]+)`")
+
+
+class QueryCache:
+    def __init__(self, cache_dir=QUERY_CACHE_DIR, ttl=None, max_bytes=None, clock=time.time):
+        self.cache_dir = cache_dir
+        self.clock = clock
+        self.ttl = float(ttl if ttl is not None else os.getenv("KPI_CACHE_TTL", 3600))
+        self.max_bytes = int(max_bytes if max_bytes is not None else os.getenv("KPI_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.entries = self._load_index()
+
+    def _load_index(self):
+        if not os.path.exists(self.index_path):
+            return {}
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable query cache index {self.index_path}: {e}")
+            return {}
+
+    def _save_index(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.index_path)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.parquet")
+
+    def key(self, query: str, versions: dict) -> str:
+        payload = json.dumps({"query": " ".join(query.split()), "versions": versions}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if self.clock() - entry["created"] > self.ttl or not os.path.exists(self._path(key)):
+            self._remove(key)
+            self._save_index()
+            return None
+        entry["accessed"] = self.clock()
+        self._save_index()
+        return pd.read_parquet(self._path(key))
+
+    def put(self, key, df: pd.DataFrame, query: str = ""):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        df.to_parquet(self._path(key), index=False)
+        now = self.clock()
+        self.entries[key] = {
+            "created": now,
+            "accessed": now,
+            "bytes": os.path.getsize(self._path(key)),
+            "query": " ".join(query.split())[:200]
+        }
+        self.evict()
+        self._save_index()
+
+    def _remove(self, key):
+        self.entries.pop(key, None)
+        if os.path.exists(self._path(key)):
+            os.remove(self._path(key))
+
+    def evict(self):
+        now = self.clock()
+        for key in [k for k, e in self.entries.items() if now - e["created"] > self.ttl]:
+            self._remove(key)
+        total = sum(e["bytes"] for e in self.entries.values())
+        for key in sorted(self.entries, key=lambda k: self.entries[k]["accessed"]):
+            if total <= self.max_bytes:
+                break
+            total -= self.entries[key]["bytes"]
+            self._remove(key)
+            logger.info(f"Evicted cached query result {key[:12]} to stay under {self.max_bytes} bytes")
+
+
+class QueryExecutor:
+    def __init__(self, client, cache: QueryCache = None):
+        self.client = client
+        self.cache = cache or QueryCache()
+
+    def table_versions(self, queries: dict) -> dict:
+        versions = {}
+        for query in queries.values():
+            for table_id in TABLE_PATTERN.findall(query):
+                if table_id in versions:
+                    continue
+                try:
+                    modified = self.client.get_table(table_id).modified
+                    versions[table_id] = modified.isoformat() if modified else None
+                except Exception as e:
+                    logger.warning(f"Could not read last-modified time of {table_id}, result will not be cached: {e}")
+                    versions[table_id] = None
+        return versions
+
+    def run_many(self, queries: dict) -> dict:
+        start = time.perf_counter()
+        versions = self.table_versions(queries)
+        # Results come back in the order the queries were given, whether cached or not.
+        results, pending = dict.fromkeys(queries), {}
+        hits = 0
+
+        for name, query in queries.items():
+            tables = {table_id: versions[table_id] for table_id in TABLE_PATTERN.findall(query)}
+            cacheable = all(v is not None for v in tables.values())
+            key = self.cache.key(query, tables) if cacheable else None
+            cached = self.cache.get(key) if key else None
+            if cached is not None:
+                logger.info(f"Using cached result for query: {name}")
+                results[name] = cached
+                hits += 1
+                continue
+            try:
+                pending[name] = (key, query, self.client.query(query))
+            except Exception as e:
+                logger.error(f"Error submitting query {name}: {e}")
+
+        for name, (key, query, job) in pending.items():
+            try:
+                df = job.result().to_dataframe()
+                logger.info(f"Successfully ran query: {name}")
+                if key:
+                    self.cache.put(key, df, query)
+                results[name] = df
+            except Exception as e:
+                logger.error(f"Error running query {name}: {e}")
+
+        logger.info(f"Ran {len(queries)} KPI queries in {time.perf_counter() - start:.2f}s "
+                    f"({hits} from cache, {len(pending)} submitted together)")
+        return results
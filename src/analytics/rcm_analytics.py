@@ -1,59 +1,97 @@
 import logging
-from google.cloud import bigquery
+import os
+from src.analytics.kpi_engine import LocalKPIEngine
+from src.analytics.query_cache import QueryCache, QueryExecutor
+from src.utils.profiling import profile_stage
 
 logger = logging.getLogger(__name__)
 
 class RCMAnalytics:
-    def __init__(self, project_id="python-sql-project-467708"):
-        self.client = bigquery.Client(project=project_id)
+    def __init__(self, project_id="python-sql-project-467708", backend=None, store=None, frames=None):
         self.project_id = project_id
+        self.backend = (backend or os.getenv("ANALYTICS_BACKEND", "bigquery")).lower()
+        if self.backend == "local":
+            self.engine = LocalKPIEngine(store=store, frames=frames)
+        else:
+            from google.cloud import bigquery
+            self.client = bigquery.Client(project=project_id)
+            self.executor = QueryExecutor(self.client, QueryCache())
 
-    def _run_query(self, query: str, query_name: str):
-        try:
-            query_job = self.client.query(query)
-            results = query_job.result()
-            logger.info(f"Successfully ran query: {query_name}")
-            return results.to_dataframe()
-        except Exception as e:
-            logger.error(f"Error running query {query_name}: {e}")
-            return None
+    def calculate_local_kpis(self):
+        logger.info("Calculating RCM KPIs from local gold data...")
+        kpis = self.engine.compute()
+        if os.getenv("KPI_PARITY_CHECK", "false").lower() == "true":
+            self.engine.parity()
 
+        if "total_revenue" in kpis:
+            logger.info(f"Total Revenue: {kpis['total_revenue']}")
+            logger.info(f"Revenue by Hospital:\n{kpis['revenue_by_hospital'][['source_db', 'revenue']]}")
+            logger.info(f"Top Payors by Revenue:\n{kpis['revenue_by_payor'][['payorid', 'revenue']].head(10)}")
+            logger.info(f"Revenue by Month:\n{kpis['revenue_by_month'][['month', 'revenue']]}")
+            if kpis["collection_rate"] is not None:
+                logger.info(f"Collection Rate: {kpis['collection_rate']:.2f}%")
+        if kpis.get("approval_rate") is not None:
+            logger.info(f"Claims Approval Rate: {kpis['approval_rate']:.2f}%")
+            logger.info(f"Claims Denial Rate: {kpis['denial_rate']:.2f}%")
+        if "unique_patients" in kpis:
+            logger.info(f"Unique Patient Volume: {kpis['unique_patients']}")
+
+        logger.info("RCM KPI calculation complete.")
+        return kpis
+
+    def kpi_queries(self) -> dict:
+        return {
+            "Total Revenue": f"""
+                SELECT SUM(revenue) as total_revenue
+                FROM `{self.project_id}.gold.agg_daily_revenue`
+            """,
+            "Revenue by Hospital": f"""
+                SELECT source_db, SUM(revenue) as revenue
+                FROM `{self.project_id}.gold.agg_daily_revenue`
+                GROUP BY source_db
+            """,
+            "Claims Approval Rate": f"""
+                SELECT
+                    SUM(CASE WHEN claimstatus = 'Approved' THEN claims ELSE 0 END) * 100.0 / SUM(claims) as approval_rate
+                FROM `{self.project_id}.gold.agg_daily_claims`
+            """,
+            "Average Claim Processing Time": f"""
+                SELECT AVG(DATE_DIFF(DATE(claim_date), DATE(servicedate), DAY)) as avg_processing_days
+                FROM `{self.project_id}.gold.fact_claims`
+                WHERE claim_date >= servicedate
+            """,
+            "Patient Volume": f"""
+                SELECT COUNT(DISTINCT COALESCE(CAST(enterprise_patient_id AS STRING), unified_patient_id)) as unique_patients
+                FROM `{self.project_id}.gold.dim_patients_scd`
+                WHERE is_current
+            """
+        }
+
+    @profile_stage("analytics")
     def calculate_kpis(self):
+        if self.backend == "local":
+            return self.calculate_local_kpis()
+
         logger.info("Calculating RCM KPIs...")
+        results = self.executor.run_many(self.kpi_queries())
 
-        total_revenue_query = f"""
-            SELECT SUM(Amount) as total_revenue
-            FROM `{self.project_id}.gold.fact_transactions`
-        """
-        total_revenue = self._run_query(total_revenue_query, "Total Revenue")
+        total_revenue = results["Total Revenue"]
         if total_revenue is not None: logger.info(f"Total Revenue: {total_revenue['total_revenue'].iloc[0]}")
 
-        revenue_by_hospital_query = f"""
-            SELECT source_db, SUM(Amount) as revenue
-            FROM `{self.project_id}.gold.fact_transactions`
-            GROUP BY source_db
-        """
-        revenue_by_hospital = self._run_query(revenue_by_hospital_query, "Revenue by Hospital")
+        revenue_by_hospital = results["Revenue by Hospital"]
         if revenue_by_hospital is not None: logger.info(f"Revenue by Hospital:\n{revenue_by_hospital}")
 
-        claims_approval_rate_query = f"""
-            SELECT
-                COUNT(CASE WHEN claimstatus = 'Approved' THEN 1 END) * 100.0 / COUNT(*) as approval_rate
-            FROM `{self.project_id}.gold.fact_claims`
-        """
-        claims_approval_rate = self._run_query(claims_approval_rate_query, "Claims Approval Rate")
+        claims_approval_rate = results["Claims Approval Rate"]
         if claims_approval_rate is not None: logger.info(f"Claims Approval Rate: {claims_approval_rate['approval_rate'].iloc[0]:.2f}%")
 
-        logger.info("Skipping Average Claim Processing Time due to data limitations.")
+        processing_time = results["Average Claim Processing Time"]
+        if processing_time is not None: logger.info(f"Average Claim Processing Time: {processing_time['avg_processing_days'].iloc[0]:.1f} days")
 
-        patient_volume_query = f"""
-            SELECT COUNT(DISTINCT unified_patient_id) as unique_patients
-            FROM `{self.project_id}.gold.dim_patients`
-        """
-        patient_volume = self._run_query(patient_volume_query, "Patient Volume")
+        patient_volume = results["Patient Volume"]
         if patient_volume is not None: logger.info(f"Unique Patient Volume: {patient_volume['unique_patients'].iloc[0]}")
 
         logger.info("RCM KPI calculation complete.")
+        return results
 
     def run_analytics(self):
-        self.calculate_kpis()
\ No newline at end of file
+        return self.calculate_kpis()
\ No newline at end of file
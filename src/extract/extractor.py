@@ -1,87 +1,312 @@
 import pandas as pd
 import os
-from sqlalchemy import create_engine
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import create_engine, inspect, text
+from src.extract.incremental import PRIMARY_KEYS, WATERMARK_COLUMNS, WatermarkStore, changed_mask, max_watermark
+from src.models.schema_definitions import apply_schema, concat_frames, constant_category, empty_frame, read_csv_typed, source_columns
+from src.transform.cpt_index import CPT_REFERENCE_PATH, read_cpt_reference
 from src.utils.logger import get_logger
-from config.db_config import DB_CONFIG
+from src.utils.profiling import profile_stage, profiler
+from config.db_config import load_hospitals
 
 logger = get_logger(__name__)
 
+TABLES = ["patients", "providers", "transactions", "encounters", "departments"]
+
+
+def extract_tables(extra=()) -> list:
+    # Tables with a silver schema feed the transforms; the others are only read when asked for.
+    return [table for table in TABLES if source_columns(table) is not None or table in extra]
+
+
 class Extractor:
-    def __init__(self):
-        self.hospitals = ['hospital_a', 'hospital_b']
+    def __init__(self, chunk_size=None, max_workers=None, hospitals=None, tables=None):
+        self.sources = {hospital["key"]: hospital for hospital in (hospitals if hospitals is not None else load_hospitals())}
+        self.hospitals = list(self.sources)
         self.use_mysql = os.getenv("USE_MYSQL", "true").lower() == "true"
+        self.chunk_size = chunk_size or int(os.getenv("EXTRACT_CHUNK_SIZE", "100000"))
+        self.max_workers = max_workers or int(os.getenv("EXTRACT_WORKERS", "8"))
+        self.incremental = os.getenv("INCREMENTAL_EXTRACT", "false").lower() == "true"
+        self.projection = os.getenv("EXTRACT_PROJECTION", "true").lower() == "true"
+        extra = tables if tables is not None else [t.strip() for t in os.getenv("EXTRACT_TABLES", "").split(",") if t.strip()]
+        self.tables = extract_tables(extra) if self.projection else list(TABLES)
+        self.watermarks = WatermarkStore()
+        self.timings = []
+        self._engines = {}
+        self._engines_lock = threading.Lock()
+        self._table_columns = {}
 
-    def extract_mysql(self, db):
-        try:
-            logger.info(f"Connecting to MySQL DB: {db}")
-            engine = create_engine(DB_CONFIG[db])
-            return {
-                "patients": pd.read_sql("SELECT * FROM patients", engine),
-                "providers": pd.read_sql("SELECT * FROM providers", engine),
-                "transactions": pd.read_sql("SELECT * FROM transactions", engine),
-                "encounters": pd.read_sql("SELECT * FROM encounters", engine),
-                "departments": pd.read_sql("SELECT * FROM departments", engine)
-            }
-        except Exception as e:
-            logger.error(f"MySQL extraction failed for {db}: {e}")
-            return {}
+    def get_engine(self, db):
+        with self._engines_lock:
+            if db not in self._engines:
+                logger.info(f"Connecting to MySQL DB: {db}")
+                self._engines[db] = create_engine(
+                    self.sources[db]["dsn"],
+                    pool_size=len(TABLES),
+                    max_overflow=0,
+                    pool_pre_ping=True
+                )
+            return self._engines[db]
+
+    def close(self):
+        with self._engines_lock:
+            for engine in self._engines.values():
+                engine.dispose()
+            self._engines.clear()
+
+    def columns(self, table):
+        # Projection pushed into every read: only the columns the silver schema keeps, plus the
+        # watermark and key columns incremental runs filter and merge on. None reads everything.
+        if not self.projection:
+            return None
+        return source_columns(table, WATERMARK_COLUMNS.get(table, []) + PRIMARY_KEYS.get(table, []))
+
+    def table_columns(self, db, table):
+        if (db, table) not in self._table_columns:
+            self._table_columns[db, table] = [col["name"] for col in inspect(self.get_engine(db)).get_columns(table)]
+        return self._table_columns[db, table]
+
+    def select(self, db, table):
+        wanted = self.columns(table)
+        if wanted is None:
+            return f"SELECT * FROM {table}"
+        # MySQL column names are case-insensitive, so they are matched the same way.
+        existing = {name.lower(): name for name in self.table_columns(db, table)}
+        selected = [existing[col.lower()] for col in wanted if col.lower() in existing]
+        if not selected:
+            return f"SELECT * FROM {table}"
+        quote = self.get_engine(db).dialect.identifier_preparer.quote
+        return f"SELECT {', '.join(quote(col) for col in selected)} FROM {table}"
+
+    def watermark_source(self, hospital_key, table):
+        # Claim watermarks stay keyed by file name, as they were before claims were tied to a hospital.
+        return os.path.basename(self.claims_path(hospital_key)) if table == "claims" else hospital_key
+
+    def reads_delta(self, hospital_key, table):
+        # True when this run reads only the rows past a committed watermark for the table.
+        if table == "claims" and not self.claims_path(hospital_key):
+            return False
+        return (self.incremental and table in WATERMARK_COLUMNS
+                and self.watermarks.get(self.watermark_source(hospital_key, table), table) is not None)
 
-    def extract_csv(self, hospital_key):
-        base_path = f"data/raw/{hospital_key}/"
+    def delta_query(self, db, table):
+        query = self.select(db, table)
+        if not self.incremental or table not in WATERMARK_COLUMNS:
+            return query, None, []
+        existing = set(self.table_columns(db, table))
+        wm_cols = [col for col in WATERMARK_COLUMNS[table] if col in existing]
+        watermark = self.watermarks.get(db, table)
+        if watermark and wm_cols:
+            predicate = " OR ".join(f"{col} >= :watermark" for col in wm_cols)
+            return f"{query} WHERE {predicate}", {"watermark": watermark}, wm_cols
+        return query, None, wm_cols
+
+    def _iter_query(self, engine, query, params=None):
+        if engine.dialect.driver != "mysqlconnector":
+            with engine.connect().execution_options(stream_results=True, max_row_buffer=self.chunk_size) as conn:
+                yield from pd.read_sql(text(query), conn, params=params, chunksize=self.chunk_size)
+            return
+
+        # mysql-connector has no SQLAlchemy server-side cursor support, but an
+        # unbuffered DBAPI cursor streams rows from the server the same way.
+        raw_conn = engine.raw_connection()
+        cursor = None
         try:
-            return {
-                "patients": pd.read_csv(os.path.join(base_path, "patients.csv")),
-                "providers": pd.read_csv(os.path.join(base_path, "providers.csv")),
-                "transactions": pd.read_csv(os.path.join(base_path, "transactions.csv")),
-                "encounters": pd.read_csv(os.path.join(base_path, "encounters.csv")),
-                "departments": pd.read_csv(os.path.join(base_path, "departments.csv"))
-            }
-        except Exception as e:
-            logger.error(f"CSV extraction failed for {hospital_key}: {e}")
-            return {}
-
-    def extract_claims(self):
-        claims_dir = "data/raw/claims/"
-        all_claims = []
-        for file in os.listdir(claims_dir):
-            if file.endswith(".csv"):
-                path = os.path.join(claims_dir, file)
+            cursor = raw_conn.cursor(buffered=False)
+            if params:
+                # Bound parameters in the driver's own placeholder style, positional for mysql-connector.
+                compiled = text(query).compile(dialect=engine.dialect)
+                args = [params[name] for name in compiled.positiontup] if compiled.positional else params
+                cursor.execute(str(compiled), args)
+            else:
+                cursor.execute(query)
+            columns = [col[0] for col in cursor.description]
+            while True:
+                rows = cursor.fetchmany(self.chunk_size)
+                if not rows:
+                    break
+                yield pd.DataFrame.from_records(rows, columns=columns)
+        finally:
+            if cursor is not None:
                 try:
-                    claims = pd.read_csv(path)
-                    claims['source_file'] = file
-                    all_claims.append(claims)
+                    cursor.close()
                 except Exception as e:
-                    logger.warning(f"Failed to read claims file {file}: {e}")
-        return pd.concat(all_claims, ignore_index=True)
+                    # An abandoned unbuffered result can refuse to close; that must not hide the original error.
+                    logger.warning(f"Failed to close streaming cursor: {e}")
+            raw_conn.close()
+
+    def stream_mysql(self, db, table):
+        query, params, wm_cols = self.delta_query(db, table)
+        latest = None
+        for batch in self._iter_query(self.get_engine(db), query, params):
+            batch = apply_schema(batch, "raw", table)
+            latest = max(filter(None, [latest, max_watermark(batch, wm_cols)]), default=None)
+            yield batch
+        # Staged only once the table was read to the end, so a failed stream is read again next run.
+        self.watermarks.stage(db, table, latest)
+
+    def csv_path(self, hospital_key, table):
+        return os.path.join(self.sources[hospital_key]["csv_dir"], f"{table}.csv")
+
+    def claims_path(self, hospital_key):
+        return self.sources[hospital_key]["claims_file"]
+
+    def _tag_claims(self, claims, hospital_key):
+        claims['source_file'] = constant_category(os.path.basename(self.claims_path(hospital_key)), len(claims))
+        claims['source_db'] = constant_category(hospital_key, len(claims))
+        return claims
+
+    def _iter_csv(self, path, source, table):
+        # With incremental extraction only rows at or past the watermark are kept; the newest
+        # watermark seen is staged once the file was read to the end.
+        delta = self.incremental and table in WATERMARK_COLUMNS
+        watermark = self.watermarks.get(source, table) if delta else None
+        latest = None
+        for chunk in read_csv_typed(path, "raw", table, usecols=self.columns(table), chunksize=self.chunk_size):
+            wm_cols = [col for col in WATERMARK_COLUMNS.get(table, []) if col in chunk.columns]
+            if watermark and wm_cols:
+                chunk = chunk[changed_mask(chunk, wm_cols, watermark)]
+            if delta:
+                latest = max(filter(None, [latest, max_watermark(chunk, wm_cols)]), default=None)
+            yield chunk
+        if delta:
+            self.watermarks.stage(source, table, latest)
+
+    def stream_csv(self, hospital_key, table):
+        yield from self._iter_csv(self.csv_path(hospital_key, table), hospital_key, table)
+
+    def stream_claims(self, hospital_key):
+        path = self.claims_path(hospital_key)
+        if path is None:
+            return
+        try:
+            for claims in self._iter_csv(path, self.watermark_source(hospital_key, "claims"), "claims"):
+                yield self._tag_claims(claims, hospital_key)
+        except Exception as e:
+            logger.error(f"Failed to read claims file {path}: {e}")
+            raise
+
+    def stream_hospital(self, db_key):
+        logger.info(f"Streaming data for: {db_key} (chunk_size={self.chunk_size})")
+        for table in self.tables:
+            batches = self.stream_mysql(db_key, table) if self.use_mysql else self.stream_csv(db_key, table)
+            try:
+                for batch in batches:
+                    batch['source_db'] = constant_category(db_key, len(batch))
+                    yield table, batch
+            except Exception as e:
+                # Batches already went to the shard, so the shard fails and its watermarks stay where they were.
+                logger.error(f"Streaming extraction failed for {db_key}.{table}: {e}")
+                raise
+
+        for batch in self.stream_claims(db_key):
+            yield "claims", batch
+
+    def claim_sources(self):
+        return [db_key for db_key in self.hospitals if self.claims_path(db_key)]
+
+    def read_mysql_table(self, db, table):
+        return apply_schema(pd.read_sql(self.select(db, table), self.get_engine(db)), "raw", table)
+
+    def read_csv_table(self, hospital_key, table):
+        return read_csv_typed(self.csv_path(hospital_key, table), "raw", table, usecols=self.columns(table))
+
+    def read_claims_file(self, hospital_key):
+        claims = read_csv_typed(self.claims_path(hospital_key), "raw", "claims", usecols=self.columns("claims"))
+        return self._tag_claims(claims, hospital_key)
+
+    def read_mysql_delta(self, db, table):
+        query, params, wm_cols = self.delta_query(db, table)
+        df = apply_schema(pd.read_sql(text(query), self.get_engine(db), params=params), "raw", table)
+
+        self.watermarks.stage(db, table, max_watermark(df, wm_cols))
+        logger.info(f"Incremental extract {db}.{table} since {self.watermarks.get(db, table)}: {len(df)} rows")
+        return df
+
+    def _read_csv_delta(self, path, source, table):
+        df = concat_frames(list(self._iter_csv(path, source, table)))
+        logger.info(f"Incremental extract {source}.{table} since {self.watermarks.get(source, table)}: {len(df)} rows")
+        return df
+
+    def read_csv_delta(self, hospital_key, table):
+        return self._read_csv_delta(self.csv_path(hospital_key, table), hospital_key, table)
+
+    def read_claims_delta(self, hospital_key):
+        path = self.claims_path(hospital_key)
+        return self._tag_claims(self._read_csv_delta(path, self.watermark_source(hospital_key, "claims"), "claims"), hospital_key)
+
+    def table_reader(self, table):
+        if self.incremental and table in WATERMARK_COLUMNS:
+            return self.read_mysql_delta if self.use_mysql else self.read_csv_delta
+        return self.read_mysql_table if self.use_mysql else self.read_csv_table
+
+    def _timed_read(self, source, table, reader, *args):
+        start = time.perf_counter()
+        with profiler.stage("extract", f"{source}.{table}") as record:
+            df = reader(*args)
+            record["rows_out"] = len(df)
+        elapsed = time.perf_counter() - start
+        self.timings.append({"source": source, "table": table, "rows": len(df), "seconds": round(elapsed, 3)})
+        logger.info(f"Extracted {source}.{table}: {len(df)} rows in {elapsed:.2f}s")
+        return df
 
     def extract_cptcodes(self):
             try:
-               df = pd.read_csv("data/raw/reference/cptcodes.csv")
-               df.columns = df.columns.str.strip().str.lower()
-               df = df.rename(columns={
-                      "procedure code category": "procedure_code_category",
-                      "procedure code descriptions": "procedure_description"
-                    })
-               df["procedurecode"] = df.index
-               return df
+               return read_cpt_reference(CPT_REFERENCE_PATH)
             except Exception as e:
                    logger.warning("Failed to load CPT codes: " + str(e))
                    return pd.DataFrame()
 
 
-    def run(self):
-        all_data = {"patients": [], "providers": [], "transactions": [], "encounters": [], "departments": []}
+    @profile_stage("extract")
+    def run(self, reference=True):
+        start = time.perf_counter()
+        self.timings = []
+        claims_reader = self.read_claims_delta if self.incremental else self.read_claims_file
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            table_futures = [
+                (db_key, table, pool.submit(self._timed_read, db_key, table, self.table_reader(table), db_key, table))
+                for db_key in self.hospitals
+                for table in self.tables
+            ]
+            claim_futures = [
+                (db_key, pool.submit(self._timed_read, db_key, "claims", claims_reader, db_key))
+                for db_key in self.claim_sources()
+            ]
+            cpt_future = pool.submit(self._timed_read, "reference", "cptcodes", self.extract_cptcodes) if reference else None
 
-        for db_key in self.hospitals:
-            logger.info(f"Extracting data for: {db_key}")
-            data = self.extract_mysql(db_key) if self.use_mysql else self.extract_csv(db_key)
-            for key in all_data:
-                if key in data:
-                    data[key]['source_db'] = db_key
-                    all_data[key].append(data[key])
+            all_data = {table: [] for table in self.tables}
+            for db_key, table, future in table_futures:
+                try:
+                    df = future.result()
+                except Exception as e:
+                    logger.error(f"Extraction failed for {db_key}.{table}: {e}")
+                    continue
+                df['source_db'] = constant_category(db_key, len(df))
+                all_data[table].append(df)
+
+            all_claims = []
+            for db_key, future in claim_futures:
+                try:
+                    all_claims.append(future.result())
+                except Exception as e:
+                    logger.warning(f"Failed to read claims file {self.claims_path(db_key)}: {e}")
 
-        merged_data = {k: pd.concat(v, ignore_index=True) for k, v in all_data.items() if v}
-        merged_data["claims"] = self.extract_claims()
-        merged_data["cptcodes"] = self.extract_cptcodes()
+            merged_data = {k: apply_schema(concat_frames(v), "raw", k) for k, v in all_data.items() if v}
+            # Claims files are optional, so a run without any still hands on an empty claims table.
+            merged_data["claims"] = apply_schema(concat_frames(all_claims), "raw", "claims") if all_claims else empty_frame("raw", "claims")
+            if cpt_future is not None:
+                merged_data["cptcodes"] = cpt_future.result()
 
-        return merged_data
\ No newline at end of file
+        elapsed = time.perf_counter() - start
+        slowest = max(self.timings, key=lambda t: t["seconds"], default=None)
+        serial = sum(t["seconds"] for t in self.timings)
+        if slowest:
+            logger.info(
+                f"Extraction finished in {elapsed:.2f}s with {self.max_workers} workers "
+                f"(serial sum {serial:.2f}s, slowest {slowest['source']}.{slowest['table']} {slowest['seconds']:.2f}s)"
+            )
+        return merged_data
@@ -0,0 +1,129 @@
+import json
+import os
+import threading
+import pandas as pd
+from src.models.schema_definitions import apply_schema, concat_frames
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+WATERMARK_COLUMNS = {
+    "patients": ["ModifiedDate", "Updated_Date"],
+    "transactions": ["ModifiedDate", "InsertDate"],
+    "encounters": ["ModifiedDate", "InsertedDate"],
+    "claims": ["ModifiedDate", "InsertDate"]
+}
+
+PRIMARY_KEYS = {
+    "patients": ["PatientID", "ID"],
+    "providers": ["ProviderID"],
+    "transactions": ["TransactionID"],
+    "encounters": ["EncounterID"],
+    "departments": ["DeptID"],
+    "claims": ["ClaimID"]
+}
+
+SOURCE_COLUMNS = {"claims": "source_file"}
+
+
+def changed_mask(df: pd.DataFrame, columns: list, watermark: str) -> pd.Series:
+    mask = pd.Series(False, index=df.index)
+    for col in columns:
+        mask |= pd.to_datetime(df[col], errors="coerce") >= pd.Timestamp(watermark)
+    return mask
+
+
+def max_watermark(df: pd.DataFrame, columns: list):
+    values = [pd.to_datetime(df[col], errors="coerce").max() for col in columns if col in df.columns]
+    values = [v for v in values if pd.notnull(v)]
+    return max(values).isoformat() if values else None
+
+
+def natural_keys(df: pd.DataFrame, table: str) -> pd.DataFrame:
+    key_cols = [col for col in PRIMARY_KEYS[table] if col in df.columns]
+    natural_key = df[key_cols[0]]
+    for col in key_cols[1:]:
+        natural_key = natural_key.fillna(df[col])
+    source_col = SOURCE_COLUMNS.get(table, "source_db")
+    return pd.DataFrame({
+        "source": df[source_col].astype(str),
+        "key": natural_key.astype(str)
+    })
+
+
+def merge_snapshot(snapshot: pd.DataFrame, delta: pd.DataFrame, table: str) -> pd.DataFrame:
+    if snapshot is None or snapshot.empty:
+        return delta
+    if delta is None or delta.empty:
+        return snapshot
+    if table not in PRIMARY_KEYS:
+        return delta
+
+    combined = apply_schema(concat_frames([snapshot, delta]), "bronze", table)
+    merged = combined[~natural_keys(combined, table).duplicated(keep="last")].reset_index(drop=True)
+    logger.info(f"Merged {len(delta)} changed {table} rows into bronze snapshot of {len(snapshot)} rows -> {len(merged)} rows")
+    return merged
+
+
+def merge_batches(snapshot, delta, table: str):
+    # Streaming form of merge_snapshot: only the delta is held whole; the snapshot is read batch by
+    # batch and loses the rows the delta replaces.
+    delta = [batch for batch in delta if len(batch)]
+    if not delta:
+        yield from snapshot
+        return
+    delta = apply_schema(concat_frames(delta), "bronze", table)
+    hashes = pd.util.hash_pandas_object(natural_keys(delta, table), index=False)
+    delta = delta[~hashes.duplicated(keep="last").to_numpy()].reset_index(drop=True)
+    replaced = pd.Index(hashes.unique())
+    kept = 0
+    for batch in snapshot:
+        replaces = pd.util.hash_pandas_object(natural_keys(batch, table), index=False).isin(replaced)
+        batch = batch[~replaces.to_numpy()].reset_index(drop=True)
+        kept += len(batch)
+        yield batch
+    logger.info(f"Merged {len(delta)} changed {table} rows into a streamed bronze snapshot: {kept} rows kept")
+    yield delta
+
+
+class WatermarkStore:
+    def __init__(self, path="data/state/watermarks.json"):
+        self.path = path
+        self.marks = self._load()
+        self.pending = {}
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable watermark state {self.path}: {e}")
+            return {}
+
+    def get(self, source, table):
+        return self.marks.get(source, {}).get(table)
+
+    def stage(self, source, table, value):
+        if value is None:
+            return
+        with self._lock:
+            current = self.pending.get(source, {}).get(table) or self.get(source, table)
+            if current is None or value > current:
+                self.pending.setdefault(source, {})[table] = value
+
+    def commit(self):
+        with self._lock:
+            if not self.pending:
+                return
+            for source, tables in self.pending.items():
+                self.marks.setdefault(source, {}).update(tables)
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.marks, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+            self.pending = {}
+        logger.info(f"Committed extraction watermarks to {self.path}")
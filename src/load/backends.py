@@ -0,0 +1,222 @@
+import os
+import sqlite3
+import tempfile
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from src.load.load_state import NULL_PARTITION
+from src.utils.logger import get_logger
+from src.utils.storage import frame_to_arrow
+
+logger = get_logger(__name__)
+
+# Changed partitions are staged here before being merged into the target table.
+STAGING_SUFFIX = "__staging"
+STAGING_EXPIRY_HOURS = 24
+
+
+ARROW_TYPES = {
+    "DATE": pa.date32(),
+    "NUMERIC": pa.decimal128(38, 9),
+    "TIMESTAMP": pa.timestamp("us"),
+    "INTEGER": pa.int64()
+}
+# All-null object columns convert to Arrow's null type, which the warehouse cannot load as a typed column.
+NULL_TYPES = {"FLOAT": pa.float64(), "BOOLEAN": pa.bool_()}
+
+
+def to_arrow(df: pd.DataFrame, schema: list) -> pa.Table:
+    # One zero-copy conversion; only columns whose warehouse type differs are cast.
+    table = frame_to_arrow(df)
+    for field in schema:
+        target = ARROW_TYPES.get(field["type"])
+        index = table.schema.get_field_index(field["column"])
+        column = table.column(index)
+        if pa.types.is_dictionary(column.type) and pa.types.is_null(column.type.value_type):
+            # An all-null category has no value type; give it the string dictionary it would otherwise carry.
+            target = pa.dictionary(column.type.index_type, pa.string())
+        elif pa.types.is_null(column.type):
+            target = target or NULL_TYPES.get(field["type"], pa.string())
+            table = table.set_column(index, field["column"], pc.cast(column, target))
+            continue
+        if target is None or column.type == target:
+            continue
+        if field["type"] == "INTEGER" and column.type.bit_width <= 32 and not pa.types.is_unsigned_integer(column.type):
+            continue
+        if field["type"] == "TIMESTAMP" and pa.types.is_timestamp(column.type):
+            target = pa.timestamp("us", tz=column.type.tz)
+            if column.type == target:
+                continue
+        table = table.set_column(index, field["column"], pc.cast(column, target, safe=False))
+    return table
+
+
+def write_parquet(table: pa.Table, sink, compression=None, batch_rows=None):
+    compression = compression or os.getenv("LOAD_COMPRESSION", "zstd")
+    batch_rows = batch_rows or int(os.getenv("LOAD_BATCH_ROWS", 250000))
+    with pq.ParquetWriter(sink, table.schema, compression=compression) as writer:
+        for batch in table.to_batches(max_chunksize=batch_rows):
+            writer.write_batch(batch)
+
+
+class BigQueryBackend:
+    name = "bigquery"
+
+    def __init__(self, project_id):
+        from google.api_core import exceptions
+        from google.cloud import bigquery
+        self.bigquery = bigquery
+        self.project_id = project_id
+        self.client = bigquery.Client(project=project_id)
+        self.transient_errors = (
+            exceptions.ServerError, exceptions.TooManyRequests,
+            exceptions.ServiceUnavailable, ConnectionError, TimeoutError
+        )
+
+    def table_id(self, dataset, table_name):
+        return f"{self.project_id}.{dataset}.{table_name}"
+
+    def is_transient(self, error) -> bool:
+        return isinstance(error, self.transient_errors)
+
+    def job_config(self, schema, partition_field=None, cluster_fields=None):
+        job_config = self.bigquery.LoadJobConfig(
+            source_format=self.bigquery.SourceFormat.PARQUET,
+            schema=[self.bigquery.SchemaField(field["column"], field["type"]) for field in schema],
+            write_disposition="WRITE_TRUNCATE"
+        )
+
+        if partition_field:
+            job_config.time_partitioning = self.bigquery.TimePartitioning(field=partition_field)
+
+        if cluster_fields:
+            job_config.clustering_fields = cluster_fields
+        return job_config
+
+    def _upload(self, df, schema, destination, job_config):
+        # Spool compressed Parquet to disk batch by batch so the upload never holds a second in-memory copy.
+        table = to_arrow(df, schema)
+        with tempfile.TemporaryFile() as f:
+            write_parquet(table, f)
+            del table
+            f.seek(0)
+            return self.client.load_table_from_file(f, destination, job_config=job_config)
+
+    def submit(self, df, schema, table_id, table_name, partition_field=None, cluster_fields=None):
+        return self._upload(df, schema, table_id, self.job_config(schema, partition_field, cluster_fields))
+
+    def submit_partitions(self, df, keys, partitions, schema, table_id, table_name, partition_field, cluster_fields=None):
+        # Every changed day goes up in one spooled file and one load job to a staging table; a single
+        # MERGE then swaps those days in the target, so a run costs two jobs per table however many
+        # partitions changed, instead of one load job per partition decorator.
+        staging_id = f"{table_id}{STAGING_SUFFIX}"
+        self._upload(df, schema, staging_id, self.job_config(schema)).result()
+        staging = self.client.get_table(staging_id)
+        staging.expires = pd.Timestamp.now(tz="UTC") + pd.Timedelta(hours=STAGING_EXPIRY_HOURS)
+        self.client.update_table(staging, ["expires"])
+
+        field_type = next((field["type"] for field in schema if field["column"] == partition_field), "TIMESTAMP")
+        day = f"T.`{partition_field}`" if field_type == "DATE" else f"DATE(T.`{partition_field}`)"
+        days = [pd.Timestamp(partition).date() for partition in partitions if partition != NULL_PARTITION]
+        replaced = [f"{day} IN UNNEST(@days)"]
+        if NULL_PARTITION in partitions:
+            replaced.append(f"T.`{partition_field}` IS NULL")
+
+        # Rows of the changed days that are no longer in the source are deleted, the staged rows inserted.
+        query = f"""
+            MERGE `{table_id}` T
+            USING `{staging_id}` S
+            ON FALSE
+            WHEN NOT MATCHED BY SOURCE AND ({" OR ".join(replaced)}) THEN DELETE
+            WHEN NOT MATCHED THEN INSERT ROW
+        """
+        job_config = self.bigquery.QueryJobConfig(
+            query_parameters=[self.bigquery.ArrayQueryParameter("days", "DATE", days)]
+        )
+        return self.client.query(query, job_config=job_config)
+
+    def wait(self, job):
+        if isinstance(job, list):
+            return [j.result() for j in job]
+        return job.result()
+
+
+SQLITE_TYPES = {
+    "INTEGER": "INTEGER",
+    "FLOAT": "REAL",
+    "NUMERIC": "NUMERIC",
+    "BOOLEAN": "INTEGER",
+    "DATE": "DATE",
+    "TIMESTAMP": "TIMESTAMP",
+    "STRING": "TEXT"
+}
+
+
+class SQLiteBackend:
+    name = "sqlite"
+
+    def __init__(self, base_dir=None):
+        self.base_dir = base_dir or os.getenv("SQLITE_WAREHOUSE_DIR", "data/warehouse")
+
+    def table_id(self, dataset, table_name):
+        return f"{dataset}.{table_name}"
+
+    def is_transient(self, error) -> bool:
+        # OperationalError also covers missing tables and bad SQL; only lock contention is worth retrying.
+        message = str(error).lower()
+        return isinstance(error, sqlite3.OperationalError) and ("locked" in message or "busy" in message)
+
+    def path(self, table_id):
+        dataset, table_name = table_id.split(".", 1)
+        return os.path.join(self.base_dir, dataset, f"{table_name}.db")
+
+    def _prepare(self, df: pd.DataFrame) -> pd.DataFrame:
+        casts = {}
+        for col, dtype in df.dtypes.items():
+            if dtype == "uint64":
+                casts[col] = "int64"
+            elif isinstance(dtype, pd.CategoricalDtype):
+                casts[col] = dtype.categories.dtype
+        return df.astype(casts) if casts else df
+
+    def _column_types(self, schema):
+        return {field["column"]: SQLITE_TYPES.get(field["type"], "TEXT") for field in schema}
+
+    def submit(self, df, schema, table_id, table_name, partition_field=None, cluster_fields=None):
+        path = self.path(table_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with sqlite3.connect(path, timeout=60) as conn:
+            self._prepare(df).to_sql(table_name, conn, if_exists="replace", index=False, chunksize=50000, dtype=self._column_types(schema))
+            if partition_field and partition_field in df.columns:
+                conn.execute(f'CREATE INDEX IF NOT EXISTS "ix_{table_name}_{partition_field}" ON "{table_name}" ("{partition_field}")')
+        return len(df)
+
+    def submit_partitions(self, df, keys, partitions, schema, table_id, table_name, partition_field, cluster_fields=None):
+        with sqlite3.connect(self.path(table_id), timeout=60) as conn:
+            for start in range(0, len(partitions), 500):
+                chunk = partitions[start:start + 500]
+                placeholders = ", ".join("?" for _ in chunk)
+                conn.execute(
+                    f'DELETE FROM "{table_name}" WHERE COALESCE(strftime(\'%Y%m%d\', "{partition_field}"), ?) IN ({placeholders})',
+                    [NULL_PARTITION, *chunk]
+                )
+            self._prepare(df).to_sql(table_name, conn, if_exists="append", index=False, chunksize=50000)
+        return len(df)
+
+    def wait(self, job):
+        return job
+
+    def read(self, table_id, query=None) -> pd.DataFrame:
+        table_name = table_id.split(".", 1)[1]
+        with sqlite3.connect(self.path(table_id)) as conn:
+            return pd.read_sql(query or f'SELECT * FROM "{table_name}"', conn)
+
+
+def get_backend(name=None, project_id=None):
+    name = (name or os.getenv("LOAD_BACKEND", "bigquery")).lower()
+    if name == "sqlite":
+        return SQLiteBackend()
+    if name == "bigquery":
+        return BigQueryBackend(project_id)
+    raise ValueError(f"Unknown load backend '{name}', expected 'bigquery' or 'sqlite'")
@@ -0,0 +1,68 @@
+import hashlib
+import json
+import os
+import pandas as pd
+from src.models.fact_builder import date_keys
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+LOAD_STATE_DIR = "data/state/loads"
+NULL_PARTITION = "__NULL__"
+TABLE_PARTITION = "__TABLE__"
+
+
+def schema_digest(schema: list) -> str:
+    columns = [f"{field['column']}:{field['type']}" for field in schema]
+    return hashlib.sha256("|".join(columns).encode()).hexdigest()[:16]
+
+
+def partition_keys(dates: pd.Series) -> pd.Series:
+    # Daily partition ids as BigQuery names them in a table$YYYYMMDD decorator.
+    keys = date_keys(dates)
+    labels = keys.astype("string").fillna(NULL_PARTITION)
+    return labels.astype("category")
+
+
+def partition_fingerprints(df: pd.DataFrame, keys: pd.Series = None) -> dict:
+    # Order-independent digest per partition: any inserted, removed or edited row changes the sum.
+    rows = pd.util.hash_pandas_object(df, index=False)
+    if keys is None:
+        return {TABLE_PARTITION: f"{int(rows.sum()):x}:{len(rows)}"}
+    digest = rows.groupby(keys.to_numpy(), observed=True).agg(["sum", "size"])
+    return {str(key): f"{int(total):x}:{int(size)}" for key, total, size in digest.itertuples()}
+
+
+def changed_partitions(previous: dict, current: dict) -> list:
+    keys = set(previous) | set(current)
+    return sorted(key for key in keys if previous.get(key) != current.get(key))
+
+
+class LoadState:
+    def __init__(self, backend_name, state_dir=LOAD_STATE_DIR):
+        self.state_dir = os.path.join(state_dir, backend_name)
+
+    def path(self, table_id):
+        return os.path.join(self.state_dir, f"{table_id}.json")
+
+    def load(self, table_id):
+        path = self.path(table_id)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable load state {path}, {table_id} will be fully reloaded: {e}")
+            return None
+
+    def save(self, table_id, schema, partitions: dict):
+        os.makedirs(self.state_dir, exist_ok=True)
+        tmp_path = f"{self.path(table_id)}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"schema": schema, "partitions": partitions}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path(table_id))
+
+    def clear(self, table_id):
+        if os.path.exists(self.path(table_id)):
+            os.remove(self.path(table_id))
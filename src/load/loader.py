@@ -1,29 +1,63 @@
 import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pandas as pd
-from google.cloud import bigquery
+from src.load.backends import get_backend
+from src.load.load_state import LoadState, changed_partitions, partition_fingerprints, partition_keys, schema_digest
+from src.models.schema_definitions import DATE_FORMAT, apply_schema, get_schema
+from src.utils.profiling import profiler
 
 logger = logging.getLogger(__name__)
 
+PARTITION_FIELDS = {
+    "fact_transactions": "transaction_date",
+    "fact_claims": "claim_date"
+}
+
+CLUSTER_FIELDS = {
+    "fact_transactions": ["unified_patient_id"]
+}
+
+# Above this share of changed partitions one truncating load is cheaper than staging and merging them.
+FULL_RELOAD_RATIO = 0.5
+
 class Loader:
-    def __init__(self, project_id="python-sql-project-467708"):
+    def __init__(self, project_id="python-sql-project-467708", backend=None, max_workers=None, retries=None, incremental=None):
         self.project_id = project_id
-        self.client = bigquery.Client(project=project_id)
+        self.backend = backend if backend is not None and not isinstance(backend, str) else get_backend(backend, project_id)
+        self.max_workers = max_workers or int(os.getenv("LOAD_WORKERS", 4))
+        self.retries = retries if retries is not None else int(os.getenv("LOAD_RETRIES", 3))
+        self.incremental = incremental if incremental is not None else os.getenv("INCREMENTAL_LOAD", "false").lower() == "true"
+        self.load_state = LoadState(self.backend.name)
         self.schema_summary = []
+        self.load_report = []
 
-    def get_table_id(self, table_name):
+    def get_dataset(self, table_name):
         if table_name.endswith("_cleaned"):
-            dataset = "silver"
-        elif table_name.startswith("dim_") or table_name.startswith("fact_"):
-            dataset = "gold"
-        else:
-            dataset = "bronze"
-        return f"{self.project_id}.{dataset}.{table_name}"
+            return "silver"
+        elif table_name.startswith(("dim_", "fact_", "agg_")):
+            return "gold"
+        return "bronze"
+
+    def get_table_id(self, table_name):
+        return self.backend.table_id(self.get_dataset(table_name), table_name)
 
     def extract_schema(self, df: pd.DataFrame, table_id: str):
+        dataset, table_name = table_id.split(".")[-2:]
+        registry = {col.name: col for col in get_schema(dataset, table_name)}
+        partition_field = PARTITION_FIELDS.get(table_name)
         schema = []
         for col, dtype in df.dtypes.items():
-            if pd.api.types.is_datetime64_any_dtype(dtype):
-                col_type = "TIMESTAMP"
+            declared = registry.get(col)
+            if declared is not None and declared.sql_type:
+                col_type = declared.sql_type
+            elif isinstance(dtype, pd.CategoricalDtype):
+                col_type = "STRING"
+            elif pd.api.types.is_datetime64_any_dtype(dtype):
+                # Day-precision registry dates load as DATE; partition columns stay TIMESTAMP like the existing tables.
+                day_precision = declared is not None and declared.date_format == DATE_FORMAT
+                col_type = "DATE" if day_precision and col != partition_field else "TIMESTAMP"
             elif pd.api.types.is_integer_dtype(dtype):
                 col_type = "INTEGER"
             elif pd.api.types.is_float_dtype(dtype):
@@ -37,31 +71,110 @@ class Loader:
 
     def load_table(self, df, table_name, partition_field=None, cluster_fields=None):
         table_id = self.get_table_id(table_name)
-        job_config = bigquery.LoadJobConfig(
-            autodetect=True,
-            write_disposition="WRITE_TRUNCATE"
-        )
-
-        if partition_field:
-            job_config.time_partitioning = bigquery.TimePartitioning(field=partition_field)
-
-        if cluster_fields:
-            job_config.clustering_fields = cluster_fields
-
-        if table_name == "fact_transactions":
-            job_config.schema = [
-                bigquery.SchemaField("transaction_date", "TIMESTAMP"),
-            ]
-        elif table_name == "fact_claims":
-            job_config.schema = [
-                bigquery.SchemaField("claim_date", "TIMESTAMP"),
-            ]
-
-        job = self.client.load_table_from_dataframe(df, table_id, job_config=job_config)
-        job.result()
-
+        df = apply_schema(df, self.get_dataset(table_name), table_name)
+        schema = self.extract_schema(df, table_id)
+        if self.incremental:
+            sent = self._load_incremental(df, schema, table_id, table_name, partition_field, cluster_fields)
+        else:
+            # Cleared first so a failed load never leaves state describing the previous contents.
+            self.load_state.clear(table_id)
+            job = self.backend.submit(df, schema, table_id, table_name, partition_field, cluster_fields)
+            self.backend.wait(job)
+            # Fingerprints of what was just loaded, so a later incremental load sends only what changed.
+            keys = partition_keys(df[partition_field]) if partition_field in df.columns else None
+            self.load_state.save(table_id, schema_digest(schema), partition_fingerprints(df, keys))
+            sent = len(df)
+            logger.info(f"Loaded {len(df)} rows into {table_id}")
+
+        self.schema_summary.extend(schema)
+        return df, sent
+
+    def _load_incremental(self, df, schema, table_id, table_name, partition_field=None, cluster_fields=None):
+        previous = self.load_state.load(table_id)
+        digest = schema_digest(schema)
+        keys = partition_keys(df[partition_field]) if partition_field in df.columns else None
+        current = partition_fingerprints(df, keys)
+
+        if previous and previous["schema"] == digest:
+            changed = changed_partitions(previous["partitions"], current)
+            if not changed:
+                logger.info(f"Skipping {table_id}: no changes since the last load")
+                return 0
+            if keys is not None and len(changed) <= FULL_RELOAD_RATIO * max(len(current), 1):
+                mask = keys.isin(changed).to_numpy()
+                jobs = self.backend.submit_partitions(df[mask], keys[mask], changed, schema, table_id, table_name, partition_field, cluster_fields)
+                self.backend.wait(jobs)
+                self.load_state.save(table_id, digest, current)
+                logger.info(f"Replaced {len(changed)} of {len(current)} {partition_field} partitions in {table_id} ({int(mask.sum())} rows)")
+                return int(mask.sum())
+        elif previous:
+            logger.info(f"Schema of {table_id} changed since the last load, reloading it in full")
+
+        job = self.backend.submit(df, schema, table_id, table_name, partition_field, cluster_fields)
+        self.backend.wait(job)
+        self.load_state.save(table_id, digest, current)
         logger.info(f"Loaded {len(df)} rows into {table_id}")
-        self.schema_summary.extend(self.extract_schema(df, table_id))
+        return len(df)
+
+    def _load_with_retry(self, df, table_name, partition_field=None, cluster_fields=None):
+        df = df() if callable(df) else df
+        start = time.perf_counter()
+        with profiler.stage("load", table_name, len(df)) as record:
+            for attempt in range(self.retries + 1):
+                try:
+                    df, sent = self.load_table(df, table_name, partition_field, cluster_fields)
+                    break
+                except Exception as e:
+                    if not self.backend.is_transient(e) or attempt == self.retries:
+                        raise
+                    delay = 2 ** attempt
+                    logger.warning(f"Transient error loading {table_name} (attempt {attempt + 1}/{self.retries + 1}), retrying in {delay}s: {e}")
+                    time.sleep(delay)
+            record["rows_out"] = sent
+
+        seconds = time.perf_counter() - start
+        megabytes = float(df.memory_usage(index=False).sum()) / 1e6
+        return {
+            "table": table_name,
+            "rows": len(df),
+            "rows_sent": sent,
+            "megabytes": round(megabytes, 2),
+            "seconds": round(seconds, 3),
+            "rows_per_sec": round(len(df) / seconds) if seconds else None,
+            "mb_per_sec": round(megabytes / seconds, 2) if seconds else None,
+            "attempts": attempt + 1
+        }
+
+    def load_tables(self, tables: dict) -> list:
+        start = time.perf_counter()
+        report, failed = [], []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {
+                pool.submit(
+                    self._load_with_retry, df, table_name,
+                    PARTITION_FIELDS.get(table_name), CLUSTER_FIELDS.get(table_name)
+                ): table_name
+                for table_name, df in tables.items()
+            }
+            for future in as_completed(futures):
+                table_name = futures[future]
+                try:
+                    stats = future.result()
+                    report.append(stats)
+                    logger.info(f"Loaded {table_name}: {stats['rows_sent']}/{stats['rows']} rows sent in {stats['seconds']}s "
+                                f"({stats['rows_per_sec']} rows/s, {stats['mb_per_sec']} MB/s)")
+                except Exception as e:
+                    failed.append(table_name)
+                    logger.error(f"Failed to load {table_name}: {e}")
+
+        elapsed = time.perf_counter() - start
+        serial = sum(stats["seconds"] for stats in report)
+        logger.info(f"Loaded {len(report)}/{len(tables)} tables into {self.backend.name} in {elapsed:.2f}s "
+                    f"with {self.max_workers} workers (serial sum {serial:.2f}s)")
+        self.load_report.extend(report)
+        if failed:
+            raise RuntimeError(f"Failed to load tables: {', '.join(failed)}")
+        return report
 
     def save_schema_summary(self):
         if self.schema_summary:
@@ -70,19 +183,7 @@ class Loader:
             logger.info("Generated schema_summary.csv")
 
     def run(self, data_dict: dict):
-        logger.info("Starting BigQuery loading process")
-
-        for table_name, df in data_dict.items():
-            partition_field = None
-            cluster_fields = None
-
-            if table_name == "fact_transactions":
-                partition_field = "transaction_date"
-                cluster_fields = ["patientid"]
-            elif table_name == "fact_claims":
-                partition_field = "claim_date"
-
-            self.load_table(df, table_name, partition_field, cluster_fields)
-
+        logger.info(f"Starting {self.backend.name} loading process")
+        self.load_tables(data_dict)
         self.save_schema_summary()
-        logger.info("BigQuery loading complete")
\ No newline at end of file
+        logger.info(f"{self.backend.name} loading complete")
@@ -0,0 +1,162 @@
+import os
+import numpy as np
+import pandas as pd
+from src.models.schema_definitions import apply_schema, concat_frames
+from src.utils.hll import hll_encode, hll_estimate, hll_sketches
+from src.utils.logger import get_logger
+from src.utils.profiling import profiler
+
+logger = get_logger(__name__)
+
+AGGREGATE_STATE_DIR = "data/state/aggregates"
+PARTITION_COLUMN = "month_key"
+# Fact rows without a date are aggregated under this date_key (month_key 0) instead of being dropped,
+# so totals over an aggregate add up to the fact table.
+UNDATED_KEY = 0
+
+REVENUE_MEASURES = {"revenue": ("amount", "sum"), "paid": ("paidamount", "sum"), "transactions": ("amount", "size")}
+
+# Aggregates are kept per day unless their spec sets "grain": "month". Payor cardinality would make a
+# daily payor rollup nearly as large as the fact table, so payor revenue is kept per month.
+AGGREGATES = {
+    "agg_daily_revenue": {
+        "fact": "fact_transactions",
+        "dimensions": ["source_db", "deptid"],
+        "measures": REVENUE_MEASURES
+    },
+    "agg_monthly_payor_revenue": {
+        "fact": "fact_transactions",
+        "grain": "month",
+        "dimensions": ["source_db", "payorid"],
+        "measures": REVENUE_MEASURES
+    },
+    "agg_daily_claims": {
+        "fact": "fact_claims",
+        "dimensions": ["claimstatus", "payortype"],
+        "measures": {"claims": ("claimstatus", "size"), "claimamount": ("claimamount", "sum"), "paidamount": ("paidamount", "sum")}
+    },
+    "agg_daily_patients": {
+        "fact": "fact_transactions",
+        "dimensions": ["source_db"],
+        "sketch": "unified_patient_id"
+    }
+}
+
+
+def with_undated(fact: pd.DataFrame) -> pd.DataFrame:
+    if not fact["date_key"].hasnans:
+        return fact
+    return fact.assign(date_key=fact["date_key"].fillna(UNDATED_KEY))
+
+
+class AggregateBuilder:
+    def __init__(self, store=None, state_dir=AGGREGATE_STATE_DIR):
+        self.store = store
+        self.state_dir = state_dir
+
+    def _source_columns(self, spec) -> list:
+        columns = list(spec["dimensions"])
+        columns += [source for source, _ in spec.get("measures", {}).values()]
+        if "sketch" in spec:
+            columns.append(spec["sketch"])
+        return list(dict.fromkeys(columns))
+
+    def fingerprints(self, fact: pd.DataFrame, spec) -> pd.DataFrame:
+        # Order-independent digest per day: any inserted, removed or edited row changes the sum.
+        fact = with_undated(fact)
+        columns = [col for col in self._source_columns(spec) if col in fact.columns]
+        rows = pd.util.hash_pandas_object(fact[columns], index=False)
+        digest = rows.groupby(fact["date_key"].to_numpy()).agg(["sum", "size"])
+        digest.index.name = "date_key"
+        return digest.rename(columns={"sum": "fingerprint", "size": "rows"}).reset_index()
+
+    def aggregate(self, name, fact: pd.DataFrame) -> pd.DataFrame:
+        spec = AGGREGATES[name]
+        fact = with_undated(fact)
+        monthly = spec.get("grain") == "month"
+        if monthly:
+            fact = fact.assign(**{PARTITION_COLUMN: fact["date_key"] // 100})
+        time_key = PARTITION_COLUMN if monthly else "date_key"
+        dimensions = [time_key] + [col for col in spec["dimensions"] if col in fact.columns]
+        grouped = fact.groupby(dimensions, observed=True, dropna=False)
+
+        if "sketch" in spec:
+            groups = grouped.ngroup().to_numpy()
+            sketches = hll_sketches(fact[spec["sketch"]], groups, grouped.ngroups)
+            result = grouped.size().reset_index()[dimensions]
+            result["patients_hll"] = hll_encode(sketches)
+            result["patients"] = [hll_estimate(sketch) for sketch in sketches]
+        else:
+            measures = {out: (col, how) for out, (col, how) in spec["measures"].items() if col in fact.columns}
+            result = grouped.agg(**measures).reset_index()
+
+        if not monthly:
+            result[PARTITION_COLUMN] = result["date_key"] // 100
+        return apply_schema(result, "gold", name)
+
+    def _state_path(self, name):
+        return os.path.join(self.state_dir, f"{name}.parquet")
+
+    def _load_state(self, name) -> pd.DataFrame:
+        path = self._state_path(name)
+        if self.store is None or not os.path.exists(path) or not self.store.exists("gold", name):
+            return pd.DataFrame({"date_key": pd.Series(dtype="Int32"), "fingerprint": pd.Series(dtype="uint64")})
+        return pd.read_parquet(path)
+
+    def _save_state(self, name, state: pd.DataFrame):
+        os.makedirs(self.state_dir, exist_ok=True)
+        tmp_path = f"{self._state_path(name)}.tmp"
+        state.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, self._state_path(name))
+
+    def changed_dates(self, previous: pd.DataFrame, current: pd.DataFrame):
+        merged = current.merge(previous[["date_key", "fingerprint"]], on="date_key", how="outer", suffixes=("", "_old"), indicator=True)
+        changed = merged[(merged["_merge"] != "both") | (merged["fingerprint"] != merged["fingerprint_old"])]
+        removed = changed.loc[changed["_merge"] == "right_only", "date_key"]
+        return changed.loc[changed["_merge"] != "right_only", "date_key"], removed
+
+    def update(self, name, fact: pd.DataFrame) -> pd.DataFrame:
+        spec = AGGREGATES[name]
+        if self.store is None:
+            return self.aggregate(name, fact)
+
+        fact = with_undated(fact)
+        current = self.fingerprints(fact, spec)
+        recompute, removed = self.changed_dates(self._load_state(name), current)
+        touched = pd.concat([recompute, removed]).astype("int64")
+        if touched.empty:
+            logger.info(f"{name} is up to date, no date partitions changed")
+            return self.aggregate(name, fact.iloc[:0])
+
+        months = sorted((touched // 100).unique().tolist())
+        if spec.get("grain") == "month":
+            # A changed day changes its month's totals, so touched months are rebuilt from all their days.
+            rows = self.aggregate(name, fact[(fact["date_key"] // 100).isin(months).to_numpy()])
+            self.store.replace_partitions("gold", name, rows, PARTITION_COLUMN, values=months)
+            self._save_state(name, current)
+            logger.info(f"Refreshed {name}: {len(months)} month partitions recomputed")
+            return rows
+
+        rows = self.aggregate(name, fact[fact["date_key"].isin(recompute.to_numpy())])
+        if self.store.exists("gold", name):
+            kept = self.store.read("gold", name, filters=[(PARTITION_COLUMN, "in", months)])
+            kept = kept[~kept["date_key"].isin(touched.to_numpy())]
+            rows = apply_schema(concat_frames([kept, rows]), "gold", name)
+        self.store.replace_partitions("gold", name, rows, PARTITION_COLUMN, values=months)
+        self._save_state(name, current)
+
+        logger.info(f"Refreshed {name}: {len(recompute)} dates recomputed, {len(removed)} removed, "
+                    f"{len(months)} month partitions rewritten")
+        return rows[rows["date_key"].isin(touched.to_numpy())].reset_index(drop=True)
+
+    def run(self, facts: dict) -> dict:
+        results = {}
+        for name, spec in AGGREGATES.items():
+            fact = facts.get(spec["fact"])
+            if fact is None or "date_key" not in fact.columns:
+                logger.warning(f"Skipping {name}: {spec['fact']} is not available")
+                continue
+            with profiler.stage("model", name, len(fact)) as record:
+                results[name] = self.update(name, fact)
+                record["rows_out"] = len(results[name])
+        return results
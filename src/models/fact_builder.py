@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+from src.models.schema_definitions import apply_schema
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def date_keys(dates: pd.Series) -> pd.Series:
+    # Work on the distinct dates only, then broadcast back through the codes.
+    codes, uniques = pd.factorize(dates)
+    days = np.asarray(uniques, dtype="datetime64[D]")
+    months = days.astype("datetime64[M]")
+    years = months.astype("datetime64[Y]")
+    unique_keys = (
+        (years.astype(np.int64) + 1970) * 10000
+        + (months.astype(np.int64) % 12 + 1) * 100
+        + (days - months).astype(np.int64) + 1
+    ).astype(np.int32)
+    keys = pd.array(np.append(unique_keys, 0)[codes], dtype="Int32")
+    keys[codes < 0] = pd.NA
+    return pd.Series(keys, index=dates.index)
+
+
+class DimensionIndex:
+    def __init__(self, name, natural_keys: pd.Series, surrogate_keys: pd.Series):
+        pairs = pd.DataFrame({"natural": natural_keys.to_numpy(), "key": surrogate_keys.to_numpy()})
+        pairs = pairs[pairs["natural"].notna()].drop_duplicates(subset=["natural"], keep="last")
+        self.name = name
+        self.index = pd.Index(pairs["natural"])
+        self.keys = pd.array(pairs["key"], dtype="Int32")
+
+    def positions(self, values: pd.Series) -> np.ndarray:
+        # Probe the index once per distinct value rather than once per fact row.
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+        else:
+            codes, uniques = pd.factorize(values)
+        unique_pos = np.append(self.index.get_indexer(uniques), -1)
+        return unique_pos[codes]
+
+    def resolve(self, values: pd.Series):
+        pos = self.positions(values)
+        matched = pos >= 0
+        keys = pd.Series(pd.NA, index=values.index, dtype="Int32")
+        keys[matched] = self.keys[pos[matched]]
+        return keys, int((~matched & values.notna().to_numpy()).sum())
+
+
+class FactAssembler:
+    def __init__(self):
+        self.dimensions = {}
+        self.last_unmatched = {}
+
+    def add_dimension(self, key_column, natural_keys: pd.Series, surrogate_keys: pd.Series):
+        self.dimensions[key_column] = DimensionIndex(key_column, natural_keys, surrogate_keys)
+
+    def assemble(self, table, df: pd.DataFrame, lookups: dict, date_column=None) -> pd.DataFrame:
+        keys = {}
+        unmatched = {}
+        for key_column, fact_column in lookups.items():
+            if fact_column not in df.columns:
+                logger.warning(f"{table} has no '{fact_column}' column, {key_column} left empty")
+                keys[key_column] = pd.Series(pd.NA, index=df.index, dtype="Int32")
+                continue
+            keys[key_column], unmatched[key_column] = self.dimensions[key_column].resolve(df[fact_column])
+
+        if date_column and date_column in df.columns:
+            keys["date_key"] = date_keys(df[date_column])
+            unmatched["date_key"] = int(keys["date_key"].isna().sum())
+
+        report = ", ".join(f"{name}={count}" for name, count in unmatched.items())
+        logger.info(f"Assembled {table}: {len(df)} rows, unmatched keys: {report}")
+        self.last_unmatched = unmatched
+        return apply_schema(df.assign(**keys), "gold", table)
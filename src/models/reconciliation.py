@@ -0,0 +1,270 @@
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from src.models.schema_definitions import apply_schema, concat_frames
+from src.utils.logger import get_logger
+from src.utils.profiling import profiler
+from src.utils.storage import frame_to_arrow
+
+logger = get_logger(__name__)
+
+RECONCILIATION_STATE_DIR = "data/state/reconciliation"
+TABLE = "fact_claim_reconciliation"
+BUCKET_COLUMN = "recon_bucket"
+CLAIM_COLUMNS = ["source_db", "claimid", "transactionid", "claim_date", "claimstatus", "payorid",
+                 "claimamount", "paidamount", "deductible", "coinsurance", "copay"]
+TRANSACTION_COLUMNS = ["source_db", "transactionid", "claimid", "transaction_date", "amount", "paidamount"]
+DEDUCTIONS = ["deductible", "coinsurance", "copay"]
+SUMMARY_KEYS = ["match_type", "reconciliation_status"]
+
+
+def link_hash(source_db: pd.Series, ids: pd.Series) -> np.ndarray:
+    # IDs are only unique within a hospital, so every link is keyed on (source_db, id).
+    keys = pd.DataFrame({"source_db": source_db.astype("string").to_numpy(), "id": ids.astype("string").to_numpy()})
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy()
+
+
+def contains(index: np.ndarray, hashes: np.ndarray) -> np.ndarray:
+    if len(index) == 0:
+        return np.zeros(len(hashes), dtype=bool)
+    pos = np.minimum(np.searchsorted(index, hashes), len(index) - 1)
+    return index[pos] == hashes
+
+
+class ClaimReconciler:
+    def __init__(self, store, buckets=None, chunk_rows=None, tolerance=None, state_dir=RECONCILIATION_STATE_DIR):
+        self.store = store
+        self.buckets = buckets or int(os.getenv("RECON_BUCKETS", 64))
+        self.chunk_rows = chunk_rows or int(os.getenv("RECON_CHUNK_ROWS", 2000000))
+        self.tolerance = tolerance if tolerance is not None else float(os.getenv("RECON_TOLERANCE", 0.01))
+        self.state_dir = state_dir
+        self.claim_ids = None
+        self.claim_refs = None
+
+    def _scan(self, table, columns):
+        return self.store.scan("silver", f"{table}_cleaned", columns=columns, batch_rows=self.chunk_rows)
+
+    def build_indexes(self):
+        # The claim IDs and the claim IDs that transactions point at are the only whole-table
+        # structures kept in memory, as sorted 64-bit hashes; rows are processed bucket by bucket.
+        def index(table):
+            hashes = [link_hash(batch["source_db"], batch["claimid"])[batch["claimid"].notna().to_numpy()]
+                      for batch in self._scan(table, ["source_db", "claimid"])]
+            return np.sort(np.concatenate(hashes)) if hashes else np.empty(0, dtype=np.uint64)
+
+        self.claim_ids = index("claims")
+        self.claim_refs = index("transactions")
+
+    def link_claims(self, claims: pd.DataFrame) -> pd.DataFrame:
+        has_transaction = claims["transactionid"].notna().to_numpy()
+        forward = link_hash(claims["source_db"], claims["transactionid"])
+        own = link_hash(claims["source_db"], claims["claimid"])
+        # Claims without a transaction ID are bucketed by their own ID; they can only match in reverse.
+        bucket = np.where(has_transaction, forward, own) % np.uint64(self.buckets)
+        return claims.assign(**{
+            BUCKET_COLUMN: bucket.astype(np.int16),
+            "transaction_key": np.where(has_transaction, forward, 0).astype(np.uint64),
+            "claim_key": own,
+            "referenced": contains(self.claim_refs, own)
+        })
+
+    def link_transactions(self, transactions: pd.DataFrame) -> pd.DataFrame:
+        own = link_hash(transactions["source_db"], transactions["transactionid"])
+        claim = link_hash(transactions["source_db"], transactions["claimid"])
+        has_claim = transactions["claimid"].notna().to_numpy()
+        return transactions.assign(**{
+            BUCKET_COLUMN: (own % np.uint64(self.buckets)).astype(np.int16),
+            "transaction_key": own,
+            "claim_key": np.where(has_claim, claim, 0).astype(np.uint64),
+            "claim_found": has_claim & contains(self.claim_ids, claim)
+        })
+
+    def _linked_batches(self):
+        for batch in self._scan("claims", CLAIM_COLUMNS):
+            yield "claims", self.link_claims(batch)
+        for batch in self._scan("transactions", TRANSACTION_COLUMNS):
+            yield "transactions", self.link_transactions(batch)
+
+    def fingerprints(self) -> pd.DataFrame:
+        # Order-independent digest per bucket. The link flags are part of it, so a claim arriving in one
+        # bucket also re-matches transactions in other buckets that point at it.
+        digest = np.zeros(self.buckets, dtype=np.uint64)
+        rows = np.zeros(self.buckets, dtype=np.int64)
+        for kind, batch in self._linked_batches():
+            hashes = pd.util.hash_pandas_object(batch.assign(kind=kind), index=False).to_numpy()
+            np.add.at(digest, batch[BUCKET_COLUMN].to_numpy(), hashes)
+            rows += np.bincount(batch[BUCKET_COLUMN].to_numpy(), minlength=self.buckets)
+        return pd.DataFrame({
+            BUCKET_COLUMN: np.arange(self.buckets, dtype=np.int16),
+            "fingerprint": digest,
+            "rows": rows,
+            "settings": f"{self.buckets}:{self.tolerance}"
+        })
+
+    def _state_path(self):
+        return os.path.join(self.state_dir, "fingerprints.parquet")
+
+    def _summary_path(self):
+        return os.path.join(self.state_dir, "summary.parquet")
+
+    def _load_state(self):
+        paths = [self._state_path(), self._summary_path()]
+        if not all(os.path.exists(path) for path in paths) or not self.store.exists("gold", TABLE):
+            return None, None
+        return pd.read_parquet(self._state_path()), pd.read_parquet(self._summary_path())
+
+    def _save_state(self, state: pd.DataFrame, counts: pd.DataFrame):
+        os.makedirs(self.state_dir, exist_ok=True)
+        # The summary goes first: fingerprints without a matching summary force a rebuild on the next run.
+        for frame, path in [(counts, self._summary_path()), (state, self._state_path())]:
+            tmp_path = f"{path}.tmp"
+            frame.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+
+    def changed_buckets(self, previous: pd.DataFrame, current: pd.DataFrame) -> np.ndarray:
+        if previous is None or previous["settings"].iloc[0] != current["settings"].iloc[0]:
+            if self.store.exists("gold", TABLE):
+                logger.info(f"{TABLE} was built with other settings or without state, rebuilding every bucket")
+                self.store.clear("gold", TABLE)
+            return current[BUCKET_COLUMN].to_numpy()
+        changed = current["fingerprint"].to_numpy() != previous["fingerprint"].to_numpy()
+        return current.loc[changed, BUCKET_COLUMN].to_numpy()
+
+    def _groups(self, buckets: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        # Changed buckets are packed into groups of about chunk_rows rows, each reconciled in one go.
+        group = np.full(self.buckets, -1, dtype=np.int64)
+        group[buckets] = np.cumsum(rows[buckets]) // max(self.chunk_rows, 1)
+        return group
+
+    def spill(self, group: np.ndarray, spill_dir):
+        # One pass over both tables writes the rows of the changed buckets to a directory per group.
+        shutil.rmtree(spill_dir, ignore_errors=True)
+        seq = 0
+        for kind, batch in self._linked_batches():
+            groups = group[batch[BUCKET_COLUMN].to_numpy()]
+            for g in np.unique(groups[groups >= 0]):
+                part_dir = os.path.join(spill_dir, f"group={g}")
+                os.makedirs(part_dir, exist_ok=True)
+                pq.write_table(frame_to_arrow(batch[groups == g]), os.path.join(part_dir, f"{kind}-{seq:05d}.parquet"))
+                seq += 1
+
+    def _read_spill(self, part_dir, kind) -> pd.DataFrame:
+        files = sorted(f for f in os.listdir(part_dir) if f.startswith(f"{kind}-")) if os.path.isdir(part_dir) else []
+        if files:
+            return concat_frames([pd.read_parquet(os.path.join(part_dir, f)) for f in files])
+        columns = CLAIM_COLUMNS if kind == "claims" else TRANSACTION_COLUMNS
+        empty = apply_schema(pd.DataFrame({col: pd.Series(dtype="object") for col in columns}), "silver", kind)
+        return self.link_claims(empty) if kind == "claims" else self.link_transactions(empty)
+
+    def reconcile(self, claims: pd.DataFrame, transactions: pd.DataFrame) -> pd.DataFrame:
+        transactions = transactions.drop_duplicates(subset=["transaction_key"], keep="last").reset_index(drop=True)
+        index = pd.Index(transactions["transaction_key"].to_numpy())
+        pos = index.get_indexer(claims["transaction_key"].to_numpy())
+        forward = (pos >= 0) & (claims["transaction_key"].to_numpy() != 0)
+        pos = np.where(forward, pos, -1)
+        # Both directions agree when the matched transaction points back at the claim.
+        back = np.append(transactions["claim_key"].to_numpy(), np.uint64(0))[pos]
+        both = forward & (back == claims["claim_key"].to_numpy())
+        match_type = np.select(
+            [both, forward, claims["referenced"].to_numpy(dtype=bool)],
+            ["matched", "claim_to_transaction", "transaction_to_claim"],
+            "orphan_claim"
+        )
+
+        def take(column):
+            return pd.Series(transactions[column].array.take(pos, allow_fill=True), index=claims.index)
+
+        expected = (claims["claimamount"] - claims[DEDUCTIONS].fillna(0).sum(axis=1)).clip(lower=0)
+        transaction_paid = take("paidamount")
+        actual = transaction_paid.where(forward, claims["paidamount"]).fillna(0)
+        variance = actual - expected
+        status = np.select(
+            [actual.to_numpy() <= 0, variance.to_numpy() < -self.tolerance, variance.to_numpy() > self.tolerance],
+            ["unpaid", "underpaid", "overpaid"],
+            "paid"
+        )
+        claim_rows = pd.DataFrame({
+            "source_db": claims["source_db"],
+            "claimid": claims["claimid"],
+            "transactionid": claims["transactionid"],
+            "payorid": claims["payorid"],
+            "claimstatus": claims["claimstatus"],
+            "match_type": match_type,
+            "reconciliation_status": status,
+            "claim_date": claims["claim_date"],
+            "transaction_date": take("transaction_date"),
+            "claimamount": claims["claimamount"],
+            "expected_payment": expected,
+            "claim_paid": claims["paidamount"],
+            "transaction_amount": take("amount"),
+            "transaction_paid": transaction_paid,
+            "payment_variance": variance,
+            "posting_variance": claims["paidamount"] - transaction_paid,
+            BUCKET_COLUMN: claims[BUCKET_COLUMN]
+        })
+
+        # Transactions no claim points at, in either direction, get a row of their own.
+        referenced = np.zeros(len(transactions), dtype=bool)
+        referenced[pos[forward]] = True
+        orphans = transactions[~referenced & ~transactions["claim_found"].to_numpy(dtype=bool)]
+        orphan_rows = pd.DataFrame({
+            "source_db": orphans["source_db"],
+            "claimid": orphans["claimid"],
+            "transactionid": orphans["transactionid"],
+            "match_type": "orphan_transaction",
+            "reconciliation_status": "unclaimed",
+            "transaction_date": orphans["transaction_date"],
+            "transaction_amount": orphans["amount"],
+            "transaction_paid": orphans["paidamount"],
+            BUCKET_COLUMN: orphans[BUCKET_COLUMN]
+        })
+        return apply_schema(concat_frames([claim_rows, orphan_rows]), "gold", TABLE)
+
+    def bucket_counts(self, rows: pd.DataFrame) -> pd.DataFrame:
+        return rows.groupby([BUCKET_COLUMN] + SUMMARY_KEYS, observed=True).agg(
+            rows=("match_type", "size"), payment_variance=("payment_variance", "sum")
+        ).reset_index()
+
+    def run(self) -> pd.DataFrame:
+        with profiler.stage("model", TABLE) as record:
+            self.build_indexes()
+            current = self.fingerprints()
+            previous, counts = self._load_state()
+            changed = self.changed_buckets(previous, current)
+            record["rows_in"] = int(current["rows"].sum())
+            if len(changed) == 0:
+                logger.info(f"{TABLE} is up to date, no buckets changed")
+                record["rows_out"] = 0
+                return self.summary(counts)
+
+            # Per-bucket counts are kept in the state, so the summary never rescans the gold table.
+            parts = [] if counts is None else [counts[~counts[BUCKET_COLUMN].isin(changed)]]
+
+            group = self._groups(changed, current["rows"].to_numpy())
+            spill_dir = os.path.join(self.state_dir, "spill")
+            written = 0
+            try:
+                self.spill(group, spill_dir)
+                for g in range(int(group.max()) + 1):
+                    part_dir = os.path.join(spill_dir, f"group={g}")
+                    rows = self.reconcile(self._read_spill(part_dir, "claims"), self._read_spill(part_dir, "transactions"))
+                    # Buckets left without rows are still listed, so their old partitions are dropped.
+                    self.store.replace_partitions("gold", TABLE, rows, BUCKET_COLUMN, values=np.flatnonzero(group == g).tolist())
+                    parts.append(self.bucket_counts(rows))
+                    written += len(rows)
+            finally:
+                shutil.rmtree(spill_dir, ignore_errors=True)
+            counts = concat_frames(parts).reset_index(drop=True)
+            self._save_state(current, counts)
+            record["rows_out"] = written
+            logger.info(f"Reconciled {len(changed)}/{self.buckets} changed buckets of {TABLE}: {written} rows written")
+        return self.summary(counts)
+
+    def summary(self, counts: pd.DataFrame) -> pd.DataFrame:
+        if counts is None or counts.empty:
+            return pd.DataFrame()
+        summary = counts.groupby(SUMMARY_KEYS, observed=True)[["rows", "payment_variance"]].sum().reset_index()
+        logger.info(f"Claim reconciliation:\n{summary.to_string(index=False)}")
+        return summary
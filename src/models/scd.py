@@ -0,0 +1,140 @@
+import os
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from src.models.schema_definitions import DIM_PATIENTS, apply_schema, concat_frames
+from src.models.surrogate_keys import SurrogateKeyMap
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+BUCKET_COLUMN = "scd_bucket"
+SCD_FIELDS = ["patient_key", "effective_date", "end_date", "is_current", "row_hash", BUCKET_COLUMN]
+
+
+def tracked_columns():
+    value = os.getenv("SCD_TRACKED_COLUMNS", "first_name,last_name,phone,enterprise_patient_id")
+    return [col.strip() for col in value.split(",") if col.strip()]
+
+
+class SCD2Engine:
+    def __init__(self, store=None, table="dim_patients_scd", key="unified_patient_id", columns=None, tracked=None, buckets=None, keys=None):
+        self.store = store
+        self.keys = keys or SurrogateKeyMap("patients")
+        self.table = table
+        self.key = key
+        self.columns = columns or DIM_PATIENTS
+        self.tracked = tracked or tracked_columns()
+        self.buckets = buckets or int(os.getenv("SCD_BUCKETS", 64))
+        self.current_keys = None
+
+    def row_hash(self, df: pd.DataFrame) -> np.ndarray:
+        missing = [col for col in self.tracked if col not in df.columns]
+        if missing:
+            raise KeyError(f"SCD tracked columns missing from {self.table}: {missing}")
+        return pd.util.hash_pandas_object(df[self.tracked].astype("string"), index=False).to_numpy()
+
+    def bucket_of(self, keys: pd.Series) -> np.ndarray:
+        hashes = pd.util.hash_pandas_object(keys.astype("string"), index=False).to_numpy()
+        return (hashes % np.uint64(self.buckets)).astype(np.int16)
+
+    def _empty_current(self) -> pd.DataFrame:
+        return pd.DataFrame({
+            self.key: pd.Series(dtype="string"),
+            "patient_key": pd.Series(dtype="Int32"),
+            "row_hash": pd.Series(dtype="uint64")
+        })
+
+    def load_current(self) -> pd.DataFrame:
+        if self.store is None or not self.store.exists("gold", self.table):
+            return self._empty_current()
+        try:
+            current = self.store.read(
+                "gold", self.table,
+                columns=[self.key, "patient_key", "row_hash", BUCKET_COLUMN],
+                filters=[("is_current", "==", True)]
+            ).drop(columns=[BUCKET_COLUMN])
+        except Exception as e:
+            logger.warning(f"Stored {self.table} is not a bucketed SCD2 dimension, rebuilding it: {e}")
+            self.store.clear("gold", self.table)
+            return self._empty_current()
+        if current["row_hash"].isna().any():
+            logger.warning(f"{self.table} has versions without row_hash, they will be treated as changed")
+            current["row_hash"] = current["row_hash"].fillna(0)
+        return current.astype({"row_hash": "uint64"})
+
+    def diff(self, incoming: pd.DataFrame, current: pd.DataFrame):
+        hashes = self.row_hash(incoming)
+        position = pd.Index(current[self.key]).get_indexer(incoming[self.key])
+        is_new = position < 0
+        current_hashes = current["row_hash"].to_numpy()
+        is_changed = ~is_new
+        is_changed[~is_new] = current_hashes[position[~is_new]] != hashes[~is_new]
+        return hashes, position, is_new, is_changed
+
+    def open_versions(self, incoming: pd.DataFrame, current: pd.DataFrame, as_of):
+        incoming = incoming.drop_duplicates(subset=[self.key], keep="last").reset_index(drop=True)
+        hashes, _, is_new, is_changed = self.diff(incoming, current)
+
+        opened = incoming.loc[is_new | is_changed, self.columns].copy()
+        opened["row_hash"] = hashes[is_new | is_changed]
+
+        if len(self.keys) < len(current):
+            self.keys.register(current[self.key], current["patient_key"].to_numpy(dtype=np.int64, na_value=-1))
+        opened["patient_key"] = self.keys.to_series(opened[self.key])
+
+        opened["effective_date"] = as_of
+        opened["end_date"] = pd.NaT
+        opened["is_current"] = True
+        opened[BUCKET_COLUMN] = self.bucket_of(opened[self.key])
+
+        changed_ids = incoming.loc[is_changed, self.key]
+        logger.info(f"{self.table}: {int(is_new.sum())} new, {int(is_changed.sum())} changed, "
+                    f"{int(len(incoming) - is_new.sum() - is_changed.sum())} unchanged")
+        return apply_schema(opened, "gold", self.table), changed_ids
+
+    def close_versions(self, history: pd.DataFrame, changed_ids: pd.Series, as_of) -> pd.Series:
+        closing = history[self.key].isin(changed_ids) & history["is_current"].astype(bool)
+        history.loc[closing, "end_date"] = as_of
+        history.loc[closing, "is_current"] = False
+        return closing
+
+    def _refresh_current_keys(self, current: pd.DataFrame, opened: pd.DataFrame):
+        keys = concat_frames([current[[self.key, "patient_key"]], opened[[self.key, "patient_key"]]])
+        self.current_keys = keys.drop_duplicates(subset=[self.key], keep="last").reset_index(drop=True)
+
+    def merge(self, incoming: pd.DataFrame, history: pd.DataFrame = None, as_of=None) -> pd.DataFrame:
+        as_of = as_of or datetime.now()
+        history = history.copy() if history is not None else pd.DataFrame(columns=self.columns + SCD_FIELDS)
+        if "row_hash" not in history.columns or history["row_hash"].isna().any():
+            history["row_hash"] = self.row_hash(history) if len(history) else pd.Series(dtype="uint64")
+        current = history.loc[history["is_current"].astype(bool), [self.key, "patient_key", "row_hash"]]
+
+        opened, changed_ids = self.open_versions(incoming, current.astype({"row_hash": "uint64"}), as_of)
+        self.close_versions(history, changed_ids, as_of)
+        self._refresh_current_keys(current, opened)
+        if history.empty:
+            return opened
+        return apply_schema(concat_frames([history, opened]), "gold", self.table)
+
+    def apply(self, incoming: pd.DataFrame, as_of=None) -> pd.DataFrame:
+        as_of = as_of or datetime.now()
+        current = self.load_current()
+        opened, changed_ids = self.open_versions(incoming, current, as_of)
+        self._refresh_current_keys(current, opened)
+        if opened.empty:
+            logger.info(f"{self.table} is up to date, nothing written")
+            return opened
+
+        touched = sorted(opened[BUCKET_COLUMN].unique().tolist())
+        if self.store.exists("gold", self.table):
+            history = self.store.read("gold", self.table, filters=[(BUCKET_COLUMN, "in", touched)])
+        else:
+            history = opened.iloc[:0]
+        closing = self.close_versions(history, changed_ids, as_of)
+
+        rewritten = apply_schema(concat_frames([history, opened]), "gold", self.table)
+        path = self.store.replace_partitions("gold", self.table, rewritten, BUCKET_COLUMN)
+        logger.info(f"Rewrote {len(touched)}/{self.buckets} buckets of {path}: "
+                    f"{int(closing.sum())} versions closed, {len(opened)} opened")
+        return apply_schema(concat_frames([history[closing], opened]), "gold", self.table)
@@ -1,32 +1,377 @@
-DIM_PATIENTS = [
-    "unified_patient_id", "first_name", "last_name", "DOB", "gender",
-    "phone", "age", "source_db"
-]
-
-DIM_PROVIDERS = [
-    "ProviderID", "name", "specialty", "DeptID", "NPI", "source_db"
-]
-
-DIM_PROCEDURES = [
-    "ProcedureCode", "Description", "Category"
-]
-
-DIM_DEPARTMENTS = [
-    "DeptID", "Name"
-]
-
-DIM_DATE = [
-    "date", "year", "month", "quarter", "day_of_week"
-]
-
-FACT_TRANSACTIONS = [
-    "TransactionID", "unified_patient_id", "ProviderID", "ProcedureCode",
-    "transaction_date", "Amount", "PaidAmount", "payment_status",
-    "year", "month", "day_of_week", "source_db"
-]
-
-FACT_CLAIMS = [
-    "claim_id", "unified_patient_id", "ProviderID", "claim_date",
-    "amount_claimed", "amount_approved", "insurance_company",
-    "claim_status", "source_file", "Description", "Category"
-]
\ No newline at end of file
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+STRING = "string[pyarrow]"
+CATEGORY = "category"
+DATE = "datetime64[ns]"
+DATE_FORMAT = "%Y-%m-%d"
+# Other date layouts found in source files, tried in order on values the declared format rejects.
+DATE_FORMATS = (DATE_FORMAT, "%m/%d/%Y", "%Y/%m/%d", "%d-%m-%Y", "%Y%m%d")
+
+
+@dataclass(frozen=True)
+class Column:
+    name: str
+    dtype: str
+    nullable: bool = True
+    date_format: str = None
+    sql_type: str = None
+
+    @property
+    def is_date(self):
+        return self.dtype == DATE
+
+    @property
+    def is_categorical(self):
+        return self.dtype == CATEGORY
+
+
+def _text(*names, nullable=True):
+    return [Column(name, STRING, nullable) for name in names]
+
+def _category(*names, nullable=True):
+    return [Column(name, CATEGORY, nullable) for name in names]
+
+def _date(*names, nullable=True):
+    return [Column(name, DATE, nullable, DATE_FORMAT) for name in names]
+
+def _number(dtype, *names, nullable=True):
+    return [Column(name, dtype, nullable) for name in names]
+
+def _money(*names, nullable=True):
+    return [Column(name, "float64", nullable, sql_type="NUMERIC") for name in names]
+
+
+RAW_SCHEMAS = {
+    "patients": (
+        _text("PatientID", "FirstName", "LastName", "MiddleName", "SSN", "PhoneNumber", "Address")
+        + _text("ID", "F_Name", "L_Name", "M_Name")
+        + _category("Gender")
+        + _date("DOB", "ModifiedDate", "Updated_Date")
+        + _category("source_db")
+    ),
+    "providers": (
+        _text("ProviderID", "FirstName", "LastName", nullable=False)
+        + _category("Specialization", "DeptID")
+        + _number("Int64", "NPI")
+        + _category("source_db")
+    ),
+    "transactions": (
+        _text("TransactionID", "EncounterID", "PatientID", "ProviderID", nullable=False)
+        + _text("ClaimID", "PayorID", "MedicaidID", "MedicareID")
+        + _category("DeptID", "VisitType", "AmountType", "ICDCode", "LineOfBusiness")
+        + _date("VisitDate", "ServiceDate", "PaidDate", "InsertDate", "ModifiedDate")
+        + _number("float64", "Amount", "PaidAmount")
+        + _number("Int32", "ProcedureCode")
+        + _category("source_db")
+    ),
+    "encounters": (
+        _text("EncounterID", "PatientID", "ProviderID", nullable=False)
+        + _category("EncounterType", "DepartmentID")
+        + _date("EncounterDate", "InsertedDate", "ModifiedDate")
+        + _number("Int32", "ProcedureCode")
+        + _category("source_db")
+    ),
+    "departments": (
+        _text("DeptID", nullable=False)
+        + _category("Name", "source_db")
+    ),
+    "claims": (
+        _text("ClaimID", "PatientID", nullable=False)
+        + _text("TransactionID", "EncounterID", "ProviderID")
+        + _category("DeptID", "PayorID", "ClaimStatus", "PayorType", "source_file", "source_db")
+        + _date("ServiceDate", "ClaimDate", "InsertDate", "ModifiedDate")
+        + _number("float64", "ClaimAmount", "PaidAmount", "Deductible", "Coinsurance", "Copay")
+    ),
+    "cptcodes": (
+        _category("procedure_code_category", "code status")
+        + _text("cpt codes", "procedure_description")
+        + _number("Int32", "procedurecode")
+    )
+}
+
+SILVER_SCHEMAS = {
+    "patients": (
+        _text("patientid", "unified_patient_id", nullable=False)
+        + _text("first_name", "last_name", "middlename", "ssn", "phone", "phone_ext")
+        + _category("gender", "source_db", "source_file")
+        + _date("DOB", "modifieddate")
+        + _number("Int16", "age")
+        + _number("uint64", "identity_key")
+    ),
+    "providers": (
+        _text("providerid", nullable=False)
+        + _text("firstname", "lastname")
+        + _category("specialization", "deptid", "source_db")
+        + _number("Int64", "npi")
+    ),
+    "transactions": (
+        _text("transactionid", "unified_patient_id", nullable=False)
+        + _text("encounterid", "patientid", "providerid", "claimid", "payorid")
+        + _category("deptid", "visittype", "amounttype", "lineofbusiness", "source_db")
+        + _date("visitdate", "servicedate", "paiddate", "insertdate", "modifieddate", "transaction_date")
+        + _money("amount", "paidamount")
+        + _number("Int32", "procedurecode")
+    ),
+    "claims": (
+        _text("claimid", "unified_patient_id", nullable=False)
+        + _text("transactionid", "patientid", "encounterid", "providerid")
+        + _category("deptid", "payorid", "claimstatus", "payortype", "source_file", "source_db", "cpt_description", "cpt_category")
+        + _date("servicedate", "claim_date", "insertdate", "modifieddate")
+        + _money("claimamount", "paidamount", "deductible", "coinsurance", "copay", "amountclaimed", "amountapproved")
+        + _number("Int32", "procedurecode")
+    ),
+    "cptcodes": RAW_SCHEMAS["cptcodes"],
+    "patient_identity": (
+        _text("unified_patient_id", nullable=False)
+        + _number("Int64", "enterprise_patient_id")
+    )
+}
+
+SCD_COLUMNS = (
+    _number("Int32", "patient_key")
+    + [Column("effective_date", DATE, date_format="ISO8601"), Column("end_date", DATE, date_format="ISO8601")]
+    + [Column("is_current", "bool", nullable=False)]
+    + _number("uint64", "row_hash")
+    + _number("int16", "scd_bucket")
+)
+
+KEY_COLUMNS = _number("Int32", "patient_key", "provider_key", "procedure_key", "date_key")
+
+# AR analytics rows carry the grouping they were aggregated by; dimensions outside it stay null.
+AR_GROUP_COLUMNS = _category("grouping", "source_db", "deptid") + _text("payorid", "providerid")
+
+GOLD_SCHEMAS = {
+    # The versioned patient attributes; identifiers such as the SSN stay in silver.
+    "dim_patients_scd": (
+        _text("unified_patient_id", nullable=False)
+        + _number("Int64", "enterprise_patient_id")
+        + _text("first_name", "last_name")
+        + _date("DOB")
+        + _category("gender")
+        + _text("phone")
+        + _number("Int16", "age")
+        + _category("source_db")
+        + SCD_COLUMNS
+    ),
+    "dim_providers": SILVER_SCHEMAS["providers"] + _number("Int32", "provider_key"),
+    "dim_procedures": SILVER_SCHEMAS["cptcodes"] + _number("Int32", "procedure_key"),
+    "dim_date": (
+        _date("date", nullable=False)
+        + _number("int32", "date_key", nullable=False)
+        + _number("int16", "year", nullable=False)
+        + _number("int8", "month", "day", "quarter", "day_of_week", nullable=False)
+    ),
+    "fact_transactions": SILVER_SCHEMAS["transactions"] + KEY_COLUMNS,
+    "fact_claims": SILVER_SCHEMAS["claims"] + KEY_COLUMNS,
+    "fact_claim_reconciliation": (
+        _text("claimid", "transactionid")
+        + _category("source_db", "payorid", "claimstatus", "match_type", "reconciliation_status")
+        + _date("claim_date", "transaction_date")
+        + _money("claimamount", "expected_payment", "claim_paid", "transaction_amount", "transaction_paid",
+                 "payment_variance", "posting_variance")
+        + _number("int16", "recon_bucket", nullable=False)
+    ),
+    "agg_daily_revenue": (
+        _number("int32", "date_key", "month_key", nullable=False)
+        + _category("source_db", "deptid")
+        + _money("revenue", "paid")
+        + _number("int64", "transactions")
+    ),
+    "agg_monthly_payor_revenue": (
+        _number("int32", "month_key", nullable=False)
+        + _category("source_db")
+        + _text("payorid")
+        + _money("revenue", "paid")
+        + _number("int64", "transactions")
+    ),
+    "agg_daily_claims": (
+        _number("int32", "date_key", "month_key", nullable=False)
+        + _category("claimstatus", "payortype")
+        + _number("int64", "claims")
+        + _money("claimamount", "paidamount")
+    ),
+    "agg_daily_patients": (
+        _number("int32", "date_key", "month_key", nullable=False)
+        + _category("source_db")
+        + _text("patients_hll")
+        + _number("int64", "patients")
+    ),
+    "agg_ar_summary": (
+        AR_GROUP_COLUMNS
+        + _date("as_of_date")
+        + _number("int64", "transactions", "paid_transactions")
+        + _money("charges", "payments", "ar_balance", "avg_daily_charges")
+        + _number("float64", "days_in_ar", "avg_days_to_payment")
+    ),
+    "agg_ar_aging": (
+        AR_GROUP_COLUMNS
+        + _category("aging_bucket")
+        + _date("as_of_date")
+        + _number("int64", "open_items")
+        + _money("open_balance")
+    ),
+    "agg_claim_denials": (
+        AR_GROUP_COLUMNS
+        + _number("int64", "claims", "denied_claims", "dated_claims")
+        + _money("claimamount", "denied_amount")
+        + _number("float64", "denial_rate", "avg_claim_lag_days")
+    ),
+    "agg_collection_rolling": (
+        AR_GROUP_COLUMNS
+        + _date("date")
+        + _money("charges", "payments", "charges_30d", "payments_30d", "charges_90d", "payments_90d")
+        + _number("float64", "collection_rate_30d", "collection_rate_90d")
+    )
+}
+
+COLUMN_ALIASES = {
+    "patients": {
+        "id": "patientid",
+        "f_name": "first_name",
+        "l_name": "last_name",
+        "m_name": "middlename",
+        "updated_date": "modifieddate"
+    }
+}
+
+# Source columns renamed on their way to silver, besides lower-casing.
+SOURCE_RENAMES = {
+    "patients": {
+        "firstname": "first_name",
+        "lastname": "last_name",
+        "dob": "DOB",
+        "phonenumber": "phone"
+    },
+    "claims": {"claimdate": "claim_date"}
+}
+
+LAYER_SCHEMAS = {
+    "raw": RAW_SCHEMAS,
+    "bronze": RAW_SCHEMAS,
+    "silver": SILVER_SCHEMAS,
+    "gold": GOLD_SCHEMAS
+}
+
+
+def get_schema(layer: str, table: str) -> list:
+    if layer == "silver" and table.endswith("_cleaned"):
+        table = table[:-len("_cleaned")]
+    return LAYER_SCHEMAS.get(layer, {}).get(table, [])
+
+
+def column_names(layer: str, table: str) -> list:
+    return [col.name for col in get_schema(layer, table)]
+
+
+def csv_read_options(layer: str, table: str, header: list) -> dict:
+    schema = {col.name: col for col in get_schema(layer, table) if col.name in header}
+    return {
+        "dtype": {name: col.dtype for name, col in schema.items() if not col.is_date},
+        "parse_dates": [name for name, col in schema.items() if col.is_date],
+        "date_format": {name: col.date_format for name, col in schema.items() if col.is_date}
+    }
+
+
+def read_csv_typed(path, layer: str, table: str, **kwargs) -> pd.DataFrame:
+    header = pd.read_csv(path, nrows=0).columns
+    if kwargs.get("usecols") is not None:
+        header = [col for col in header if col in kwargs["usecols"]]
+        kwargs["usecols"] = header
+    return pd.read_csv(path, **csv_read_options(layer, table, list(header)), **kwargs)
+
+
+def source_columns(table: str, extra=()) -> list:
+    # Raw columns that reach the silver schema after lower-casing, renames and aliases, plus any
+    # extra ones asked for. Tables without a silver schema are read whole (None).
+    if table not in SILVER_SCHEMAS:
+        return None
+    silver = set(column_names("silver", table))
+    renames = {**SOURCE_RENAMES.get(table, {}), **COLUMN_ALIASES.get(table, {})}
+    return [
+        col.name for col in RAW_SCHEMAS[table]
+        if col.name in extra or renames.get(col.name.lower(), col.name.lower()) in silver
+    ]
+
+
+def parse_dates(series: pd.Series, date_format: str = DATE_FORMAT, fallbacks=DATE_FORMATS) -> pd.Series:
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    text = series.astype("string").str.strip()
+    parsed = pd.to_datetime(text, format=date_format, errors="coerce")
+    for fmt in fallbacks:
+        pending = parsed.isna() & text.notna()
+        if not pending.any():
+            break
+        if fmt != date_format:
+            parsed[pending] = pd.to_datetime(text[pending], format=fmt, errors="coerce")
+    return parsed
+
+
+def apply_schema(df: pd.DataFrame, layer: str, table: str) -> pd.DataFrame:
+    # Returns a typed frame and leaves the caller's untouched; parsed date columns go into a
+    # shallow copy, so the columns that are already typed are not copied.
+    casts, typed = {}, df
+    for col in get_schema(layer, table):
+        if col.name not in df.columns:
+            continue
+        series = df[col.name]
+        if col.is_date:
+            if not pd.api.types.is_datetime64_any_dtype(series):
+                if typed is df:
+                    typed = df.copy(deep=False)
+                typed[col.name] = parse_dates(series, col.date_format)
+            elif series.dtype != pd.api.types.pandas_dtype(col.dtype) and getattr(series.dtype, "tz", None) is None:
+                casts[col.name] = col.dtype
+        elif series.dtype != pd.api.types.pandas_dtype(col.dtype):
+            casts[col.name] = col.dtype
+        if not col.nullable and series.isna().any():
+            logger.warning(f"Column '{col.name}' in {layer}.{table} is declared non-nullable but has {int(series.isna().sum())} nulls")
+    return typed.astype(casts) if casts else typed
+
+
+def empty_frame(layer: str, table: str) -> pd.DataFrame:
+    return apply_schema(pd.DataFrame(columns=column_names(layer, table)), layer, table)
+
+
+def constant_category(value, length: int) -> pd.Categorical:
+    return pd.Categorical.from_codes(np.zeros(length, dtype=np.int8), categories=[value])
+
+
+def concat_frames(frames: list) -> pd.DataFrame:
+    frames = [df for df in frames if df is not None]
+    # Empty frames add no rows and only trip pandas' empty-entry dtype warning; the first one keeps the schema.
+    non_empty = [df for df in frames if len(df)]
+    if frames and not non_empty:
+        return frames[0].iloc[0:0].reset_index(drop=True)
+    # Shallow copies, so aligning categories never touches the caller's frames.
+    frames = [df.copy(deep=False) for df in non_empty]
+    for col in frames[0].columns if frames else []:
+        dtypes = [df[col].dtype for df in frames if col in df.columns]
+        if all(isinstance(dtype, pd.CategoricalDtype) for dtype in dtypes):
+            categories = dtypes[0].categories
+            for dtype in dtypes[1:]:
+                categories = categories.union(dtype.categories)
+            for df in frames:
+                if col in df.columns:
+                    df[col] = df[col].cat.set_categories(categories)
+    return pd.concat(frames, ignore_index=True)
+
+
+DIM_PATIENTS = [col for col in column_names("gold", "dim_patients_scd") if col not in {c.name for c in SCD_COLUMNS}]
+
+DIM_PROVIDERS = column_names("gold", "dim_providers")
+
+DIM_PROCEDURES = column_names("gold", "dim_procedures")
+
+DIM_DEPARTMENTS = column_names("raw", "departments")
+
+DIM_DATE = column_names("gold", "dim_date")
+
+FACT_TRANSACTIONS = column_names("gold", "fact_transactions")
+
+FACT_CLAIMS = column_names("gold", "fact_claims")
@@ -0,0 +1,108 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+KEY_STATE_DIR = "data/state/keys"
+
+
+def hash_keys(natural_keys) -> np.ndarray:
+    return pd.util.hash_pandas_object(pd.Series(natural_keys).astype("string"), index=False).to_numpy()
+
+
+class SurrogateKeyMap:
+    def __init__(self, dimension, state_dir=KEY_STATE_DIR):
+        self.dimension = dimension
+        self.path = os.path.join(state_dir, f"{dimension}.parquet")
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if os.path.exists(self.path):
+            table = pq.read_table(self.path)
+            self.hashes = table.column("key_hash").to_numpy()
+            self.keys = table.column("surrogate_key").to_numpy()
+            self.natural = table.column("natural_key").to_numpy(zero_copy_only=False).astype(object)
+        else:
+            self.hashes = np.empty(0, dtype=np.uint64)
+            self.keys = np.empty(0, dtype=np.int64)
+            self.natural = np.empty(0, dtype=object)
+        self.next_key = int(self.keys.max()) + 1 if len(self.keys) else 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _positions(self, hashes, natural) -> np.ndarray:
+        if len(self.hashes) == 0:
+            return np.full(len(hashes), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.hashes, hashes), len(self.hashes) - 1)
+        found = self.hashes[pos] == hashes
+        collided = found & (self.natural[pos] != natural)
+        if collided.any():
+            raise ValueError(f"Hash collision in {self.dimension} surrogate keys for {natural[collided][:5].tolist()}")
+        return np.where(found, pos, -1)
+
+    def lookup(self, natural_keys) -> np.ndarray:
+        natural = pd.Series(natural_keys).astype("string")
+        keys = np.full(len(natural), -1, dtype=np.int64)
+        valid = natural.notna().to_numpy()
+        if len(self.keys) == 0 or not valid.any():
+            return keys
+        values = natural[valid].to_numpy(dtype=object)
+        pos = self._positions(hash_keys(values), values)
+        keys[valid] = np.where(pos >= 0, self.keys[pos], -1)
+        return keys
+
+    def _insert(self, hashes, natural, keys):
+        order = np.argsort(np.concatenate([self.hashes, hashes]), kind="stable")
+        self.hashes = np.concatenate([self.hashes, hashes])[order]
+        self.keys = np.concatenate([self.keys, keys])[order]
+        self.natural = np.concatenate([self.natural, natural])[order]
+        self.next_key = max(self.next_key, int(keys.max()) + 1)
+
+    def assign(self, natural_keys) -> np.ndarray:
+        natural_keys = pd.Series(natural_keys)
+        with self._lock:
+            keys = self.lookup(natural_keys)
+            unseen = natural_keys[(keys < 0) & natural_keys.notna().to_numpy()].astype("string").drop_duplicates().sort_values()
+            if len(unseen):
+                natural = unseen.to_numpy(dtype=object)
+                new_keys = np.arange(self.next_key, self.next_key + len(natural), dtype=np.int64)
+                self._insert(hash_keys(natural), natural, new_keys)
+                self.save()
+                logger.info(f"Assigned {len(natural)} new {self.dimension} surrogate keys ({len(self)} total)")
+                keys = self.lookup(natural_keys)
+        return keys
+
+    def register(self, natural_keys, keys):
+        pairs = pd.DataFrame({"natural": pd.Series(natural_keys).astype("string").to_numpy(dtype=object), "key": np.asarray(keys, dtype=np.int64)})
+        pairs = pairs[pairs["natural"].notna() & (pairs["key"] >= 0)].drop_duplicates(subset=["natural"])
+        with self._lock:
+            pairs = pairs[self.lookup(pairs["natural"]) < 0]
+            if pairs.empty:
+                return
+            natural = pairs["natural"].to_numpy(dtype=object)
+            self._insert(hash_keys(natural), natural, pairs["key"].to_numpy())
+            self.save()
+            logger.info(f"Registered {len(pairs)} existing {self.dimension} keys")
+
+    def to_series(self, natural_keys, dtype="Int32") -> pd.Series:
+        index = natural_keys.index if isinstance(natural_keys, pd.Series) else None
+        keys = pd.Series(self.assign(natural_keys), index=index)
+        return keys.where(keys >= 0).astype(dtype)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        table = pa.table({
+            "key_hash": pa.array(self.hashes, type=pa.uint64()),
+            "natural_key": pa.array(self.natural, type=pa.string()),
+            "surrogate_key": pa.array(self.keys, type=pa.int64())
+        })
+        tmp_path = f"{self.path}.tmp"
+        pq.write_table(table, tmp_path, compression="zstd")
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,98 @@
+import os
+import numpy as np
+import pandas as pd
+from src.models import schema_definitions
+from src.models.schema_definitions import COLUMN_ALIASES, DATE_FORMATS, STRING
+
+EXTENSION_PATTERN = r"(?i)(?:x|ext\.?)\s*\d+\s*$"
+EMAIL_PATTERN = r"[^@\s]+@[^@\s]+\.[^@\s]+"
+GENDER_MAP = {"M": "Male", "F": "Female", "MALE": "Male", "FEMALE": "Female"}
+
+
+def normalize_phone(series: pd.Series, country_code: str = None):
+    country_code = country_code or os.getenv("PHONE_COUNTRY_CODE", "+91")
+    text = series.astype(STRING)
+    # One regex pass drops a trailing extension and every non-digit.
+    digits = text.str.replace(EXTENSION_PATTERN + r"|\D", "", regex=True)
+    phone = (country_code + "-" + digits.str[-10:]).where(digits.str.len() >= 10)
+
+    extension = pd.Series(pd.NA, index=text.index, dtype=STRING)
+    has_extension = text.str.contains(EXTENSION_PATTERN, regex=True).fillna(False).astype(bool)
+    if has_extension.any():
+        extension[has_extension] = text[has_extension].str.replace(r"(?i)^.*?(?:x|ext\.?)\s*(\d+)\s*$", r"\1", regex=True)
+    return phone, extension
+
+
+def validate_email(series: pd.Series) -> pd.Series:
+    return series.astype("string").str.strip().str.fullmatch(EMAIL_PATTERN).fillna(False).astype(bool)
+
+
+def parse_dates(series: pd.Series, formats=DATE_FORMATS) -> pd.Series:
+    return schema_definitions.parse_dates(series, formats[0], formats[1:])
+
+
+def normalize_names(series: pd.Series) -> pd.Series:
+    # Only all-upper or all-lower names are title-cased; mixed case such as "McDonald" is kept as entered.
+    names = series.astype("string").str.strip().str.replace(r"\s+", " ", regex=True)
+    single_case = ((names == names.str.upper()) | (names == names.str.lower())).fillna(False).astype(bool)
+    return names.mask(single_case, names.str.title())
+
+
+def standardize_gender(series: pd.Series) -> pd.Series:
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Map the handful of categories, then remap the integer codes.
+        mapped = standardize_gender(series.cat.categories.to_series()).astype("string").to_numpy()
+        categories = pd.Index(np.append(mapped, "Unknown")).unique()
+        lookup = categories.get_indexer(np.append(mapped, "Unknown"))
+        codes = lookup[series.cat.codes.to_numpy()]
+        return pd.Series(pd.Categorical.from_codes(codes, categories=categories), index=series.index)
+
+    upper = series.astype("string").str.strip().str.upper()
+    return upper.map(GENDER_MAP).fillna("Unknown").astype("category")
+
+
+def compute_age(dob: pd.Series, as_of=None) -> pd.Series:
+    as_of = pd.Timestamp.now() if as_of is None else pd.Timestamp(as_of)
+    days = (as_of - dob).dt.days
+    return (days // 365.25).astype("Int16")
+
+
+def identity_key(first_name: pd.Series, last_name: pd.Series, dob: pd.Series) -> pd.Series:
+    key = (
+        first_name.astype("string").str.strip().str.lower().fillna("")
+        + "_" + last_name.astype("string").str.strip().str.lower().fillna("")
+        + "_" + dob.dt.strftime("%Y%m%d").astype("string").fillna("")
+    )
+    return pd.util.hash_pandas_object(key, index=False)
+
+
+# Source alignment: these change which rows and values reach silver, not just their dtypes.
+
+def coalesce_aliases(df: pd.DataFrame, table: str) -> pd.DataFrame:
+    # Hospital B names its patient columns ID/F_Name/L_Name/...; without this they were dropped and
+    # every Hospital B patient shared one unified_patient_id.
+    for alias, name in COLUMN_ALIASES.get(table, {}).items():
+        if alias not in df.columns:
+            continue
+        if name in df.columns:
+            df[name] = df[name].fillna(df[alias])
+            df = df.drop(columns=[alias])
+        else:
+            df = df.rename(columns={alias: name})
+    return df
+
+
+def unified_patient_id(df: pd.DataFrame) -> pd.Series:
+    # source_db is set on every extracted table, so patients, transactions and claims get matching
+    # ids; source_file (claims only) is the fallback.
+    source_col = "source_db" if "source_db" in df.columns else "source_file"
+    return df["patientid"].astype("string") + "_" + df[source_col].astype("string")
+
+
+def fill_transaction_date(df: pd.DataFrame) -> pd.DataFrame:
+    # Sources without a transaction date use the service date instead of leaving it NaT.
+    if "transaction_date" not in df.columns and "transactiondate" in df.columns:
+        df = df.rename(columns={"transactiondate": "transaction_date"})
+    elif "transaction_date" not in df.columns and "servicedate" in df.columns:
+        df["transaction_date"] = df["servicedate"]
+    return df
@@ -0,0 +1,151 @@
+import hashlib
+import os
+import numpy as np
+import pandas as pd
+from src.models.schema_definitions import apply_schema, read_csv_typed
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+CPT_REFERENCE_PATH = "data/raw/reference/cptcodes.csv"
+CPT_CACHE_DIR = "data/cache"
+
+_loaded = {}
+
+
+def read_cpt_reference(path=CPT_REFERENCE_PATH) -> pd.DataFrame:
+    df = read_csv_typed(path, "raw", "cptcodes")
+    df.columns = df.columns.str.strip().str.lower()
+    df = df.rename(columns={
+        "procedure code category": "procedure_code_category",
+        "procedure code descriptions": "procedure_description"
+    })
+    df["procedurecode"] = pd.to_numeric(df["cpt codes"].astype("string").str.strip(), errors="coerce")
+    return apply_schema(df, "raw", "cptcodes")
+
+
+def file_digest(path) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()[:16]
+
+
+def frame_digest(df: pd.DataFrame) -> str:
+    rows = pd.util.hash_pandas_object(df[sorted(df.columns)], index=False).to_numpy()
+    return hashlib.sha256(rows.tobytes()).hexdigest()[:16]
+
+
+class CPTIndex:
+    def __init__(self, codes, category_codes, categories, description_codes, descriptions, status_codes, statuses, digest=None):
+        self.codes = codes
+        self.category_codes = category_codes
+        self.categories = categories
+        self.description_codes = description_codes
+        self.descriptions = descriptions
+        self.status_codes = status_codes
+        self.statuses = statuses
+        self.digest = digest
+
+    @classmethod
+    def from_frame(cls, cpt_df: pd.DataFrame, digest=None):
+        df = cpt_df[cpt_df["procedurecode"].notna()].drop_duplicates(subset=["procedurecode"])
+        df = df.sort_values("procedurecode")
+        category = df["procedure_code_category"].astype("category")
+        description = df["procedure_description"].astype("category")
+        status = df["code status"].astype("category") if "code status" in df.columns else pd.Series(pd.Categorical([None] * len(df)))
+        return cls(
+            codes=df["procedurecode"].to_numpy(dtype=np.int32),
+            category_codes=category.cat.codes.to_numpy(),
+            categories=category.cat.categories.to_numpy(dtype=str),
+            description_codes=description.cat.codes.to_numpy(),
+            descriptions=description.cat.categories.to_numpy(dtype=str),
+            status_codes=status.cat.codes.to_numpy(),
+            statuses=status.cat.categories.to_numpy(dtype=str),
+            digest=digest
+        )
+
+    @classmethod
+    def from_extract(cls, cpt_df: pd.DataFrame):
+        # Keyed by content, so every stage handed the same extract shares one index.
+        digest = frame_digest(cpt_df)
+        if digest not in _loaded:
+            _loaded[digest] = cls.from_frame(cpt_df, digest=digest)
+            logger.info(f"Built CPT index {digest} with {len(_loaded[digest].codes)} codes from the extracted cptcodes")
+        return _loaded[digest]
+
+    @classmethod
+    def load(cls, path=CPT_REFERENCE_PATH, cache_dir=CPT_CACHE_DIR):
+        digest = file_digest(path)
+        if digest in _loaded:
+            return _loaded[digest]
+
+        cache_path = os.path.join(cache_dir, f"cpt_index_{digest}.npz")
+        if os.path.exists(cache_path):
+            with np.load(cache_path, allow_pickle=False) as arrays:
+                index = cls(**{name: arrays[name] for name in arrays.files}, digest=digest)
+            logger.info(f"Loaded CPT index {digest} from {cache_path}")
+        else:
+            index = cls.from_frame(read_cpt_reference(path), digest=digest)
+            os.makedirs(cache_dir, exist_ok=True)
+            np.savez_compressed(cache_path, **index.arrays())
+            logger.info(f"Built CPT index {digest} with {len(index.codes)} codes, cached at {cache_path}")
+
+        _loaded[digest] = index
+        return index
+
+    def arrays(self) -> dict:
+        return {
+            "codes": self.codes,
+            "category_codes": self.category_codes,
+            "categories": self.categories,
+            "description_codes": self.description_codes,
+            "descriptions": self.descriptions,
+            "status_codes": self.status_codes,
+            "statuses": self.statuses
+        }
+
+    def positions(self, codes) -> np.ndarray:
+        values = pd.Series(codes).to_numpy(dtype=np.int64, na_value=-1)
+        if len(self.codes) == 0:
+            return np.full(len(values), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.codes, values), len(self.codes) - 1)
+        return np.where(self.codes[pos] == values, pos, -1)
+
+    def _take(self, codes, categories, pos, index) -> pd.Series:
+        taken = np.where(pos >= 0, codes[pos], -1)
+        return pd.Series(pd.Categorical.from_codes(taken, categories=categories), index=index)
+
+    def unmatched(self, codes) -> int:
+        return int(((self.positions(codes) < 0) & pd.Series(codes).notna().to_numpy()).sum())
+
+    def enrich(self, df: pd.DataFrame, code_col="procedurecode") -> pd.DataFrame:
+        pos = self.positions(df[code_col])
+        df["cpt_description"] = self._take(self.description_codes, self.descriptions, pos, df.index)
+        df["cpt_category"] = self._take(self.category_codes, self.categories, pos, df.index)
+        return df
+
+    def to_frame(self) -> pd.DataFrame:
+        pos = np.arange(len(self.codes))
+        df = pd.DataFrame({
+            "procedure_code_category": self._take(self.category_codes, self.categories, pos, None),
+            "cpt codes": self.codes.astype(str),
+            "procedure_description": self._take(self.description_codes, self.descriptions, pos, None),
+            "code status": self._take(self.status_codes, self.statuses, pos, None),
+            "procedurecode": self.codes
+        })
+        return apply_schema(df, "raw", "cptcodes")
+
+
+def load_cpt_index(cpt=None, path=CPT_REFERENCE_PATH) -> CPTIndex:
+    # An extracted cptcodes frame wins over the reference file, which may predate it.
+    if isinstance(cpt, CPTIndex):
+        return cpt
+    if cpt is not None and not cpt.empty and "procedurecode" in cpt.columns:
+        return CPTIndex.from_extract(cpt)
+    if os.path.exists(path):
+        return CPTIndex.load(path)
+    logger.warning(f"No CPT reference available at {path}, procedure codes will not be enriched")
+    cpt = pd.DataFrame(columns=["procedurecode", "procedure_code_category", "procedure_description"])
+    return CPTIndex.from_frame(cpt)
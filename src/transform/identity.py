@@ -0,0 +1,194 @@
+import os
+import numpy as np
+import pandas as pd
+from src.models.schema_definitions import apply_schema
+from src.models.surrogate_keys import KEY_STATE_DIR, SurrogateKeyMap
+from src.utils.logger import get_logger
+from src.utils.profiling import profiler
+
+logger = get_logger(__name__)
+
+IDENTITY_COLUMNS = ["unified_patient_id", "first_name", "last_name", "DOB", "ssn", "phone", "gender", "source_db"]
+# Vowels code to 0 and separate repeated consonants, H and W (9) do not.
+SOUNDEX_CODES = str.maketrans("AEIOUYHWBFPVCGJKQSXZDTLMNR", "00000099111122222222334556")
+BLOCKING_KEYS = [
+    ("dob", "last_soundex"),
+    ("dob", "phone_suffix"),
+    ("last_soundex", "first_initial", "phone_suffix")
+]
+# (agree, disagree) weights; a value missing on either side scores nothing.
+MATCH_WEIGHTS = {
+    "ssn": (5.0, -5.0),
+    "dob": (2.0, -2.0),
+    "last_name": (2.0, -1.0),
+    "first_name": (2.0, -1.0),
+    "phone": (2.0, 0.0),
+    "gender": (0.0, -1.0)
+}
+# Partial credit when the exact values differ: same-sounding names, same last four phone digits.
+PARTIAL_MATCHES = {"last_name": "last_soundex", "first_name": "first_soundex", "phone": "phone_suffix"}
+
+
+def soundex(names: pd.Series) -> pd.Series:
+    # Coded once per distinct name and broadcast back through the factorized codes.
+    codes, uniques = pd.factorize(names.astype("string"))
+    letters = pd.Series(uniques, dtype="string").str.upper().str.replace(r"[^A-Z]", "", regex=True)
+    digits = letters.str.translate(SOUNDEX_CODES)
+    coded = digits.str[0].str.replace("9", "0") + digits.str[1:].str.replace("9", "", regex=False)
+    for digit in "0123456":
+        coded = coded.str.replace(f"{digit}+", digit, regex=True)
+    coded = coded.str[1:].str.replace("0", "", regex=False)
+    unique_codes = (letters.str[0] + coded + "000").str[:4].where(letters.str.len() > 0)
+    result = pd.array(np.append(unique_codes.to_numpy(dtype=object), None)[codes], dtype="string")
+    return pd.Series(result, index=names.index)
+
+
+def normalize_name(names: pd.Series) -> pd.Series:
+    return names.str.strip().str.lower()
+
+
+def field_codes(factorized, normalize=None) -> np.ndarray:
+    # Equal values share an integer code and missing ones get -1, so fields compare as integers.
+    # Normalization runs once per distinct value.
+    codes, uniques = factorized
+    if normalize is not None:
+        normalized = normalize(pd.Series(uniques).astype("string")).replace("", pd.NA)
+        codes = np.append(pd.factorize(normalized)[0], -1)[codes]
+    return codes
+
+
+def block_pairs(keys: np.ndarray, valid: np.ndarray, candidates: np.ndarray, max_block: int):
+    # Sort rows by blocking key and pair every row with the rows after it in its block. Only blocks
+    # holding a candidate row are expanded, and blocks above max_block (common keys) are skipped.
+    rows = np.flatnonzero(valid)
+    order = rows[np.argsort(keys[rows], kind="stable")]
+    sorted_keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]) if len(order) else np.empty(0, dtype=np.int64)
+    sizes = np.diff(np.r_[starts, len(order)])
+    block = np.repeat(np.arange(len(starts)), sizes)
+    with_candidates = np.bincount(block, weights=candidates[order], minlength=len(starts)) > 0
+    keep = with_candidates & (sizes > 1) & (sizes <= max_block)
+    skipped = int((with_candidates & (sizes > max_block)).sum())
+
+    order = order[keep[block]]
+    kept_sizes = sizes[keep]
+    end = np.repeat(np.cumsum(kept_sizes), kept_sizes)
+    active = np.arange(len(order))
+    left, right = [], []
+    for offset in range(1, int(kept_sizes.max()) if len(kept_sizes) else 1):
+        active = active[active + offset < end[active]]
+        left.append(order[active])
+        right.append(order[active + offset])
+    if not left:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), skipped
+    return np.concatenate(left), np.concatenate(right), skipped
+
+
+def connected_components(left: np.ndarray, right: np.ndarray, n: int) -> np.ndarray:
+    # Array union-find: hook every root onto the smallest root it is linked to, then flatten by pointer jumping.
+    parent = np.arange(n)
+    while True:
+        root_left, root_right = parent[left], parent[right]
+        linked = root_left != root_right
+        if not linked.any():
+            return parent
+        low = np.minimum(root_left[linked], root_right[linked])
+        np.minimum.at(parent, root_left[linked], low)
+        np.minimum.at(parent, root_right[linked], low)
+        while True:
+            grandparent = parent[parent]
+            if (grandparent == parent).all():
+                break
+            parent = grandparent
+
+
+class IdentityResolver:
+    def __init__(self, state_dir=KEY_STATE_DIR, threshold=None, max_block=None):
+        self.ids = SurrogateKeyMap("enterprise_patients", state_dir)
+        self.threshold = threshold if threshold is not None else float(os.getenv("IDENTITY_MATCH_THRESHOLD", 6))
+        self.max_block = max_block or int(os.getenv("IDENTITY_MAX_BLOCK", 50))
+
+    def features(self, df: pd.DataFrame) -> dict:
+        first_name, last_name, phone = (pd.factorize(df[col]) for col in ["first_name", "last_name", "phone"])
+        return {
+            "ssn": field_codes(pd.factorize(df["ssn"]), lambda s: s.str.replace(r"\D", "", regex=True)),
+            "dob": field_codes(pd.factorize(df["DOB"])),
+            "first_name": field_codes(first_name, normalize_name),
+            "last_name": field_codes(last_name, normalize_name),
+            "phone": field_codes(phone),
+            "gender": field_codes(pd.factorize(df["gender"]), lambda s: s.where(s != "Unknown")),
+            "first_soundex": field_codes(first_name, lambda s: soundex(normalize_name(s))),
+            "last_soundex": field_codes(last_name, lambda s: soundex(normalize_name(s))),
+            "first_initial": field_codes(first_name, lambda s: normalize_name(s).str[0]),
+            "phone_suffix": field_codes(phone, lambda s: s.str[-4:])
+        }
+
+    def candidate_pairs(self, features: dict, sources: np.ndarray, candidates: np.ndarray):
+        pairs, skipped = [], 0
+        for fields in BLOCKING_KEYS:
+            valid = np.logical_and.reduce([features[name] >= 0 for name in fields])
+            keys = pd.util.hash_pandas_object(pd.DataFrame({name: features[name] for name in fields}), index=False).to_numpy()
+            left, right, oversized = block_pairs(keys, valid, candidates, self.max_block)
+            skipped += oversized
+            # Same-hospital duplicates keep their own records; only pairs across hospitals are linked.
+            keep = (sources[left] != sources[right]) & (candidates[left] | candidates[right])
+            low, high = np.minimum(left[keep], right[keep]), np.maximum(left[keep], right[keep])
+            pairs.append(low.astype(np.int64) * len(sources) + high)
+        if skipped:
+            logger.warning(f"Skipped {skipped} blocks larger than {self.max_block} rows; raise IDENTITY_MAX_BLOCK to compare them")
+        pairs = pd.unique(np.concatenate(pairs))
+        return pairs // len(sources), pairs % len(sources)
+
+    def score(self, features: dict, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+        scores = np.zeros(len(left))
+        for name, (agree, disagree) in MATCH_WEIGHTS.items():
+            codes = features[name]
+            compared = (codes[left] >= 0) & (codes[right] >= 0)
+            same = codes[left] == codes[right]
+            scores += np.where(compared & same, agree, 0.0) + np.where(compared & ~same, disagree, 0.0)
+            if name in PARTIAL_MATCHES:
+                partial_codes = features[PARTIAL_MATCHES[name]]
+                partial = compared & ~same & (partial_codes[left] >= 0) & (partial_codes[left] == partial_codes[right])
+                scores += np.where(partial, agree / 2 - disagree, 0.0)
+        return scores
+
+    def assign(self, natural: np.ndarray, known: np.ndarray, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+        # Clusters that already hold an enterprise ID keep it; new patients join it, other clusters get a new one.
+        edges, nodes = pd.factorize(np.concatenate([left, right]))
+        labels = np.arange(len(natural))
+        labels[nodes] = nodes[connected_components(edges[:len(left)], edges[len(left):], len(nodes))]
+
+        clusters = pd.DataFrame({"label": labels, "known": np.where(known >= 0, known, np.nan)})
+        existing = clusters.groupby("label")["known"].agg(["min", "nunique"])
+        bridged = int((existing["nunique"] > 1).sum())
+        if bridged:
+            logger.warning(f"{bridged} clusters of new patients link several existing enterprise IDs; they join the lowest, the others are kept")
+
+        cluster_ids = existing["min"].to_numpy(copy=True)
+        fresh = np.isnan(cluster_ids)
+        cluster_ids[fresh] = self.ids.next_key + np.arange(int(fresh.sum()))
+        ids = cluster_ids[existing.index.get_indexer(labels)].astype(np.int64)
+        return np.where(known >= 0, known, ids)
+
+    def resolve(self, patients: pd.DataFrame) -> pd.DataFrame:
+        df = patients.drop_duplicates(subset=["unified_patient_id"], keep="last").reset_index(drop=True)
+        natural = df["unified_patient_id"].astype("string").to_numpy(dtype=object)
+        with profiler.stage("transform", "patient_identity", len(df)) as record:
+            known = self.ids.lookup(natural)
+            candidates = known < 0
+            if candidates.any():
+                features = self.features(df)
+                sources = pd.factorize(df["source_db"])[0]
+                left, right = self.candidate_pairs(features, sources, candidates)
+                scores = self.score(features, left, right)
+                matched = scores >= self.threshold
+                ids = self.assign(natural, known, left[matched], right[matched])
+                self.ids.register(natural[candidates], ids[candidates])
+                logger.info(f"Resolved {int(candidates.sum())} new patients: {len(left)} candidate pairs compared, "
+                            f"{int(matched.sum())} matched, {len(pd.unique(ids))} enterprise patients for {len(df)} records")
+            else:
+                ids = known
+                logger.info(f"No new patients to resolve, {len(pd.unique(ids))} enterprise patients for {len(df)} records")
+            identity = pd.DataFrame({"unified_patient_id": df["unified_patient_id"], "enterprise_patient_id": ids})
+            record["rows_out"] = len(identity)
+        return apply_schema(identity, "silver", "patient_identity")
@@ -1,161 +1,144 @@
 import pandas as pd
-import numpy as np
 import logging
-import re
-from datetime import datetime
+from src.models.schema_definitions import SOURCE_RENAMES, apply_schema
+from src.transform import cleansing
+from src.transform.cpt_index import load_cpt_index
+from src.utils.profiling import profile_stage, profiler
 
 class Transformer:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
 
+    @profile_stage("transform", "patients")
     def transform_patients(self, df: pd.DataFrame) -> pd.DataFrame:
         df = df.copy()
         df.columns = df.columns.str.lower()
 
-        df = df.rename(columns={
-            "firstname": "first_name",
-            "lastname": "last_name",
-            "dob": "DOB",
-            "phonenumber": "phone"
-        })
+        df = df.rename(columns=SOURCE_RENAMES["patients"])
+        df = cleansing.coalesce_aliases(df, "patients")
 
-        if "source_file" not in df.columns:
+        if "source_file" not in df.columns and "source_db" not in df.columns:
             self.logger.warning("Missing 'source_file' in patients data, using 'unknown' as fallback.")
             df["source_file"] = "unknown"
 
-        df["unified_patient_id"] = df["patientid"].astype(str) + "_" + df["source_file"]
+        df["unified_patient_id"] = cleansing.unified_patient_id(df)
 
-        df["DOB"] = pd.to_datetime(df["DOB"], errors="coerce")
+        for col in ["first_name", "last_name", "middlename"]:
+            if col in df.columns:
+                df[col] = cleansing.normalize_names(df[col])
+        df["phone"], df["phone_ext"] = cleansing.normalize_phone(df["phone"])
+        if "email" in df.columns:
+            invalid = int((df["email"].notna() & ~cleansing.validate_email(df["email"])).sum())
+            if invalid:
+                self.logger.warning(f"{invalid} patients have an invalid email address")
 
-        df["gender"] = df["gender"].str.upper().map({
-            "M": "Male", "F": "Female", "MALE": "Male", "FEMALE": "Female"
-        }).fillna("Unknown")
-
-        df["age"] = df["DOB"].apply(lambda x: int((pd.Timestamp.now() - x).days // 365.25) if pd.notnull(x) else None)
+        df["DOB"] = cleansing.parse_dates(df["DOB"])
+        df["gender"] = cleansing.standardize_gender(df["gender"])
+        df["age"] = cleansing.compute_age(df["DOB"])
+        df["identity_key"] = cleansing.identity_key(df["first_name"], df["last_name"], df["DOB"])
 
         df = df.drop_duplicates(subset=["unified_patient_id"])
 
         cols_to_drop = ['id', 'f_name', 'l_name', 'm_name', 'email', 'email_valid']
         df = df.drop(columns=[col for col in cols_to_drop if col in df.columns])
 
-        return df
+        return apply_schema(df, "silver", "patients")
 
+    @profile_stage("transform", "providers")
     def transform_providers(self, df: pd.DataFrame) -> pd.DataFrame:
         df = df.copy()
         df.columns = df.columns.str.lower()
         df = df.drop_duplicates()
-        return df
+        return apply_schema(df, "silver", "providers")
 
-    def transform_transactions(self, df: pd.DataFrame, cpt_df: pd.DataFrame) -> pd.DataFrame:
+    @profile_stage("transform", "transactions")
+    def transform_transactions(self, df: pd.DataFrame, cpt_index) -> pd.DataFrame:
         self.logger.info("Transforming transactions data")
-        df = df.copy()
-        cpt_df = cpt_df.copy()
+        df = self._clean_transactions(df.copy())
+        unknown = load_cpt_index(cpt_index).unmatched(df['procedurecode'])
+        if unknown:
+            self.logger.warning(f"{unknown} transactions reference procedure codes missing from the CPT reference")
+        return df
 
+    def transform_transactions_batches(self, batches, cpt_index):
+        # Batches are owned by the caller's stream, so they are cleaned in place instead of copied.
+        self.logger.info("Transforming transactions data in batches")
+        cpt_index = load_cpt_index(cpt_index)
+        unknown = 0
+        for batch in batches:
+            with profiler.stage("transform", "transactions", len(batch)) as record:
+                batch = self._clean_transactions(batch)
+                unknown += cpt_index.unmatched(batch['procedurecode'])
+                record["rows_out"] = len(batch)
+            yield batch
+        if unknown:
+            self.logger.warning(f"{unknown} transactions reference procedure codes missing from the CPT reference")
+
+    def _clean_transactions(self, df: pd.DataFrame) -> pd.DataFrame:
         df.columns = df.columns.str.lower()
-        cpt_df.columns = cpt_df.columns.str.lower()
-
-        if 'procedurecode' in df.columns:
-            df['procedurecode'] = df['procedurecode'].astype(str)
-        else:
-            df['procedurecode'] = 'Unknown'
-        if 'procedurecode' in cpt_df.columns:
-            cpt_df['procedurecode'] = cpt_df['procedurecode'].astype(str)
-        else:
-            cpt_df['procedurecode'] = 'Unknown'
-
-        if 'description' in cpt_df.columns:
-            cpt_df = cpt_df.rename(columns={'description': 'cpt_description'})
-        else:
-            cpt_df['cpt_description'] = ''
-        if 'category' in cpt_df.columns:
-            cpt_df = cpt_df.rename(columns={'category': 'cpt_category'})
-        else:
-            cpt_df['cpt_category'] = ''
-
-        df = df.merge(
-            cpt_df[['procedurecode', 'cpt_description', 'cpt_category']],
-            how='left',
-            on='procedurecode'
-        )
+        if 'procedurecode' not in df.columns:
+            df['procedurecode'] = pd.Series(pd.NA, index=df.index, dtype="Int32")
 
-        df = df.drop(columns=['cpt_description', 'cpt_category'], errors='ignore')
-
-        if "transaction_date" not in df.columns and "transactiondate" in df.columns:
-            df.rename(columns={'transactiondate': 'transaction_date'}, inplace=True)
-        
-        df['transaction_date'] = pd.to_datetime(df.get('transaction_date'), errors='coerce')
+        df = cleansing.fill_transaction_date(df)
 
         if 'amount' not in df.columns:
-            df['amount'] = 0
-        df['amount'] = pd.to_numeric(df['amount'], errors='coerce').fillna(0)
+            df['amount'] = 0.0
+        df['amount'] = df['amount'].fillna(0)
         if 'paidamount' not in df.columns:
-            df['paidamount'] = 0
-        df['paidamount'] = pd.to_numeric(df['paidamount'], errors='coerce').fillna(0)
+            df['paidamount'] = 0.0
+        df['paidamount'] = df['paidamount'].fillna(0)
 
-        if 'patientid' in df.columns and 'source_file' in df.columns:
-            df['unified_patient_id'] = df['patientid'].astype(str) + '_' + df['source_file'].astype(str)
+        if 'patientid' in df.columns and ('source_file' in df.columns or 'source_db' in df.columns):
+            df['unified_patient_id'] = cleansing.unified_patient_id(df)
         else:
             df['unified_patient_id'] = 'Unknown'
 
-        return df
+        return apply_schema(df, "silver", "transactions")
 
-    def transform_claims(self, df: pd.DataFrame, cpt_df: pd.DataFrame) -> pd.DataFrame:
+    @profile_stage("transform", "claims")
+    def transform_claims(self, df: pd.DataFrame, cpt_index) -> pd.DataFrame:
         self.logger.info("Transforming claims data")
-        df = df.copy()
-        cpt_df = cpt_df.copy()
-
+        return self._clean_claims(df.copy(), load_cpt_index(cpt_index))
+
+    def transform_claims_batches(self, batches, cpt_index):
+        self.logger.info("Transforming claims data in batches")
+        cpt_index = load_cpt_index(cpt_index)
+        for batch in batches:
+            with profiler.stage("transform", "claims", len(batch)) as record:
+                batch = self._clean_claims(batch, cpt_index)
+                record["rows_out"] = len(batch)
+            yield batch
+
+    def _clean_claims(self, df: pd.DataFrame, cpt_index) -> pd.DataFrame:
         df.columns = df.columns.str.lower()
-        cpt_df.columns = cpt_df.columns.str.lower()
-
-        if 'procedurecode' in df.columns:
-            df['procedurecode'] = df['procedurecode'].astype(str)
-        else:
-            df['procedurecode'] = 'Unknown'
-        if 'procedurecode' in cpt_df.columns:
-            cpt_df['procedurecode'] = cpt_df['procedurecode'].astype(str)
-        else:
-            cpt_df['procedurecode'] = 'Unknown'
-
-        if 'description' in cpt_df.columns:
-            cpt_df = cpt_df.rename(columns={'description': 'cpt_description'})
-        else:
-            cpt_df['cpt_description'] = ''
-        if 'category' in cpt_df.columns:
-            cpt_df = cpt_df.rename(columns={'category': 'cpt_category'})
-        else:
-            cpt_df['cpt_category'] = ''
-
-        df = df.merge(
-            cpt_df[['procedurecode', 'cpt_description', 'cpt_category']],
-            how='left',
-            on='procedurecode'
-        )
+        if 'procedurecode' not in df.columns:
+            df['procedurecode'] = pd.Series(pd.NA, index=df.index, dtype="Int32")
+        df = cpt_index.enrich(df)
 
         if 'claim_date' not in df.columns and 'claimdate' in df.columns:
-            df.rename(columns={'claimdate': 'claim_date'}, inplace=True)
-        
-        df['claim_date'] = pd.to_datetime(df.get('claim_date'), errors='coerce')
+            df.rename(columns=SOURCE_RENAMES["claims"], inplace=True)
 
         if 'amountclaimed' not in df.columns:
-            df['amountclaimed'] = 0
-        df['amountclaimed'] = pd.to_numeric(df['amountclaimed'], errors='coerce').fillna(0)
+            df['amountclaimed'] = 0.0
+        df['amountclaimed'] = df['amountclaimed'].fillna(0)
         if 'amountapproved' not in df.columns:
-            df['amountapproved'] = 0
-        df['amountapproved'] = pd.to_numeric(df['amountapproved'], errors='coerce').fillna(0)
+            df['amountapproved'] = 0.0
+        df['amountapproved'] = df['amountapproved'].fillna(0)
 
-        if 'patientid' in df.columns and 'source_file' in df.columns:
-            df['unified_patient_id'] = df['patientid'].astype(str) + '_' + df['source_file'].astype(str)
+        if 'patientid' in df.columns and ('source_file' in df.columns or 'source_db' in df.columns):
+            df['unified_patient_id'] = cleansing.unified_patient_id(df)
         else:
             df['unified_patient_id'] = 'Unknown'
 
-        return df
+        return apply_schema(df, "silver", "claims")
 
     def run(self, data_dict: dict) -> dict:
         self.logger.info("Starting transformation layer")
 
+        cpt_index = load_cpt_index(data_dict["cptcodes"])
         patients = self.transform_patients(data_dict["patients"])
-        transactions = self.transform_transactions(data_dict["transactions"], data_dict["cptcodes"])
-        claims = self.transform_claims(data_dict["claims"], data_dict["cptcodes"])
+        transactions = self.transform_transactions(data_dict["transactions"], cpt_index)
+        claims = self.transform_claims(data_dict["claims"], cpt_index)
         providers = self.transform_providers(data_dict["providers"])
 
         return {
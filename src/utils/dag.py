@@ -0,0 +1,213 @@
+import glob
+import hashlib
+import json
+import os
+import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+import pandas as pd
+import pyarrow.parquet as pq
+from src.utils.logger import get_logger
+from src.utils.storage import frame_to_arrow
+
+logger = get_logger(__name__)
+
+STAGE_CACHE_DIR = "data/cache/stages"
+CODE_PATHS = ("main.py", "src/**/*.py", "config/*.py")
+
+
+def code_version(patterns=CODE_PATHS) -> str:
+    digest = hashlib.sha256()
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern, recursive=True)):
+            digest.update(path.encode())
+            with open(path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+class FrameFingerprint:
+    # Running form of fingerprint() for a table seen batch by batch: row hashes are summed (mod 2**64,
+    # as numpy does) so neither row order nor how the rows were split into batches matters.
+    def __init__(self):
+        self.dtypes = None
+        self.rows = 0
+        self.total = 0
+
+    def update(self, df: pd.DataFrame):
+        if self.dtypes is None:
+            self.dtypes = [[str(col), str(dtype)] for col, dtype in df.dtypes.items()]
+        self.rows += len(df)
+        self.total = (self.total + int(pd.util.hash_pandas_object(df, index=False).sum())) % 2 ** 64
+        return self
+
+    def hexdigest(self) -> str:
+        digest = hashlib.sha256()
+        digest.update(json.dumps(self.dtypes or []).encode())
+        digest.update(f"{self.rows}:{self.total}".encode())
+        return digest.hexdigest()[:16]
+
+
+def fingerprint(value) -> str:
+    # Content digest of a task output: row hashes are summed so row order does not matter.
+    if isinstance(value, dict):
+        return {key: fingerprint(item) for key, item in value.items()}
+    if isinstance(value, pd.DataFrame):
+        return FrameFingerprint().update(value).hexdigest()
+    return hashlib.sha256(repr(value).encode()).hexdigest()[:16]
+
+
+def _combine(fingerprints) -> str:
+    return hashlib.sha256(json.dumps(fingerprints, sort_keys=True).encode()).hexdigest()[:16]
+
+
+@dataclass
+class Task:
+    name: str
+    func: callable
+    inputs: tuple = ()
+    after: tuple = ()
+    cache: bool = True
+    valid: callable = None
+    upstream: set = field(default_factory=set)
+
+
+class DAG:
+    def __init__(self, cache_dir=STAGE_CACHE_DIR, max_workers=None, use_cache=None, version=None):
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers or int(os.getenv("PIPELINE_WORKERS", 4))
+        self.use_cache = use_cache if use_cache is not None else os.getenv("PIPELINE_CACHE", "true").lower() == "true"
+        self.version = version or code_version()
+        self.tasks = {}
+        self.values = {}
+        self.fingerprints = {}
+        self.keys = {}
+        self.report = []
+
+    def task(self, name, func, inputs=(), after=(), cache=True, valid=None):
+        # Inputs are passed to func, "task:key" selects one entry of a task that returns a dict.
+        # Tasks listed in after only order the run and invalidate the cache; their outputs are not loaded.
+        upstream = {ref.split(":", 1)[0] for ref in (*inputs, *after)}
+        missing = upstream - set(self.tasks)
+        if missing:
+            raise ValueError(f"Task '{name}' depends on undefined tasks: {sorted(missing)}")
+        self.tasks[name] = Task(name, func, tuple(inputs), tuple(after), cache, valid, upstream)
+        return self
+
+    def _task_dir(self, name, key=None):
+        path = os.path.join(self.cache_dir, name)
+        return os.path.join(path, key) if key else path
+
+    def _input_fingerprint(self, ref):
+        name, _, item = ref.partition(":")
+        value = self.fingerprints[name]
+        if item:
+            return value.get(item) if isinstance(value, dict) else None
+        return _combine(value) if isinstance(value, dict) else value
+
+    def cache_key(self, name) -> str:
+        task = self.tasks[name]
+        inputs = {ref: self._input_fingerprint(ref) for ref in (*task.inputs, *task.after)}
+        return _combine({"task": name, "code": self.version, "inputs": inputs})
+
+    def _load_meta(self, name, key):
+        path = os.path.join(self._task_dir(name, key), "meta.json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def _save(self, name, key, value, output_fingerprint):
+        tmp_dir = self._task_dir(name, f"{key}.tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        frames = value if isinstance(value, dict) else {"": value} if value is not None else {}
+        for item, df in frames.items():
+            pq.write_table(frame_to_arrow(df), os.path.join(tmp_dir, f"{item or '_value'}.parquet"), compression="zstd")
+        meta = {"fingerprint": output_fingerprint, "kind": "dict" if isinstance(value, dict) else "frame" if value is not None else "none",
+                "items": list(frames), "created": time.time()}
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+
+        # Only the newest result per task is kept.
+        for old in glob.glob(os.path.join(self._task_dir(name), "*")):
+            if old != tmp_dir:
+                shutil.rmtree(old, ignore_errors=True)
+        os.replace(tmp_dir, self._task_dir(name, key))
+
+    def _load(self, name, key, meta):
+        path = self._task_dir(name, key)
+        frames = {item: pd.read_parquet(os.path.join(path, f"{item or '_value'}.parquet")) for item in meta["items"]}
+        if meta["kind"] == "dict":
+            return frames
+        return frames.get("")
+
+    def value(self, ref):
+        name, _, item = ref.partition(":")
+        if name not in self.values:
+            meta = self._load_meta(name, self.keys[name])
+            self.values[name] = self._load(name, self.keys[name], meta)
+            logger.info(f"Loaded cached output of task '{name}'")
+        value = self.values[name]
+        return value[item] if item else value
+
+    def _cached(self, task, key):
+        if not (self.use_cache and task.cache):
+            return None
+        meta = self._load_meta(task.name, key)
+        if meta is None or (task.valid is not None and not task.valid()):
+            return None
+        return meta
+
+    def _execute(self, task):
+        start = time.perf_counter()
+        args = [self.value(ref) for ref in task.inputs]
+        value = task.func(*args)
+        output_fingerprint = fingerprint(value)
+        if task.cache:
+            self._save(task.name, self.keys[task.name], value, output_fingerprint)
+        return value, output_fingerprint, time.perf_counter() - start
+
+    def run(self) -> dict:
+        start = time.perf_counter()
+        pending = list(self.tasks)
+        done, running = set(), {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending or running:
+                for name in [n for n in pending if self.tasks[n].upstream <= done]:
+                    pending.remove(name)
+                    task = self.tasks[name]
+                    self.keys[name] = self.cache_key(name)
+                    meta = self._cached(task, self.keys[name])
+                    if meta is not None:
+                        self.fingerprints[name] = meta["fingerprint"]
+                        done.add(name)
+                        self.report.append({"task": name, "status": "cached", "seconds": 0.0})
+                        logger.info(f"Skipping task '{name}': inputs and code unchanged")
+                        continue
+                    logger.info(f"Running task '{name}'")
+                    running[pool.submit(self._execute, task)] = name
+                if not running:
+                    continue
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        value, output_fingerprint, seconds = future.result()
+                    except Exception:
+                        logger.error(f"Task '{name}' failed, completed tasks stay cached for the next run")
+                        for other in running:
+                            other.cancel()
+                        raise
+                    self.values[name] = value
+                    self.fingerprints[name] = output_fingerprint
+                    done.add(name)
+                    self.report.append({"task": name, "status": "ran", "seconds": round(seconds, 3)})
+                    logger.info(f"Finished task '{name}' in {seconds:.2f}s")
+
+        ran = sum(1 for entry in self.report if entry["status"] == "ran")
+        logger.info(f"Pipeline finished in {time.perf_counter() - start:.2f}s: {ran} tasks ran, {len(self.report) - ran} served from cache")
+        return self.values
+
@@ -1,13 +1,18 @@
 import pandas as pd
 
-def generate_schema_summary(dataframes_dict: dict, output_path: str):
+SCHEMA_COLUMNS = ["table_name", "column_name", "dtype", "rows"]
+
+def schema_rows(dataframes_dict: dict) -> pd.DataFrame:
     rows = []
     for table_name, df in dataframes_dict.items():
         for col in df.columns:
             rows.append({
                 "table_name": table_name,
                 "column_name": col,
-                "dtype": str(df[col].dtype)
+                "dtype": str(df[col].dtype),
+                "rows": len(df)
             })
-    schema_df = pd.DataFrame(rows)
-    schema_df.to_csv(output_path, index=False)
\ No newline at end of file
+    return pd.DataFrame(rows, columns=SCHEMA_COLUMNS)
+
+def generate_schema_summary(schema: pd.DataFrame, output_path: str):
+    schema[["table_name", "column_name", "dtype"]].to_csv(output_path, index=False)
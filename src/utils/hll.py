@@ -0,0 +1,95 @@
+import base64
+import numpy as np
+import pandas as pd
+
+HLL_PRECISION = 11
+HLL_REGISTERS = 1 << HLL_PRECISION
+# Relative standard error of a dense estimate.
+HLL_ERROR = 1.04 / HLL_REGISTERS ** 0.5
+# Groups with fewer distinct values keep their sorted 64-bit hashes (exact, and smaller than the
+# registers once encoded); the encoded length tells the two forms apart.
+HLL_SPARSE_LIMIT = HLL_REGISTERS // 8
+
+
+def _bit_length(values: np.ndarray) -> np.ndarray:
+    # frexp is exact below 2**53, so split the 64-bit words into 32-bit halves.
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(high > 0, np.frexp(high)[1] + 32, np.frexp(low)[1])
+
+
+def hll_hashes(values: pd.Series) -> np.ndarray:
+    return pd.util.hash_pandas_object(values.astype("string"), index=False).to_numpy()
+
+
+def _index_rank(hashes: np.ndarray):
+    index = (hashes >> np.uint64(64 - HLL_PRECISION)).astype(np.int64)
+    remainder = (hashes << np.uint64(HLL_PRECISION)) | np.uint64(1 << (HLL_PRECISION - 1))
+    return index, (65 - _bit_length(remainder)).astype(np.uint8)
+
+
+def _registers(hashes: np.ndarray) -> np.ndarray:
+    registers = np.zeros(HLL_REGISTERS, dtype=np.uint8)
+    index, rank = _index_rank(hashes)
+    np.maximum.at(registers, index, rank)
+    return registers
+
+
+def is_dense(sketch: np.ndarray) -> bool:
+    return sketch.dtype == np.uint8
+
+
+def hll_sketches(values: pd.Series, groups: np.ndarray, n_groups: int) -> list:
+    if n_groups == 0:
+        return []
+    valid = values.notna().to_numpy() & (groups >= 0)
+    pairs = pd.DataFrame({"group": groups[valid].astype(np.int64), "hash": hll_hashes(values[valid])}).drop_duplicates()
+    group, hashes = pairs["group"].to_numpy(), pairs["hash"].to_numpy(dtype=np.uint64)
+    counts = np.bincount(group, minlength=n_groups)
+    is_sparse = counts[group] < HLL_SPARSE_LIMIT
+
+    # Only the rows of sparse groups are sorted; dense groups go straight to registers.
+    order = np.lexsort((hashes[is_sparse], group[is_sparse]))
+    sparse_counts = np.where(counts < HLL_SPARSE_LIMIT, counts, 0)
+    sketches = np.split(hashes[is_sparse][order], np.cumsum(sparse_counts)[:-1])
+
+    dense = np.flatnonzero(counts >= HLL_SPARSE_LIMIT)
+    if len(dense):
+        index, rank = _index_rank(hashes[~is_sparse])
+        flat = pd.Series(rank).groupby(np.searchsorted(dense, group[~is_sparse]) * HLL_REGISTERS + index).max()
+        registers = np.zeros((len(dense), HLL_REGISTERS), dtype=np.uint8)
+        registers.reshape(-1)[flat.index.to_numpy()] = flat.to_numpy()
+        for i, g in enumerate(dense):
+            sketches[g] = registers[i]
+    return sketches
+
+
+def hll_merge(sketches) -> np.ndarray:
+    sparse = [sketch for sketch in sketches if not is_dense(sketch)]
+    dense = [sketch for sketch in sketches if is_dense(sketch)]
+    hashes = np.unique(np.concatenate(sparse)) if sparse else np.empty(0, dtype=np.uint64)
+    if not dense and len(hashes) < HLL_SPARSE_LIMIT:
+        return hashes
+    registers = np.max(np.stack(dense), axis=0) if dense else np.zeros(HLL_REGISTERS, dtype=np.uint8)
+    return np.maximum(registers, _registers(hashes))
+
+
+def hll_estimate(sketch: np.ndarray) -> int:
+    if not is_dense(sketch):
+        return len(sketch)
+    m = HLL_REGISTERS
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / np.power(2.0, -sketch.astype(np.float64)).sum()
+    zeros = int((sketch == 0).sum())
+    if estimate <= 2.5 * m and zeros > 0:
+        estimate = m * np.log(m / zeros)
+    return int(np.rint(estimate))
+
+
+def hll_encode(sketches) -> list:
+    return [base64.b64encode(sketch.tobytes()).decode("ascii") for sketch in sketches]
+
+
+def hll_decode(encoded) -> list:
+    raw = [base64.b64decode(value) for value in encoded]
+    return [np.frombuffer(value, dtype=np.uint8 if len(value) == HLL_REGISTERS else np.uint64) for value in raw]
@@ -0,0 +1,184 @@
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+import pandas as pd
+from src.utils.logger import get_logger
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+logger = get_logger(__name__)
+
+RUN_REPORT_PATH = "logs/run_report.json"
+PROFILE_DIR = "logs"
+
+
+def peak_rss_mb(children=False):
+    # Process high-water mark; ru_maxrss is reported in KB on Linux. For children it is the largest finished child.
+    if resource is None:
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    return round(resource.getrusage(who).ru_maxrss / 1024, 1)
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / 1e6, 1)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def count_rows(value):
+    if isinstance(value, pd.DataFrame):
+        return len(value)
+    if isinstance(value, dict):
+        frames = [v for v in value.values() if isinstance(v, pd.DataFrame)]
+        return sum(len(df) for df in frames) if frames else None
+    return None
+
+
+def path_bytes(path):
+    if path is None or not os.path.exists(path):
+        return 0
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+class StageProfiler:
+    def __init__(self, capture=None, mode=None):
+        self.capture = capture if capture is not None else os.getenv("PROFILE_STAGE")
+        self.mode = (mode or os.getenv("PROFILE_MODE", "cprofile")).lower()
+        self.records = []
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._capturing = False
+
+    def _wants_capture(self, stage, table):
+        if not self.capture or self._capturing:
+            return False
+        return self.capture in (stage, f"{stage}.{table}")
+
+    @contextmanager
+    def stage(self, stage, table=None, rows_in=None):
+        record = {"stage": stage, "table": table, "rows_in": rows_in, "rows_out": None, "bytes_written": 0}
+        capture = self._wants_capture(stage, table)
+        profile = self._start_capture() if capture else None
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record["wall_seconds"] = round(time.perf_counter() - wall, 4)
+            # Process-wide CPU time, so stages overlapping on worker threads share it.
+            record["cpu_seconds"] = round(time.process_time() - cpu, 4)
+            record["rss_mb"] = rss_mb()
+            record["peak_rss_mb"] = peak_rss_mb()
+            if capture:
+                record["capture"] = self._stop_capture(profile, stage, table)
+            with self._lock:
+                self.records.append(record)
+
+    def _start_capture(self):
+        self._capturing = True
+        if self.mode == "tracemalloc":
+            tracemalloc.start(25)
+            return None
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def _stop_capture(self, profile, stage, table):
+        self._capturing = False
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        name = f"{stage}.{table}" if table else stage
+        if self.mode == "tracemalloc":
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            path = os.path.join(PROFILE_DIR, f"tracemalloc_{name}.txt")
+            with open(path, "w") as f:
+                f.write(f"peak traced memory: {peak / 1e6:.1f} MB\n")
+                for stat in snapshot.statistics("lineno")[:25]:
+                    f.write(f"{stat}\n")
+            logger.info(f"tracemalloc report for {name} saved to {path} (peak {peak / 1e6:.1f} MB)")
+            return {"mode": "tracemalloc", "path": path, "peak_traced_mb": round(peak / 1e6, 1)}
+
+        profile.disable()
+        path = os.path.join(PROFILE_DIR, f"profile_{name}.prof")
+        profile.dump_stats(path)
+        out = io.StringIO()
+        pstats.Stats(profile, stream=out).sort_stats("cumulative").print_stats(20)
+        logger.info(f"cProfile of {name} saved to {path}:\n{out.getvalue()}")
+        return {"mode": "cprofile", "path": path}
+
+    def extend(self, records):
+        with self._lock:
+            self.records.extend(records)
+
+    def summary(self) -> pd.DataFrame:
+        if not self.records:
+            return pd.DataFrame()
+        df = pd.DataFrame(self.records)
+        df["table"] = df["table"].fillna("")
+        df[["rows_in", "rows_out"]] = df[["rows_in", "rows_out"]].astype("Int64")
+        summary = df.groupby(["stage", "table"], sort=False).agg(
+            wall_seconds=("wall_seconds", "sum"),
+            cpu_seconds=("cpu_seconds", "sum"),
+            rows_in=("rows_in", lambda r: r.sum(min_count=1)),
+            rows_out=("rows_out", lambda r: r.sum(min_count=1)),
+            mb_written=("bytes_written", lambda b: round(b.sum() / 1e6, 2)),
+            peak_rss_mb=("peak_rss_mb", "max")
+        ).reset_index()
+        summary["rows_per_sec"] = (summary["rows_out"] / summary["wall_seconds"]).where(summary["wall_seconds"] > 0).round().astype("Int64")
+        return summary
+
+    def write_report(self, path=None, extra=None):
+        path = path or os.getenv("RUN_REPORT_PATH", RUN_REPORT_PATH)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        report = {
+            "started": self.started,
+            "seconds": round(time.time() - self.started, 3),
+            "peak_rss_mb": peak_rss_mb(),
+            "worker_peak_rss_mb": peak_rss_mb(children=True),
+            "stages": self.records,
+            **(extra or {})
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+        os.replace(tmp_path, path)
+        return path
+
+    def log_summary(self):
+        summary = self.summary()
+        if not summary.empty:
+            logger.info(f"Stage summary:\n{summary.to_string(index=False)}")
+        return summary
+
+
+profiler = StageProfiler()
+
+
+def profile_stage(stage, table=None):
+    # Records rows of the first DataFrame (or dict of frames) argument and of the result.
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            rows_in = next((count_rows(a) for a in args if count_rows(a) is not None), None)
+            with profiler.stage(stage, table, rows_in) as record:
+                result = func(*args, **kwargs)
+                record["rows_out"] = count_rows(result)
+            return result
+        return wrapper
+    return decorator
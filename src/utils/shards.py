@@ -0,0 +1,174 @@
+import collections
+import itertools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from src.extract.extractor import Extractor
+from src.extract.incremental import merge_batches, merge_snapshot
+from src.models.schema_definitions import constant_category
+from src.transform.cpt_index import load_cpt_index
+from src.transform.transformer import Transformer
+from src.utils.dag import FrameFingerprint
+from src.utils.logger import get_logger
+from src.utils.profiling import profiler
+from src.utils.storage import SHARD_COLUMN, LayerStore
+
+logger = get_logger(__name__)
+
+SILVER_TRANSFORMS = {
+    "patients": "transform_patients",
+    "providers": "transform_providers",
+    "transactions": "transform_transactions",
+    "claims": "transform_claims"
+}
+BATCH_TRANSFORMS = {
+    "transactions": "transform_transactions_batches",
+    "claims": "transform_claims_batches"
+}
+
+
+def _bronze_stream(store, key, table, batches, written):
+    for i, batch in enumerate(batches):
+        store.write_shard("bronze", table, batch, key, append=i > 0)
+        written[table] = written.get(table, 0) + len(batch)
+        yield batch
+    if table not in written:
+        # A table without rows this run must not leave last run's shard behind.
+        store.clear_shard("bronze", table, key)
+
+
+def _write_silver(store, key, table, frames) -> dict:
+    # The fingerprint covers the rows written, not the batches, so unchanged silver data keeps
+    # downstream stages cached however the source was split or merged.
+    digest, batches = FrameFingerprint(), 0
+    for i, df in enumerate(frames):
+        store.write_shard("silver", f"{table}_cleaned", df, key, append=i > 0)
+        digest.update(df)
+        batches += 1
+    if not batches:
+        store.clear_shard("silver", f"{table}_cleaned", key)
+    logger.info(f"Saved Silver shard {key}.{table}: {digest.rows} rows in {batches} batches")
+    return {"table": table, "rows": digest.rows, "fingerprint": digest.hexdigest()}
+
+
+def _stream_table(store, transformer, cpt_index, key, table, batches, tables, bronze):
+    written = {}
+    batches = _bronze_stream(store, key, table, batches, written)
+    if table in BATCH_TRANSFORMS:
+        cleaned = getattr(transformer, BATCH_TRANSFORMS[table])(batches, cpt_index)
+        tables.append(_write_silver(store, key, table, cleaned))
+        return
+    collections.deque(batches, maxlen=0)
+    if table not in SILVER_TRANSFORMS:
+        return
+    if written:
+        bronze[table] = store.read("bronze", table, filters=[(SHARD_COLUMN, "=", key)])
+    else:
+        tables.append(_write_silver(store, key, table, []))
+
+
+def _stream(extractor, store, transformer, cpt_index, key):
+    # Transactions and claims go from source to silver one batch at a time; the smaller tables
+    # are streamed into bronze and read back whole for their transforms.
+    tables, bronze = [], {}
+    expected = extractor.tables + ["claims"]
+    streamed = ((table, (batch for _, batch in group))
+                for table, group in itertools.groupby(extractor.stream_hospital(key), key=lambda item: item[0]))
+    # Tables that yield no batches still come through, with nothing in them.
+    pending = itertools.chain(streamed, ((table, iter(())) for table in expected))
+    done = set()
+    for table, batches in pending:
+        if table in done:
+            continue
+        done.add(table)
+        if extractor.reads_delta(key, table) and os.path.exists(store.shard_path("bronze", table, key)):
+            # Only changed rows were read: the shard is rewritten as its snapshot merged with them.
+            with store.replacing_shard("bronze", table, key, extractor.chunk_size) as previous:
+                snapshot = (batch.assign(**{SHARD_COLUMN: constant_category(key, len(batch))}) for batch in previous)
+                merged = merge_batches(snapshot, batches, table)
+                _stream_table(store, transformer, cpt_index, key, table, merged, tables, bronze)
+            continue
+        _stream_table(store, transformer, cpt_index, key, table, batches, tables, bronze)
+    return bronze, tables
+
+
+def _bronze(extractor, store, key):
+    data_dict = extractor.run(reference=False)
+    for table, df in data_dict.items():
+        # Without a claims file the empty claims table replaces the shard rather than merging into it.
+        if extractor.incremental and store.exists("bronze", table) and (table != "claims" or extractor.claims_path(key)):
+            snapshot = store.read("bronze", table, filters=[(SHARD_COLUMN, "=", key)])
+            df = merge_snapshot(snapshot, df, table)
+            data_dict[table] = df
+        store.write_shard("bronze", table, df, key)
+    return {table: df for table, df in data_dict.items() if table in SILVER_TRANSFORMS}
+
+
+def run_shard(hospital: dict, stream=True, collect_stages=False) -> dict:
+    # Extracts and cleans one hospital end to end; the silver tables are written to its own partitions.
+    if collect_stages:
+        profiler.records.clear()
+    key = hospital["key"]
+    store = LayerStore()
+    extractor = Extractor(hospitals=[hospital])
+    transformer = Transformer()
+    cpt_index = load_cpt_index()
+    try:
+        bronze, tables = _stream(extractor, store, transformer, cpt_index, key) if stream else (_bronze(extractor, store, key), [])
+    finally:
+        extractor.close()
+
+    for table, method in SILVER_TRANSFORMS.items():
+        if table not in bronze:
+            continue
+        args = (bronze.pop(table), cpt_index) if table in BATCH_TRANSFORMS else (bronze.pop(table),)
+        tables.append(_write_silver(store, key, table, [getattr(transformer, method)(*args)]))
+
+    watermarks = [
+        {"source": source, "table": table, "value": value}
+        for source, marks in extractor.watermarks.pending.items()
+        for table, value in marks.items()
+    ]
+    return {
+        "tables": pd.DataFrame(tables, columns=["table", "rows", "fingerprint"]),
+        "watermarks": pd.DataFrame(watermarks, columns=["source", "table", "value"]),
+        "stages": [{**record, "shard": key} for record in profiler.records] if collect_stages else []
+    }
+
+
+class ShardPool:
+    def __init__(self, max_workers=None, stream=None):
+        workers = max_workers if max_workers is not None else os.getenv("SHARD_WORKERS")
+        self.max_workers = int(workers) if workers is not None else os.cpu_count() or 1
+        self.stream = stream if stream is not None else os.getenv("STREAM_EXTRACT", "true").lower() == "true"
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        # Spawned workers, since forking a process that already runs pipeline threads can deadlock.
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+                logger.info(f"Started shard pool with {self.max_workers} processes")
+            return self._pool
+
+    def run(self, hospital: dict) -> dict:
+        if self.max_workers == 0:
+            return run_shard(hospital, self.stream)
+        result = self._executor().submit(run_shard, hospital, self.stream, True).result()
+        profiler.extend(result["stages"])
+        return result
+
+    def task(self, hospital: dict):
+        def run():
+            result = self.run(hospital)
+            return {"tables": result["tables"], "watermarks": result["watermarks"]}
+        return run
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
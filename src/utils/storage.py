@@ -0,0 +1,333 @@
+import os
+import shutil
+from contextlib import contextmanager
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from src.models.schema_definitions import apply_schema, concat_frames, read_csv_typed
+from src.utils.logger import get_logger
+from src.utils.profiling import path_bytes, profiler
+
+logger = get_logger(__name__)
+
+PARTITION_DATE_COLUMNS = {
+    "fact_transactions": "transaction_date",
+    "fact_claims": "claim_date"
+}
+
+SHARD_COLUMN = "source_db"
+
+PARTITION_KEYS = {
+    "dim_patients_scd": "scd_bucket",
+    "fact_claim_reconciliation": "recon_bucket",
+    "agg_daily_revenue": "month_key",
+    "agg_monthly_payor_revenue": "month_key",
+    "agg_daily_claims": "month_key",
+    "agg_daily_patients": "month_key",
+    "agg_ar_summary": "grouping",
+    "agg_ar_aging": "grouping",
+    "agg_claim_denials": "grouping",
+    "agg_collection_rolling": "grouping"
+}
+
+
+def frame_to_arrow(df: pd.DataFrame) -> pa.Table:
+    # The one pandas-to-Arrow conversion used for every Parquet file the pipeline writes.
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        mixed = [col for col in df.columns if df[col].dtype == object]
+        logger.warning(f"Casting mixed-type columns to string for Parquet: {mixed}")
+        return pa.Table.from_pandas(df.astype({col: "string" for col in mixed}), preserve_index=False)
+
+
+class LayerStore:
+    def __init__(self, base_dir="data", fmt=None, compression="zstd"):
+        self.base_dir = base_dir
+        self.format = (fmt or os.getenv("STORAGE_FORMAT", "parquet")).lower()
+        self.compression = compression
+
+    def partition_columns(self, name, df: pd.DataFrame) -> list:
+        if PARTITION_KEYS.get(name) in df.columns:
+            return [PARTITION_KEYS[name]]
+        cols = ["source_db"] if "source_db" in df.columns else []
+        date_col = PARTITION_DATE_COLUMNS.get(name)
+        if date_col and date_col in df.columns:
+            cols += [f"{date_col}_year", f"{date_col}_month"]
+        return cols
+
+    def path(self, layer, name):
+        if self.format == "csv":
+            return os.path.join(self.base_dir, layer, f"{name}.csv")
+        return os.path.join(self.base_dir, layer, name)
+
+    def exists(self, layer, name):
+        path = self.path(layer, name)
+        if self.format == "csv":
+            return os.path.exists(path) or os.path.isdir(path[:-len(".csv")])
+        return os.path.exists(path)
+
+    def _write(self, layer, name, df: pd.DataFrame):
+        path = self.path(layer, name)
+        if self.format == "csv":
+            df.to_csv(path, index=False)
+            return path
+
+        partition_cols = self.partition_columns(name, df)
+        date_col = PARTITION_DATE_COLUMNS.get(name)
+        if date_col and date_col in df.columns:
+            dates = pd.to_datetime(df[date_col], errors="coerce")
+            df = df.assign(**{
+                f"{date_col}_year": dates.dt.year.astype("Int16"),
+                f"{date_col}_month": dates.dt.month.astype("Int8")
+            })
+
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+        pq.write_to_dataset(
+            frame_to_arrow(df),
+            root_path=path,
+            partition_cols=partition_cols or None,
+            compression=self.compression,
+            basename_template="part-{i}.parquet"
+        )
+        return path
+
+    def _append(self, layer, name, df: pd.DataFrame, part):
+        path = self.path(layer, name)
+        if self.format == "csv":
+            os.makedirs(path[:-len(".csv")], exist_ok=True)
+            part_path = os.path.join(path[:-len(".csv")], f"{part}.csv")
+            first = not os.path.exists(part_path)
+            df.to_csv(part_path, mode="w" if first else "a", header=first, index=False)
+            return part_path
+
+        os.makedirs(path, exist_ok=True)
+        seq = sum(1 for file in os.listdir(path) if file.startswith(f"{part}-"))
+        part_path = os.path.join(path, f"{part}-{seq:05d}.parquet")
+        pq.write_table(frame_to_arrow(df), part_path, compression=self.compression)
+        return part_path
+
+    def _replace_partitions(self, layer, name, df: pd.DataFrame, column, values=None):
+        path = self.path(layer, name)
+        values = df[column].unique().tolist() if values is None else list(values)
+        if self.format == "csv":
+            if self.exists(layer, name):
+                kept = self.read(layer, name, filters=[(column, "not in", values)])
+                df = concat_frames([kept, df])
+            df.to_csv(path, index=False)
+            return path
+
+        os.makedirs(path, exist_ok=True)
+        for value in set(values) - set(df[column].unique().tolist()):
+            shutil.rmtree(os.path.join(path, f"{column}={value}"), ignore_errors=True)
+        if df.empty:
+            return path
+        pq.write_to_dataset(
+            frame_to_arrow(df),
+            root_path=path,
+            partition_cols=[column],
+            compression=self.compression,
+            basename_template="part-{i}.parquet",
+            existing_data_behavior="delete_matching"
+        )
+        return path
+
+    def _write_shard(self, layer, name, df: pd.DataFrame, shard, append=False):
+        path = self.path(layer, name)
+        if self.format == "csv":
+            if os.path.isfile(path):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            return self._append(layer, name, df, shard) if append else self._write_part(path[:-len(".csv")], shard, df)
+
+        shard_dir = os.path.join(path, f"{SHARD_COLUMN}={shard}")
+        if not append:
+            shutil.rmtree(shard_dir, ignore_errors=True)
+            self._drop_unsharded(path)
+        os.makedirs(shard_dir, exist_ok=True)
+        seq = len(os.listdir(shard_dir))
+        part_path = os.path.join(shard_dir, f"part-{seq:05d}.parquet")
+        pq.write_table(frame_to_arrow(df.drop(columns=[SHARD_COLUMN], errors="ignore")), part_path, compression=self.compression)
+        return shard_dir
+
+    def _drop_unsharded(self, path):
+        # Files outside the partition directories come from a whole-table write and would duplicate the shards.
+        if not os.path.isdir(path):
+            return
+        for file in os.listdir(path):
+            try:
+                if os.path.isfile(os.path.join(path, file)):
+                    os.remove(os.path.join(path, file))
+            except FileNotFoundError:
+                pass
+
+    def _write_part(self, parts_dir, shard, df):
+        os.makedirs(parts_dir, exist_ok=True)
+        part_path = os.path.join(parts_dir, f"{shard}.csv")
+        df.to_csv(part_path, index=False)
+        return part_path
+
+    def write(self, layer, name, df: pd.DataFrame):
+        with profiler.stage("write", f"{layer}.{name}", len(df)) as record:
+            path = self._write(layer, name, df)
+            record["rows_out"] = len(df)
+            record["bytes_written"] = path_bytes(path)
+        return path
+
+    def append(self, layer, name, df: pd.DataFrame, part):
+        with profiler.stage("write", f"{layer}.{name}", len(df)) as record:
+            part_path = self._append(layer, name, df, part)
+            record["rows_out"] = len(df)
+            record["bytes_written"] = path_bytes(part_path)
+        return part_path
+
+    def replace_partitions(self, layer, name, df: pd.DataFrame, column, values=None):
+        with profiler.stage("write", f"{layer}.{name}", len(df)) as record:
+            path = self._replace_partitions(layer, name, df, column, values)
+            record["rows_out"] = len(df)
+            if self.format == "csv":
+                record["bytes_written"] = path_bytes(path)
+            else:
+                record["bytes_written"] = sum(path_bytes(os.path.join(path, f"{column}={value}")) for value in df[column].unique())
+        return path
+
+    def write_shard(self, layer, name, df: pd.DataFrame, shard, append=False):
+        # Each hospital shard owns its source_db partition, so shards can write from separate processes.
+        with profiler.stage("write", f"{layer}.{name}", len(df)) as record:
+            path = self._write_shard(layer, name, df, shard, append)
+            record["rows_out"] = len(df)
+            record["bytes_written"] = path_bytes(path)
+        return path
+
+    def shard_path(self, layer, name, shard):
+        path = self.path(layer, name)
+        if self.format == "csv":
+            return os.path.join(path[:-len(".csv")], f"{shard}.csv")
+        return os.path.join(path, f"{SHARD_COLUMN}={shard}")
+
+    def clear_shard(self, layer, name, shard):
+        path = self.shard_path(layer, name, shard)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+
+    @contextmanager
+    def replacing_shard(self, layer, name, shard, batch_rows=1_000_000):
+        # Moves the shard aside (hidden from readers) and yields its old rows batch by batch, so the
+        # shard can be rewritten from its own contents. The old files come back if the rewrite fails.
+        path = self.shard_path(layer, name, shard)
+        aside = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.previous")
+        shutil.rmtree(aside, ignore_errors=True)
+        os.rename(path, aside)
+        try:
+            if self.format == "csv":
+                batches = (apply_schema(chunk, layer, name) for chunk in read_csv_typed(aside, layer, name, chunksize=batch_rows))
+            else:
+                batches = self._scan_dataset(self._dataset(aside), layer, name, None, batch_rows)
+            yield batches
+        except BaseException:
+            self.clear_shard(layer, name, shard)
+            os.rename(aside, path)
+            raise
+        if os.path.isdir(aside):
+            shutil.rmtree(aside)
+        else:
+            os.remove(aside)
+
+    def clear(self, layer, name):
+        path = self.path(layer, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+        if self.format == "csv":
+            shutil.rmtree(path[:-len(".csv")], ignore_errors=True)
+
+    def _filter_frame(self, df: pd.DataFrame, filters) -> pd.DataFrame:
+        ops = {
+            "=": lambda s, v: s == v, "==": lambda s, v: s == v, "!=": lambda s, v: s != v,
+            "<": lambda s, v: s < v, "<=": lambda s, v: s <= v,
+            ">": lambda s, v: s > v, ">=": lambda s, v: s >= v,
+            "in": lambda s, v: s.isin(v), "not in": lambda s, v: ~s.isin(v)
+        }
+        mask = pd.Series(True, index=df.index)
+        for col, op, value in filters:
+            if col in df.columns:
+                mask &= ops[op](df[col], value)
+        return df[mask].reset_index(drop=True)
+
+    def _partitioning(self, path):
+        fields = []
+        level = path
+        while True:
+            subdirs = [d for d in os.listdir(level) if "=" in d and os.path.isdir(os.path.join(level, d))]
+            if not subdirs:
+                break
+            key = subdirs[0].split("=", 1)[0]
+            if key.endswith(("_year", "_bucket")):
+                fields.append(pa.field(key, pa.int16()))
+            elif key.endswith("_key"):
+                fields.append(pa.field(key, pa.int32()))
+            elif key.endswith("_month"):
+                fields.append(pa.field(key, pa.int8()))
+            else:
+                fields.append(pa.field(key, pa.string()))
+            level = os.path.join(level, subdirs[0])
+        return ds.partitioning(pa.schema(fields), flavor="hive") if fields else None
+
+    def read(self, layer, name, columns=None, filters=None) -> pd.DataFrame:
+        path = self.path(layer, name)
+        if self.format == "csv":
+            parts_dir = path[:-len(".csv")]
+            if not os.path.exists(path) and os.path.isdir(parts_dir):
+                files = sorted(f for f in os.listdir(parts_dir) if not f.startswith("."))
+                df = pd.concat(
+                    [read_csv_typed(os.path.join(parts_dir, f), layer, name, usecols=columns) for f in files],
+                    ignore_index=True
+                )
+            else:
+                df = read_csv_typed(path, layer, name, usecols=columns)
+            df = apply_schema(df, layer, name)
+            return self._filter_frame(df, filters) if filters else df
+
+        dataset = self._dataset(path)
+        expression = pq.filters_to_expression(filters) if filters else None
+        df = dataset.to_table(columns=self._columns(dataset, columns), filter=expression).to_pandas()
+        return apply_schema(df, layer, name)
+
+    def scan(self, layer, name, columns=None, batch_rows=1_000_000):
+        # Yields the table in bounded batches, for stages that must not hold it whole.
+        if self.format == "csv":
+            df = self.read(layer, name, columns=columns)
+            for start in range(0, len(df), batch_rows):
+                yield df.iloc[start:start + batch_rows].reset_index(drop=True)
+            return
+
+        yield from self._scan_dataset(self._dataset(self.path(layer, name)), layer, name, columns, batch_rows)
+
+    def _scan_dataset(self, dataset, layer, name, columns, batch_rows):
+        for batch in dataset.to_batches(columns=self._columns(dataset, columns), batch_size=batch_rows):
+            if batch.num_rows:
+                yield apply_schema(batch.to_pandas(), layer, name)
+
+    def _dataset(self, path):
+        partitioning = self._partitioning(path)
+        dataset = ds.dataset(path, format="parquet", partitioning=partitioning)
+        if len(dataset.files) > 1:
+            schema = pa.unify_schemas(
+                [dataset.schema] + [pq.read_schema(file) for file in dataset.files],
+                promote_options="permissive"
+            )
+            dataset = ds.dataset(path, schema=schema, format="parquet", partitioning=partitioning)
+        return dataset
+
+    def _columns(self, dataset, columns=None):
+        if columns is not None:
+            return columns
+        derived = [field for field in dataset.schema.names if field.endswith(("_date_year", "_date_month"))]
+        return [field for field in dataset.schema.names if field not in derived]
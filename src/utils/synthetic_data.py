@@ -0,0 +1,367 @@
+import argparse
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+SYNTHETIC_DATA_DIR = "data/synthetic"
+
+# Row counts of one hospital at scale 1, matching the shipped sample files.
+BASE_ROWS = {
+    "patients": 5000,
+    "encounters": 10000,
+    "transactions": 10000,
+    "claims": 10000,
+    "providers": 25
+}
+
+DEPARTMENTS = [
+    "Emergency", "Cardiology", "Neurology", "Oncology", "Pediatrics", "Orthopedics", "Dermatology",
+    "Gastroenterology", "Urology", "Radiology", "Anesthesiology", "Pathology", "Surgery", "Pulmonology",
+    "Nephrology", "Ophthalmology", "Gynecology", "Psychiatry", "Endocrinology", "Rheumatology"
+]
+SPECIALIZATIONS = [
+    "Emergency Medicine", "Oncology", "Pediatrics", "Radiology", "Anesthesiology",
+    "Neurology", "Psychiatry", "Dermatology", "Orthopedics", "General Surgery"
+]
+FIRST_NAMES = [
+    "Michael", "Jennifer", "David", "John", "James", "Mary", "Robert", "Linda", "William", "Patricia",
+    "Richard", "Elizabeth", "Joseph", "Susan", "Thomas", "Jessica", "Charles", "Sarah", "Daniel", "Karen",
+    "Matthew", "Nancy", "Anthony", "Lisa", "Mark", "Betty", "Steven", "Sandra", "Paul", "Ashley",
+    "Andrew", "Emily", "Joshua", "Donna", "Kevin", "Michelle", "Brian", "Carol", "Luis", "Amanda"
+]
+LAST_NAMES = [
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez", "Martinez",
+    "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore", "Jackson", "Martin",
+    "Lee", "Perez", "Thompson", "White", "Harris", "Sanchez", "Clark", "Ramirez", "Lewis", "Robinson",
+    "Walker", "Young", "Allen", "King", "Wright", "Scott", "Torres", "Nguyen", "Hill", "Flores"
+]
+STREETS = ["Main St", "Oak Ave", "Pine Rd", "Maple Dr", "Cedar Ln", "Elm St", "Lake Blvd", "Hill Ct"]
+CITIES = ["Springfield, IL", "Riverside, CA", "Franklin, TN", "Greenville, SC", "Madison, WI", "Salem, OR"]
+VISIT_TYPES = ["Follow-up", "Emergency", "Routine", "Consultation"]
+AMOUNT_TYPES = ["Medicare", "Co-pay", "Self-pay", "Medicaid", "Insurance"]
+LINES_OF_BUSINESS = ["Medicare", "Self-Pay", "Commercial", "Medicaid"]
+ENCOUNTER_TYPES = ["Inpatient", "Outpatient", "Routine Checkup", "Telemedicine", "Emergency"]
+CLAIM_PAYORS = ["Medicare", "Medicaid", "Aetna", "BlueCross", "UnitedHealthcare"]
+PAYOR_TYPES = ["Private", "Government", "Self-pay"]
+CLAIM_STATUSES = ["Approved", "Paid", "Pending", "Denied", "Rejected"]
+CLAIM_STATUS_WEIGHTS = [0.35, 0.25, 0.15, 0.15, 0.10]
+CPT_CATEGORIES = ["CRAN", "CARD", "LAM", "THOR", "BILI", "AAA", "ENDO", "GAST", "ORTH", "DERM", "OPHT", "URO"]
+CPT_STATUSES = ["No Change", "Revised", "New", "Deleted"]
+CPT_STATUS_WEIGHTS = [0.8, 0.1, 0.07, 0.03]
+
+PATIENT_COLUMNS = {
+    "a": ["PatientID", "FirstName", "LastName", "MiddleName", "SSN", "PhoneNumber", "Gender", "DOB", "Address", "ModifiedDate"],
+    "b": ["ID", "F_Name", "L_Name", "M_Name", "SSN", "PhoneNumber", "Gender", "DOB", "Address", "Updated_Date"]
+}
+
+def _splitmix(values: np.ndarray) -> np.ndarray:
+    # Stateless 64-bit mixer: the same (stream, row) always yields the same draw, whichever chunk it lands in.
+    z = values.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def _letters(index: int) -> str:
+    name = ""
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        name = chr(ord("a") + rem) + name
+    return name
+
+
+def _day_strings(days: np.ndarray) -> np.ndarray:
+    return np.datetime_as_string(days.astype("datetime64[D]"), unit="D")
+
+
+def _ids(prefix, values: np.ndarray, width=6) -> pd.Series:
+    return prefix + pd.Series(values + 1).astype("string").str.zfill(width)
+
+
+class SyntheticDataGenerator:
+    def __init__(self, output_dir=None, scale=1.0, hospitals=2, seed=42, chunk_rows=None,
+                 start_date="2024-01-01", end_date="2024-11-06", overlap=0.1, unknown_cpt_rate=0.02):
+        self.output_dir = output_dir or os.path.join(SYNTHETIC_DATA_DIR, f"scale_{scale:g}", "data", "raw")
+        self.scale = float(scale)
+        self.hospitals = int(hospitals)
+        self.seed = int(seed)
+        self.chunk_rows = chunk_rows or int(os.getenv("SYNTHETIC_CHUNK_ROWS", 500000))
+        self.start = np.datetime64(start_date, "D")
+        self.days = int((np.datetime64(end_date, "D") - self.start).astype(int)) + 1
+        self.overlap = overlap
+        self.unknown_cpt_rate = unknown_cpt_rate
+        self.rows = {table: max(1, int(round(count * self.scale))) for table, count in BASE_ROWS.items()}
+        # Providers grow with the square root of volume, departments are fixed.
+        self.rows["providers"] = max(BASE_ROWS["providers"], int(BASE_ROWS["providers"] * self.scale ** 0.5))
+        self.width = max(6, len(str(max(self.rows.values()))))
+        self.cpt = self.cpt_codes()
+        # Transactions bill numeric codes only.
+        self.billable = pd.to_numeric(self.cpt["CPT Codes"], errors="coerce").dropna().astype(np.int64).to_numpy()
+
+    def hospital_keys(self) -> list:
+        return [f"hospital_{_letters(i)}" for i in range(self.hospitals)]
+
+    def _uniform(self, stream, hospital, index: np.ndarray) -> np.ndarray:
+        key = (self.seed * 1_000_003 + hospital * 7919 + sum(ord(c) * 131 ** i for i, c in enumerate(stream))) & 0xFFFFFFFF
+        mixed = _splitmix((index.astype(np.uint64) << np.uint64(20)) ^ np.uint64(key))
+        return (mixed >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+    def _choice(self, stream, hospital, index, n, skew=1.0) -> np.ndarray:
+        # skew > 1 concentrates draws on low indices (frequent patients, busy providers, popular codes).
+        u = self._uniform(stream, hospital, index)
+        return np.minimum((n * u ** skew).astype(np.int64), n - 1)
+
+    def _weighted(self, stream, hospital, index, options, weights) -> np.ndarray:
+        u = self._uniform(stream, hospital, index)
+        picks = np.searchsorted(np.cumsum(weights) / np.sum(weights), u, side="right")
+        return np.asarray(options, dtype=object)[np.minimum(picks, len(options) - 1)]
+
+    def _dates(self, stream, hospital, index, start=None, days=None, skew=1.0) -> np.ndarray:
+        start = self.start if start is None else start
+        offsets = self._choice(stream, hospital, index, days or self.days, skew)
+        return start + offsets.astype("timedelta64[D]")
+
+    def _chunks(self, total):
+        for start in range(0, total, self.chunk_rows):
+            yield np.arange(start, min(start + self.chunk_rows, total), dtype=np.int64)
+
+    def cpt_codes(self) -> pd.DataFrame:
+        count = 1200
+        index = np.arange(count, dtype=np.int64)
+        codes = 10000 + self._choice("cpt_code", 0, index, 89000 // count) + index * (89000 // count)
+        # About 1% are Category III codes such as 0585T, which never match a numeric procedure code.
+        labels = pd.Series(codes).astype("string")
+        category_iii = self._uniform("cpt_category_iii", 0, index) < 0.01
+        labels[category_iii] = "0" + (codes[category_iii] % 1000).astype(str).astype(object) + "T"
+        categories = np.asarray(CPT_CATEGORIES, dtype=object)[self._choice("cpt_category", 0, index, len(CPT_CATEGORIES), 1.5)]
+        return pd.DataFrame({
+            "Procedure Code Category": categories,
+            "CPT Codes": labels,
+            "Procedure Code Descriptions": "Procedure " + labels + " (" + pd.Series(categories).astype("string") + ")",
+            "Code Status": self._weighted("cpt_status", 0, index, CPT_STATUSES, CPT_STATUS_WEIGHTS)
+        })
+
+    def departments(self, hospital) -> pd.DataFrame:
+        return pd.DataFrame({
+            "DeptID": _ids("DEPT", np.arange(len(DEPARTMENTS)), 3),
+            "Name": DEPARTMENTS
+        })
+
+    def provider_ids(self, hospital, index) -> pd.Series:
+        return _ids(f"H{hospital + 1}-PROV", index, 4)
+
+    def provider_departments(self, index) -> np.ndarray:
+        return index % len(DEPARTMENTS)
+
+    def providers(self, hospital) -> pd.DataFrame:
+        index = np.arange(self.rows["providers"], dtype=np.int64)
+        return pd.DataFrame({
+            "ProviderID": self.provider_ids(hospital, index),
+            "FirstName": np.asarray(FIRST_NAMES, dtype=object)[self._choice("provider_first", hospital, index, len(FIRST_NAMES))],
+            "LastName": np.asarray(LAST_NAMES, dtype=object)[self._choice("provider_last", hospital, index, len(LAST_NAMES))],
+            "Specialization": np.asarray(SPECIALIZATIONS, dtype=object)[self._choice("specialization", hospital, index, len(SPECIALIZATIONS))],
+            "DeptID": _ids("DEPT", self.provider_departments(index), 3),
+            "NPI": 1_000_000_000 + self._choice("npi", hospital, index, 8_999_999_999)
+        })
+
+    def _identity(self, hospital, index):
+        # A share of each later hospital's patients are the same people as in the first hospital.
+        shared = (hospital > 0) & (self._uniform("shared", hospital, index) < self.overlap)
+        source_hospital = np.where(shared, 0, hospital)
+        source_index = np.where(shared, self._choice("shared_index", hospital, index, self.rows["patients"]), index)
+        return source_hospital, source_index
+
+    def _person(self, stream, source_hospital, source_index, n):
+        # Identity attributes depend only on the source patient, so shared patients match across hospitals.
+        keys = source_hospital.astype(np.int64) * (1 << 36) + source_index
+        return self._choice(stream, 0, keys, n, 1.5)
+
+    def patients(self, hospital, index) -> pd.DataFrame:
+        source_hospital, source_index = self._identity(hospital, index)
+        keys = source_hospital.astype(np.int64) * (1 << 36) + source_index
+        ssn = self._choice("ssn", 0, keys, 899_999_999) + 100_000_000
+        ssn = pd.Series(ssn).astype("string")
+        phone_digits = pd.Series(self._choice("phone", 0, keys, 8_999_999_999) + 1_000_000_000).astype("string")
+        formats = self._choice("phone_format", hospital, index, 3)
+        phone = phone_digits.where(formats == 0, "(" + phone_digits.str[:3] + ")" + phone_digits.str[3:6] + "-" + phone_digits.str[6:])
+        phone = phone.where(formats != 2, phone_digits.str[:3] + "." + phone_digits.str[3:6] + "." + phone_digits.str[6:])
+        dob = np.datetime64("1930-01-01", "D") + self._choice("dob", 0, keys, 34000).astype("timedelta64[D]")
+        street = pd.Series(self._choice("street_no", 0, keys, 9899) + 100).astype("string")
+        address = (street + " " + pd.Series(np.asarray(STREETS, dtype=object)[self._choice("street", 0, keys, len(STREETS))]).astype("string")
+                   + ", " + pd.Series(np.asarray(CITIES, dtype=object)[self._choice("city", 0, keys, len(CITIES))]).astype("string"))
+        values = [
+            _ids(f"HOSP{hospital + 1}-", index, self.width),
+            np.asarray(FIRST_NAMES, dtype=object)[self._person("first", source_hospital, source_index, len(FIRST_NAMES))],
+            np.asarray(LAST_NAMES, dtype=object)[self._person("last", source_hospital, source_index, len(LAST_NAMES))],
+            np.asarray([chr(ord("A") + i) for i in range(26)], dtype=object)[self._person("middle", source_hospital, source_index, 26)],
+            ssn.str[:3] + "-" + ssn.str[3:5] + "-" + ssn.str[5:],
+            phone,
+            np.where(self._person("gender", source_hospital, source_index, 2) == 0, "Female", "Male"),
+            _day_strings(dob),
+            address,
+            _day_strings(self._dates("patient_modified", hospital, index, np.datetime64("2020-01-01", "D"), 1800))
+        ]
+        layout = PATIENT_COLUMNS["b" if hospital % 2 else "a"]
+        return pd.DataFrame({col: np.asarray(value) for col, value in zip(layout, values)})
+
+    def encounter_links(self, hospital, index):
+        patient = self._choice("encounter_patient", hospital, index, self.rows["patients"], 1.6)
+        provider = self._choice("encounter_provider", hospital, index, self.rows["providers"], 1.4)
+        procedure = self._choice("encounter_procedure", hospital, index, len(self.billable), 2.0)
+        return patient, provider, procedure
+
+    def procedure_codes(self, hospital, index, procedure) -> np.ndarray:
+        codes = self.billable[procedure]
+        unknown = self._uniform("unknown_cpt", hospital, index) < self.unknown_cpt_rate
+        return np.where(unknown, 100000 + procedure, codes)
+
+    def encounters(self, hospital, index) -> pd.DataFrame:
+        patient, provider, procedure = self.encounter_links(hospital, index)
+        return pd.DataFrame({
+            "EncounterID": _ids("ENC", index, self.width),
+            "PatientID": _ids(f"HOSP{hospital + 1}-", patient, self.width),
+            "EncounterDate": _day_strings(self._dates("encounter_date", hospital, index)),
+            "EncounterType": self._weighted("encounter_type", hospital, index, ENCOUNTER_TYPES, [3, 5, 4, 2, 2]),
+            "ProviderID": self.provider_ids(hospital, provider),
+            "DepartmentID": _ids("DEPT", self.provider_departments(provider), 3),
+            "ProcedureCode": self.procedure_codes(hospital, index, procedure),
+            "InsertedDate": _day_strings(self._dates("encounter_inserted", hospital, index)),
+            "ModifiedDate": _day_strings(self._dates("encounter_modified", hospital, index))
+        })
+
+    def transaction_links(self, hospital, index):
+        encounter = self._choice("transaction_encounter", hospital, index, self.rows["encounters"])
+        patient, provider, procedure = self.encounter_links(hospital, encounter)
+        service = self._dates("encounter_date", hospital, encounter)
+        return encounter, patient, provider, procedure, service
+
+    def icd_codes(self, hospital, index) -> pd.Series:
+        codes = pd.Series(self._choice("icd", hospital, index, 1000, 1.8))
+        return "I" + (codes // 10).astype("string").str.zfill(2) + "." + (codes % 10).astype("string")
+
+    def transactions(self, hospital, index) -> pd.DataFrame:
+        encounter, patient, provider, procedure, service = self.transaction_links(hospital, index)
+        # Lognormal-looking charges: most are small, a long tail is expensive.
+        amount = np.round(50 + 4000 * self._uniform("amount", hospital, index) ** 3, 2)
+        paid = np.round(amount * self._uniform("paid_ratio", hospital, index), 2)
+        visit = service - self._choice("visit_lag", hospital, index, 14).astype("timedelta64[D]")
+        paid_date = service + self._choice("paid_lag", hospital, index, 90, 2.0).astype("timedelta64[D]")
+        return pd.DataFrame({
+            "TransactionID": _ids("TRANS", index, self.width),
+            "EncounterID": _ids("ENC", encounter, self.width),
+            "PatientID": _ids(f"HOSP{hospital + 1}-", patient, self.width),
+            "ProviderID": self.provider_ids(hospital, provider),
+            "DeptID": _ids("DEPT", self.provider_departments(provider), 3),
+            "VisitDate": _day_strings(visit),
+            "ServiceDate": _day_strings(service),
+            "PaidDate": _day_strings(paid_date),
+            "VisitType": self._weighted("visit_type", hospital, index, VISIT_TYPES, [4, 2, 5, 3]),
+            "Amount": amount,
+            "AmountType": self._weighted("amount_type", hospital, index, AMOUNT_TYPES, [4, 2, 2, 3, 5]),
+            "PaidAmount": paid,
+            "ClaimID": _ids("CLAIM", index, self.width),
+            "PayorID": _ids("PAYOR", self._choice("payor", hospital, index, 200, 2.5), 4),
+            "ProcedureCode": self.procedure_codes(hospital, encounter, procedure),
+            "ICDCode": self.icd_codes(hospital, index),
+            "LineOfBusiness": self._weighted("line_of_business", hospital, index, LINES_OF_BUSINESS, [3, 1, 5, 2]),
+            "MedicaidID": _ids("MEDI", self._choice("medicaid", hospital, index, 99999), 5),
+            "MedicareID": _ids("MCARE", self._choice("medicare", hospital, index, 99999), 5),
+            "InsertDate": _day_strings(service),
+            "ModifiedDate": _day_strings(paid_date)
+        })
+
+    def claims(self, hospital, index) -> pd.DataFrame:
+        # Claim i bills transaction i, so IDs, patients and providers line up across the two feeds.
+        encounter, patient, provider, procedure, service = self.transaction_links(hospital, index)
+        status = self._weighted("claim_status", hospital, index, CLAIM_STATUSES, CLAIM_STATUS_WEIGHTS)
+        claim_amount = np.round(50 + 4000 * self._uniform("amount", hospital, index) ** 3, 2)
+        paid = np.where(np.isin(status, ["Approved", "Paid"]), np.round(claim_amount * (0.5 + 0.5 * self._uniform("claim_paid", hospital, index)), 2), 0.0)
+        claim_date = service + self._choice("claim_lag", hospital, index, 60, 1.5).astype("timedelta64[D]")
+        return pd.DataFrame({
+            "ClaimID": _ids("CLAIM", index, self.width),
+            "TransactionID": _ids("TRANS", index, self.width),
+            "PatientID": _ids(f"HOSP{hospital + 1}-", patient, self.width),
+            "EncounterID": _ids("ENC", encounter, self.width),
+            "ProviderID": self.provider_ids(hospital, provider),
+            "DeptID": _ids("DEPT", self.provider_departments(provider), 3),
+            "ServiceDate": _day_strings(service),
+            "ClaimDate": _day_strings(claim_date),
+            "PayorID": self._weighted("claim_payor", hospital, index, CLAIM_PAYORS, [4, 3, 2, 2, 2]),
+            "ClaimAmount": claim_amount,
+            "PaidAmount": paid,
+            "ClaimStatus": status,
+            "PayorType": self._weighted("payor_type", hospital, index, PAYOR_TYPES, [5, 4, 1]),
+            "Deductible": np.round(500 * self._uniform("deductible", hospital, index), 2),
+            "Coinsurance": np.round(250 * self._uniform("coinsurance", hospital, index), 2),
+            "Copay": np.round(40 * self._uniform("copay", hospital, index), 2),
+            "InsertDate": _day_strings(claim_date),
+            "ModifiedDate": _day_strings(claim_date)
+        })
+
+    def _write(self, path, frames) -> int:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        rows = 0
+        tmp_path = f"{path}.tmp"
+        for i, df in enumerate(frames):
+            df.to_csv(tmp_path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+            rows += len(df)
+        os.replace(tmp_path, path)
+        return rows
+
+    def write_config(self):
+        # Hospital sources for HOSPITALS_CONFIG, so the pipeline can run on the generated files.
+        config = {
+            "raw_dir": self.output_dir,
+            "hospitals": [
+                {"key": key, "database": key, "csv_dir": key, "claims_file": f"claims/hospital{hospital + 1}_claim_data.csv"}
+                for hospital, key in enumerate(self.hospital_keys())
+            ]
+        }
+        path = os.path.join(self.output_dir, "hospitals.json")
+        with open(path, "w") as f:
+            json.dump(config, f, indent=2)
+        return path
+
+    def generate(self) -> dict:
+        start = time.perf_counter()
+        written = {}
+        written["reference/cptcodes.csv"] = self._write(os.path.join(self.output_dir, "reference", "cptcodes.csv"), [self.cpt])
+        for hospital, key in enumerate(self.hospital_keys()):
+            tables = {
+                "departments": [self.departments(hospital)],
+                "providers": [self.providers(hospital)],
+                "patients": (self.patients(hospital, i) for i in self._chunks(self.rows["patients"])),
+                "encounters": (self.encounters(hospital, i) for i in self._chunks(self.rows["encounters"])),
+                "transactions": (self.transactions(hospital, i) for i in self._chunks(self.rows["transactions"]))
+            }
+            for table, frames in tables.items():
+                written[f"{key}/{table}.csv"] = self._write(os.path.join(self.output_dir, key, f"{table}.csv"), frames)
+
+            claims_file = f"claims/hospital{hospital + 1}_claim_data.csv"
+            claims = (self.claims(hospital, i) for i in self._chunks(min(self.rows["claims"], self.rows["transactions"])))
+            written[claims_file] = self._write(os.path.join(self.output_dir, claims_file), claims)
+            logger.info(f"Generated {key}: " + ", ".join(f"{table} {written[f'{key}/{table}.csv']}" for table in tables))
+
+        self.write_config()
+        logger.info(f"Generated {sum(written.values())} rows for {self.hospitals} hospitals at scale {self.scale:g} "
+                    f"in {time.perf_counter() - start:.1f}s under {self.output_dir}")
+        return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate deterministic synthetic RCM source data.")
+    parser.add_argument("--scale", type=float, default=1.0, help="Volume multiplier; 1 matches the shipped sample (5k patients, 10k transactions per hospital).")
+    parser.add_argument("--hospitals", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="Raw data directory to write (default data/synthetic/scale_<n>/data/raw).")
+    args = parser.parse_args()
+
+    import logging
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(name)s | %(message)s")
+    SyntheticDataGenerator(args.output, args.scale, args.hospitals, args.seed).generate()
@@ -0,0 +1,19 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils.storage import LayerStore
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # Keys, watermarks and layers live under relative data/ paths, so every test gets its own.
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def store(workdir):
+    return LayerStore(base_dir=str(workdir / "data"), fmt="parquet")
@@ -0,0 +1,95 @@
+import pandas as pd
+import pytest
+from src.analytics.kpi_engine import LocalKPIEngine
+from src.models.aggregates import AGGREGATES, UNDATED_KEY, AggregateBuilder
+
+
+def facts():
+    transactions = pd.DataFrame({
+        "source_db": ["hospital_a", "hospital_a", "hospital_b", "hospital_b"],
+        "payorid": ["P1", "P2", "P1", "P1"],
+        "deptid": ["D1", "D1", "D2", "D2"],
+        "date_key": pd.array([20240105, 20240210, None, 20240210], dtype="Int32"),
+        "transaction_date": pd.to_datetime(["2024-01-05", "2024-02-10", None, "2024-02-10"]),
+        "amount": [100.0, 200.0, 300.0, 400.0],
+        "paidamount": [50.0, 200.0, 0.0, 100.0],
+        "unified_patient_id": ["a-1", "a-2", "b-1", "b-1"]
+    })
+    claims = pd.DataFrame({
+        "claimstatus": ["Approved", "Denied", "Approved"],
+        "payortype": ["Private", "Government", "Private"],
+        "date_key": pd.array([20240105, None, 20240210], dtype="Int32"),
+        "claimamount": [100.0, 80.0, 60.0],
+        "paidamount": [100.0, 0.0, 60.0]
+    })
+    return {"fact_transactions": transactions, "fact_claims": claims}
+
+
+def aggregates(frames):
+    builder = AggregateBuilder()
+    return {name: builder.aggregate(name, frames[spec["fact"]]) for name, spec in AGGREGATES.items()}
+
+
+def test_undated_rows_are_kept_in_a_sentinel_bucket():
+    daily = aggregates(facts())["agg_daily_revenue"]
+    undated = daily[daily["date_key"] == UNDATED_KEY]
+    assert undated["revenue"].tolist() == [300.0] and undated["month_key"].tolist() == [0]
+    assert daily["revenue"].sum() == 1000.0
+
+
+def test_aggregate_kpis_match_fact_kpis():
+    frames = facts()
+    frames.update(aggregates(frames))
+    engine = LocalKPIEngine(frames=frames)
+    parity = engine.parity()
+    assert parity["match"].all()
+    assert set(parity["kpi"]) >= {"total_revenue", "transaction_count", "claim_count", "transacting_patients"}
+
+    by_month = engine.compute()["revenue_by_month"].set_index("month")["revenue"]
+    assert by_month[202401] == 100.0 and by_month[202402] == 600.0
+    assert by_month[by_month.index.isna()].tolist() == [300.0]
+
+
+def test_payor_revenue_is_rolled_up_per_month():
+    frames = facts()
+    frames.update(aggregates(frames))
+    assert "payorid" not in frames["agg_daily_revenue"].columns
+    monthly = frames["agg_monthly_payor_revenue"]
+    assert sorted(zip(monthly["month_key"], monthly["payorid"], monthly["revenue"])) == [
+        (0, "P1", 300.0), (202401, "P1", 100.0), (202402, "P1", 400.0), (202402, "P2", 200.0)
+    ]
+
+    by_payor = LocalKPIEngine(frames=frames).compute()["revenue_by_payor"]
+    assert by_payor[["payorid", "revenue"]].values.tolist() == [["P1", 800.0], ["P2", 200.0]]
+
+
+def test_parity_flags_a_stale_aggregate():
+    frames = facts()
+    frames.update(aggregates(frames))
+    frames["agg_daily_revenue"] = frames["agg_daily_revenue"][frames["agg_daily_revenue"]["date_key"] != UNDATED_KEY]
+    parity = LocalKPIEngine(frames=frames).parity().set_index("kpi")
+    assert not parity.loc["total_revenue", "match"]
+
+
+def test_incremental_update_refreshes_the_undated_bucket(store):
+    builder = AggregateBuilder(store=store, state_dir="data/state/aggregates")
+    frames = facts()
+    builder.update("agg_daily_revenue", frames["fact_transactions"])
+
+    changed = frames["fact_transactions"].copy()
+    changed.loc[changed["date_key"].isna(), "amount"] = 350.0
+    rows = builder.update("agg_daily_revenue", changed)
+    assert rows["date_key"].tolist() == [UNDATED_KEY]
+    assert store.read("gold", "agg_daily_revenue")["revenue"].sum() == pytest.approx(1050.0)
+
+
+def test_incremental_update_rebuilds_touched_payor_months(store):
+    builder = AggregateBuilder(store=store, state_dir="data/state/aggregates")
+    frames = facts()
+    builder.update("agg_monthly_payor_revenue", frames["fact_transactions"])
+
+    changed = frames["fact_transactions"].copy()
+    changed.loc[changed["date_key"] == 20240105, "amount"] = 150.0
+    rows = builder.update("agg_monthly_payor_revenue", changed)
+    assert rows["month_key"].tolist() == [202401]
+    assert store.read("gold", "agg_monthly_payor_revenue")["revenue"].sum() == pytest.approx(1050.0)
@@ -0,0 +1,72 @@
+import pandas as pd
+import pytest
+from src.analytics.ar_aging import ARAnalytics
+
+
+@pytest.fixture
+def results():
+    transactions = pd.DataFrame({
+        "source_db": ["hospital_a"] * 4,
+        "servicedate": pd.to_datetime(["2024-03-01", "2024-03-21", "2024-01-01", "2024-04-10"]),
+        # Paid after the as-of date still counts as open on it.
+        "paiddate": pd.to_datetime(["2024-03-11", None, "2024-04-15", None]),
+        "amount": [100.0, 200.0, 300.0, 400.0],
+        "paidamount": [100.0, 0.0, 300.0, 0.0]
+    })
+    claims = pd.DataFrame({
+        "source_db": ["hospital_a"] * 2,
+        "servicedate": pd.to_datetime(["2024-03-01", "2024-03-01"]),
+        "claim_date": pd.to_datetime(["2024-03-06", "2024-03-16"]),
+        "claimstatus": ["Denied", "Paid"],
+        "claimamount": [100.0, 300.0]
+    })
+    analytics = ARAnalytics(frames={"fact_transactions": transactions, "fact_claims": claims},
+                            groupings=[["source_db"]], as_of="2024-03-31", materialize=False)
+    return analytics.compute()
+
+
+def test_summary(results):
+    summary = results["agg_ar_summary"].iloc[0]
+    assert summary["transactions"] == 3 and summary["paid_transactions"] == 1
+    assert summary["charges"] == 600.0 and summary["payments"] == 100.0 and summary["ar_balance"] == 500.0
+    # Only charges within the last 90 days (the first two) count towards average daily charges.
+    assert summary["days_in_ar"] == pytest.approx(500.0 / (300.0 / 90))
+    assert summary["avg_days_to_payment"] == 10.0
+
+
+def test_aging_buckets(results):
+    aging = results["agg_ar_aging"]
+    balances = dict(zip(aging["aging_bucket"].astype(str), aging["open_balance"]))
+    assert balances == {"0-30": 200.0, "61-90": 300.0}
+
+
+def test_rolling_collections(results):
+    rolling = results["agg_collection_rolling"].set_index("date")
+    day = rolling.loc[pd.Timestamp("2024-03-21")]
+    assert day["charges_30d"] == 300.0 and day["payments_30d"] == 100.0
+    assert day["collection_rate_30d"] == pytest.approx(100.0 / 3)
+    # The January charge is 80 days earlier: inside the 90 day window only.
+    assert day["charges_90d"] == 600.0
+    assert rolling.loc[pd.Timestamp("2024-03-11"), "collection_rate_30d"] == 100.0
+
+
+def test_denials(results):
+    denials = results["agg_claim_denials"].iloc[0]
+    assert denials["claims"] == 2 and denials["denied_claims"] == 1
+    assert denials["denial_rate"] == 50.0 and denials["denied_amount"] == 100.0
+    assert denials["avg_claim_lag_days"] == 10.0
+
+
+def test_undated_transactions_report_as_of_today():
+    transactions = pd.DataFrame({
+        "source_db": ["hospital_a"],
+        "servicedate": pd.to_datetime([None]),
+        "paiddate": pd.to_datetime([None]),
+        "amount": [100.0],
+        "paidamount": [0.0]
+    })
+    results = ARAnalytics(frames={"fact_transactions": transactions}, groupings=[["source_db"]], materialize=False).compute()
+    summary = results["agg_ar_summary"].iloc[0]
+    assert summary["as_of_date"] == pd.Timestamp.today().normalize()
+    assert summary["transactions"] == 0 and summary["ar_balance"] == 0.0
+    assert results["agg_ar_aging"].empty
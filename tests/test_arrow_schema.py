@@ -0,0 +1,86 @@
+import io
+from decimal import Decimal
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from src.load.backends import BigQueryBackend, SQLiteBackend, to_arrow, write_parquet
+from src.load.loader import Loader
+from src.models.schema_definitions import GOLD_SCHEMAS, apply_schema, empty_frame
+
+
+def loader(workdir):
+    return Loader(backend=SQLiteBackend(base_dir=str(workdir / "warehouse")), max_workers=1, incremental=False)
+
+
+def bigquery_backend():
+    # job_config only needs the bigquery module, not a client.
+    backend = BigQueryBackend.__new__(BigQueryBackend)
+    backend.bigquery = pytest.importorskip("google.cloud.bigquery")
+    return backend
+
+
+def arrow_matches(field_type, arrow_type) -> bool:
+    if field_type == "STRING":
+        if pa.types.is_dictionary(arrow_type):
+            arrow_type = arrow_type.value_type
+        return pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type)
+    if field_type == "INTEGER":
+        # Narrower signed ints are widened by BigQuery itself; unsigned ones would be read as unsigned.
+        return pa.types.is_signed_integer(arrow_type)
+    return arrow_type == {
+        "DATE": pa.date32(),
+        "TIMESTAMP": pa.timestamp("us"),
+        "NUMERIC": pa.decimal128(38, 9),
+        "FLOAT": pa.float64(),
+        "BOOLEAN": pa.bool_()
+    }[field_type]
+
+
+def test_every_registry_type_maps_to_its_warehouse_type(workdir):
+    sample = apply_schema(pd.DataFrame({
+        "transactionid": ["T1", "T2"],
+        "source_db": ["hospital_a", None],
+        "servicedate": pd.to_datetime(["2024-02-29", None]),
+        "transaction_date": pd.to_datetime(["2024-02-29 10:30", None]),
+        "amount": [12.345, None],
+        "patient_key": pd.array([7, None], dtype="Int32")
+    }), "gold", "fact_transactions")
+    schema = loader(workdir).extract_schema(sample, "project.gold.fact_transactions")
+    types = {field["column"]: field["type"] for field in schema}
+    # Registry dates load as DATE, except the partition column which stays TIMESTAMP.
+    assert types == {"transactionid": "STRING", "source_db": "STRING", "servicedate": "DATE",
+                     "transaction_date": "TIMESTAMP", "amount": "NUMERIC", "patient_key": "INTEGER"}
+
+    table = to_arrow(sample, schema)
+    assert table.schema.field("servicedate").type == pa.date32()
+    assert table.schema.field("transaction_date").type == pa.timestamp("us")
+    assert table.schema.field("amount").type == pa.decimal128(38, 9)
+    assert table.schema.field("patient_key").type == pa.int32()
+    assert table.column("amount").to_pylist() == [Decimal("12.345"), None]
+    assert table.column("patient_key").to_pylist() == [7, None]
+
+    config = bigquery_backend().job_config(schema, "transaction_date")
+    assert [(field.name, field.field_type) for field in config.schema] == list(types.items())
+
+
+@pytest.mark.parametrize("table_name", sorted(GOLD_SCHEMAS))
+def test_all_null_gold_columns_keep_their_declared_types(workdir, table_name):
+    # Two rows where every column that can hold a null does, so no type can be inferred from the values.
+    empty = empty_frame("gold", table_name)
+    df = pd.DataFrame({
+        col: [False] * 2 if dtype == "bool" else [0] * 2 if pd.api.types.is_integer_dtype(dtype) and not
+        isinstance(dtype, pd.api.extensions.ExtensionDtype) else [None] * 2
+        for col, dtype in empty.dtypes.items()
+    })
+    df = apply_schema(df, "gold", table_name)
+    assert df.dtypes.equals(empty.dtypes)
+    schema = loader(workdir).extract_schema(df, f"project.gold.{table_name}")
+    table = to_arrow(df, schema)
+    for field in schema:
+        assert arrow_matches(field["type"], table.schema.field(field["column"]).type), field
+
+    sink = io.BytesIO()
+    write_parquet(table, sink)
+    sink.seek(0)
+    assert pq.read_table(sink).schema.equals(table.schema)
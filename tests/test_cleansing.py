@@ -0,0 +1,81 @@
+import pandas as pd
+from src.models.schema_definitions import apply_schema
+from src.transform import cleansing
+
+
+def test_normalize_phone_formats_and_extensions(monkeypatch):
+    monkeypatch.delenv("PHONE_COUNTRY_CODE", raising=False)
+    phone, ext = cleansing.normalize_phone(pd.Series(["(555) 123-4567", "555.123.4567 x42", "1-555-123-4567", "12345", None]))
+    assert phone.tolist()[:3] == ["+91-5551234567"] * 3
+    assert phone[3:].isna().all()
+    assert ext[1] == "42" and ext.drop(index=1).isna().all()
+
+
+def test_normalize_phone_country_code_from_env(monkeypatch):
+    monkeypatch.setenv("PHONE_COUNTRY_CODE", "+44")
+    phone, _ = cleansing.normalize_phone(pd.Series(["5551234567"]))
+    assert phone[0] == "+44-5551234567"
+
+
+def test_raw_schema_parses_other_date_layouts():
+    raw = apply_schema(pd.DataFrame({"DOB": ["1980-03-15", "03/15/1980", "19800315", None]}), "raw", "patients")
+    assert raw["DOB"][:3].tolist() == [pd.Timestamp("1980-03-15")] * 3
+    assert pd.isna(raw["DOB"][3])
+
+
+def test_parse_dates_tries_each_format():
+    parsed = cleansing.parse_dates(pd.Series(["2024-03-01", "03/02/2024", "2024/03/03", "20240304", "not a date"]))
+    assert parsed[:4].dt.day.tolist() == [1, 2, 3, 4]
+    assert pd.isna(parsed[4])
+
+
+def test_normalize_names_keeps_mixed_case():
+    names = cleansing.normalize_names(pd.Series(["  JOHN   SMITH ", "mary", "McDonald", "O'Neil", None]))
+    assert names[:4].tolist() == ["John Smith", "Mary", "McDonald", "O'Neil"]
+    assert pd.isna(names[4])
+
+
+def test_standardize_gender():
+    values = pd.Series(["m", "Female", " F ", "x", None])
+    expected = ["Male", "Female", "Female", "Unknown", "Unknown"]
+    assert cleansing.standardize_gender(values).tolist() == expected
+    assert cleansing.standardize_gender(values.astype("category")).tolist() == expected
+
+
+def test_compute_age():
+    dob = pd.to_datetime(pd.Series(["2000-06-15", "2000-06-16", None]))
+    age = cleansing.compute_age(dob, as_of="2024-06-15")
+    assert age[:2].tolist() == [24, 23]
+    assert pd.isna(age[2])
+
+
+def test_identity_key_ignores_case_and_whitespace():
+    dob = pd.to_datetime(pd.Series(["1980-01-01", "1980-01-01", "1980-01-02"]))
+    keys = cleansing.identity_key(pd.Series(["Ann", " ann", "Ann"]), pd.Series(["Lee", "LEE", "Lee"]), dob)
+    assert keys[0] == keys[1] != keys[2]
+
+
+def test_coalesce_aliases_maps_hospital_b_columns():
+    df = pd.DataFrame({"id": ["P1", "P2"], "f_name": ["Ann", "Bob"], "first_name": [None, "Robert"]})
+    aligned = cleansing.coalesce_aliases(df, "patients")
+    assert list(aligned.columns) == ["patientid", "first_name"]
+    assert aligned["patientid"].tolist() == ["P1", "P2"]
+    assert aligned["first_name"].tolist() == ["Ann", "Robert"]
+
+
+def test_unified_patient_id_prefers_source_db():
+    df = pd.DataFrame({"patientid": ["P1"], "source_db": ["hospital_a"], "source_file": ["claims.csv"]})
+    assert cleansing.unified_patient_id(df).tolist() == ["P1_hospital_a"]
+    assert cleansing.unified_patient_id(df.drop(columns="source_db")).tolist() == ["P1_claims.csv"]
+
+
+def test_fill_transaction_date_falls_back_to_service_date():
+    dates = pd.to_datetime(pd.Series(["2024-03-01"]))
+    assert cleansing.fill_transaction_date(pd.DataFrame({"transactiondate": dates}))["transaction_date"].equals(dates)
+    filled = cleansing.fill_transaction_date(pd.DataFrame({"servicedate": dates}))
+    assert filled["transaction_date"].equals(dates)
+
+
+def test_validate_email():
+    valid = cleansing.validate_email(pd.Series(["ann.lee@example.com", " bob@mail.example.org ", "no-at.example.com", "a@b", "a b@c.com", None]))
+    assert valid.tolist() == [True, True, False, False, False, False]
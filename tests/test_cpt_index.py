@@ -0,0 +1,31 @@
+import os
+import pandas as pd
+from src.transform.cpt_index import load_cpt_index, read_cpt_reference
+
+
+def write_reference(path, rows):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    pd.DataFrame(rows, columns=["Procedure Code Category", "CPT Codes", "Procedure Code Descriptions", "Code Status"]).to_csv(path, index=False)
+
+
+def test_extracted_codes_replace_a_stale_reference_file(workdir):
+    path = "data/raw/reference/cptcodes.csv"
+    write_reference(path, [["Surgery", "10021", "Fine needle aspiration", "Active"]])
+    assert load_cpt_index(path=path).unmatched(pd.Series([99213])) == 1
+
+    # A newer extract than the file on disk, which still lacks 99213.
+    write_reference("data/extract/cptcodes.csv", [["Surgery", "10021", "Fine needle aspiration", "Active"], ["E&M", "99213", "Office visit", "Active"]])
+    extracted = read_cpt_reference("data/extract/cptcodes.csv")
+    index = load_cpt_index(extracted, path=path)
+    assert index.unmatched(pd.Series([99213, 10021])) == 0
+    enriched = index.enrich(pd.DataFrame({"procedurecode": [99213]}))
+    assert enriched["cpt_description"].tolist() == ["Office visit"]
+    # The same extract is indexed once.
+    assert load_cpt_index(extracted.copy(), path=path) is index
+
+
+def test_reference_file_is_used_without_an_extract(workdir):
+    path = "data/raw/reference/cptcodes.csv"
+    write_reference(path, [["E&M", "99213", "Office visit", "Active"]])
+    assert load_cpt_index(pd.DataFrame(), path=path).unmatched(pd.Series([99213])) == 0
+    assert load_cpt_index(path="missing.csv").unmatched(pd.Series([99213])) == 1
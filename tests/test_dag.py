@@ -0,0 +1,88 @@
+import os
+import pandas as pd
+import pytest
+from src.utils.dag import STAGE_CACHE_DIR, DAG, FrameFingerprint, fingerprint
+
+
+class Pipeline:
+    # A source task feeding a derived one; calls records which tasks actually ran.
+    def __init__(self, source, version="v1", valid=None):
+        self.source = source
+        self.version = version
+        self.valid = valid
+        self.calls = []
+
+    def run(self):
+        def extract():
+            self.calls.append("extract")
+            return self.source.copy()
+
+        def totals(df):
+            self.calls.append("totals")
+            return df.groupby("source_db", as_index=False)["amount"].sum()
+
+        dag = DAG(max_workers=2, use_cache=True, version=self.version)
+        dag.task("extract", extract, cache=False)
+        dag.task("totals", totals, ["extract"], valid=self.valid)
+        values = dag.run()
+        return dag, values
+
+
+def source():
+    return pd.DataFrame({"source_db": ["hospital_a", "hospital_b", "hospital_a"], "amount": [10.0, 20.0, 5.0]})
+
+
+def statuses(dag):
+    return {entry["task"]: entry["status"] for entry in dag.report}
+
+
+def test_fingerprint_ignores_row_order_and_batching():
+    df = source()
+    whole = fingerprint(df)
+    assert fingerprint(df.iloc[::-1]) == whole
+    assert FrameFingerprint().update(df.iloc[:1]).update(df.iloc[1:]).hexdigest() == whole
+    assert fingerprint(df.assign(amount=[10.0, 20.0, 6.0])) != whole
+    assert fingerprint(df.astype({"source_db": "category"})) != whole
+
+
+def test_unchanged_input_is_served_from_the_cache(workdir):
+    pipeline = Pipeline(source())
+    first, values = pipeline.run()
+    assert statuses(first) == {"extract": "ran", "totals": "ran"}
+    assert os.path.isdir(os.path.join(STAGE_CACHE_DIR, "totals", first.keys["totals"]))
+
+    # Same rows in another order: same fingerprint, so totals is a hit and loads from its Parquet file.
+    pipeline.source = source().iloc[::-1]
+    second, _ = pipeline.run()
+    assert statuses(second) == {"extract": "ran", "totals": "cached"}
+    assert pipeline.calls == ["extract", "totals", "extract"]
+    assert second.keys["totals"] == first.keys["totals"]
+    pd.testing.assert_frame_equal(second.value("totals"), values["totals"])
+
+
+@pytest.mark.parametrize("change", ["input", "code"])
+def test_changed_input_or_code_version_reruns(workdir, change):
+    pipeline = Pipeline(source())
+    first, _ = pipeline.run()
+    if change == "input":
+        pipeline.source = source().assign(amount=[10.0, 20.0, 6.0])
+    else:
+        pipeline.version = "v2"
+    second, values = pipeline.run()
+    assert statuses(second) == {"extract": "ran", "totals": "ran"}
+    assert second.keys["totals"] != first.keys["totals"]
+    assert values["totals"]["amount"].tolist() == ([16.0, 20.0] if change == "input" else [15.0, 20.0])
+    # Only the newest result per task is kept.
+    assert os.listdir(os.path.join(STAGE_CACHE_DIR, "totals")) == [second.keys["totals"]]
+
+
+def test_failed_validity_check_forces_a_rerun(workdir):
+    pipeline = Pipeline(source(), valid=lambda: False)
+    pipeline.run()
+    second, _ = pipeline.run()
+    assert statuses(second) == {"extract": "ran", "totals": "ran"}
+    assert pipeline.calls.count("totals") == 2
+
+    pipeline.valid = lambda: True
+    third, _ = pipeline.run()
+    assert statuses(third)["totals"] == "cached"
@@ -0,0 +1,54 @@
+import sqlite3
+import pandas as pd
+import pytest
+from src.extract.extractor import Extractor
+from src.models.schema_definitions import source_columns
+from src.utils.synthetic_data import SyntheticDataGenerator
+from config.db_config import load_hospitals
+
+
+@pytest.fixture
+def sqlite_hospital(workdir):
+    with sqlite3.connect(workdir / "hospital_a.db") as conn:
+        conn.execute('CREATE TABLE patients (patientid TEXT, FirstName TEXT, LastName TEXT, DOB TEXT, Gender TEXT, '
+                     'Address TEXT, MedicaidID TEXT, ModifiedDate TEXT)')
+        conn.execute("INSERT INTO patients VALUES ('P1', 'Ann', 'Lee', '1980-01-01', 'F', '1 Main St', 'M-1', '2024-01-01')")
+    return {"key": "hospital_a", "dsn": f"sqlite:///{workdir / 'hospital_a.db'}", "csv_dir": str(workdir), "claims_file": None}
+
+
+def selected(query):
+    return [col.strip().strip('"') for col in query.split("SELECT ", 1)[1].split(" FROM ", 1)[0].split(",")]
+
+
+def test_select_reads_only_registry_columns(sqlite_hospital, monkeypatch):
+    monkeypatch.setenv("EXTRACT_PROJECTION", "true")
+    extractor = Extractor(hospitals=[sqlite_hospital])
+    columns = selected(extractor.select("hospital_a", "patients"))
+    # Matched case-insensitively, but named as the source table spells them.
+    assert columns == ["patientid", "FirstName", "LastName", "Gender", "DOB", "ModifiedDate"]
+    wanted = {col.lower() for col in source_columns("patients")}
+    assert {col.lower() for col in columns} <= wanted
+    assert "encounters" not in extractor.tables
+
+    df = extractor.read_mysql_table("hospital_a", "patients")
+    assert "Address" not in df.columns and "MedicaidID" not in df.columns
+    extractor.close()
+
+
+def test_select_without_projection_reads_everything(sqlite_hospital, monkeypatch):
+    monkeypatch.setenv("EXTRACT_PROJECTION", "false")
+    extractor = Extractor(hospitals=[sqlite_hospital])
+    assert extractor.select("hospital_a", "patients") == "SELECT * FROM patients"
+    assert "encounters" in extractor.tables
+
+
+def test_threaded_extraction_matches_sequential(workdir, monkeypatch):
+    monkeypatch.setenv("USE_MYSQL", "false")
+    SyntheticDataGenerator(output_dir="data/raw", scale=0.02, hospitals=3, seed=1).generate()
+    hospitals = load_hospitals("data/raw/hospitals.json")
+
+    sequential = Extractor(max_workers=1, hospitals=hospitals).run(reference=False)
+    threaded = Extractor(max_workers=8, hospitals=hospitals).run(reference=False)
+    assert list(threaded) == list(sequential)
+    for table, df in sequential.items():
+        pd.testing.assert_frame_equal(threaded[table], df)
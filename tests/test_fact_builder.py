@@ -0,0 +1,58 @@
+import pandas as pd
+from src.models.fact_builder import DimensionIndex, FactAssembler, date_keys
+
+
+def test_date_keys_match_strftime():
+    dates = pd.to_datetime(pd.Series([
+        "2024-02-29", "2000-02-29", "1900-03-01", "1969-12-31", "1970-01-01", "2023-12-31 23:59", None, "2024-02-29"
+    ]), format="ISO8601")
+    keys = date_keys(dates)
+    expected = dates.dt.strftime("%Y%m%d").astype("Int32")
+    assert keys.dtype == "Int32"
+    assert keys.tolist() == expected.tolist()
+    assert keys[:4].tolist() == [20240229, 20000229, 19000301, 19691231]
+    assert pd.isna(keys[6])
+
+
+def test_date_keys_of_only_missing_dates():
+    assert date_keys(pd.Series([pd.NaT, pd.NaT])).isna().all()
+    assert date_keys(pd.Series([], dtype="datetime64[ns]")).empty
+
+
+def test_dimension_index_counts_unmatched_non_null_values():
+    index = DimensionIndex("provider_key", pd.Series(["PR1", "PR2", None]), pd.Series([0, 1, 2]))
+    for values in [pd.Series(["PR2", "PR9", None, "PR1", "PR9"]), pd.Series(["PR2", "PR9", None, "PR1", "PR9"], dtype="category")]:
+        # Missing and unknown values both land on the -1 position and come back as null keys.
+        assert index.positions(values).tolist() == [1, -1, -1, 0, -1]
+        keys, unmatched = index.resolve(values)
+        assert keys.tolist()[:2] == [1, pd.NA] and keys.tolist()[3] == 0
+        assert keys.isna().tolist() == [False, True, True, False, True]
+        assert unmatched == 2
+
+
+def test_assembled_keys_match_left_merges():
+    facts = pd.DataFrame({
+        "transactionid": ["T1", "T2", "T3", "T4"],
+        "unified_patient_id": ["P1", "P3", "P2", None],
+        "providerid": ["PR1", "PR1", "PR9", "PR2"],
+        "procedurecode": pd.array([99213, 10021, None, 99213], dtype="Int32"),
+        "transaction_date": pd.to_datetime(["2024-02-29", None, "1969-12-31", "2024-03-01"])
+    })
+    patients = pd.DataFrame({"unified_patient_id": ["P1", "P2"], "patient_key": [10, 11]})
+    providers = pd.DataFrame({"providerid": ["PR1", "PR2"], "provider_key": [20, 21]})
+    procedures = pd.DataFrame({"procedurecode": pd.array([99213], dtype="Int32"), "procedure_key": [30]})
+
+    assembler = FactAssembler()
+    assembler.add_dimension("patient_key", patients["unified_patient_id"], patients["patient_key"])
+    assembler.add_dimension("provider_key", providers["providerid"], providers["provider_key"])
+    assembler.add_dimension("procedure_key", procedures["procedurecode"], procedures["procedure_key"])
+    lookups = {"patient_key": "unified_patient_id", "provider_key": "providerid", "procedure_key": "procedurecode"}
+    fact = assembler.assemble("fact_transactions", facts, lookups, date_column="transaction_date")
+
+    merged = (facts.merge(patients, on="unified_patient_id", how="left")
+              .merge(providers, on="providerid", how="left")
+              .merge(procedures, on="procedurecode", how="left"))
+    for key in lookups:
+        assert fact[key].tolist() == merged[key].astype("Int32").tolist()
+    assert fact["date_key"].tolist() == [20240229, pd.NA, 19691231, 20240301]
+    assert assembler.last_unmatched == {"patient_key": 1, "provider_key": 1, "procedure_key": 1, "date_key": 1}
@@ -0,0 +1,49 @@
+import base64
+import numpy as np
+import pandas as pd
+from src.utils.hll import (HLL_ERROR, HLL_REGISTERS, HLL_SPARSE_LIMIT, hll_decode, hll_encode, hll_estimate,
+                           hll_merge, hll_sketches, is_dense)
+
+
+def sketch(ids, groups=None, n_groups=1):
+    values = pd.Series(ids, dtype="string")
+    groups = np.zeros(len(values), dtype=np.int64) if groups is None else np.asarray(groups)
+    return hll_sketches(values, groups, n_groups)
+
+
+def test_small_groups_are_exact_and_sparse():
+    small, empty = sketch(["p1", "p2", "p2", None], groups=[0, 0, 0, 1], n_groups=2)
+    assert not is_dense(small) and hll_estimate(small) == 2
+    assert hll_estimate(empty) == 0
+    encoded = hll_encode([small, empty])
+    assert len(base64.b64decode(encoded[0])) == 16
+    assert [hll_estimate(s) for s in hll_decode(encoded)] == [2, 0]
+
+
+def test_large_groups_switch_to_dense_registers():
+    ids = [f"p{i}" for i in range(20000)]
+    (dense,) = sketch(ids)
+    assert is_dense(dense) and len(dense) == HLL_REGISTERS
+    assert abs(hll_estimate(dense) - 20000) <= 3 * HLL_ERROR * 20000
+    assert np.array_equal(hll_decode(hll_encode([dense]))[0], dense)
+
+
+def test_merge_unions_sparse_sketches_until_the_limit():
+    half = HLL_SPARSE_LIMIT // 2
+    first = sketch([f"p{i}" for i in range(half)])[0]
+    second = sketch([f"p{i}" for i in range(half - 10, 2 * half - 10)])[0]
+    merged = hll_merge([first, second])
+    assert not is_dense(merged) and hll_estimate(merged) == 2 * half - 10
+
+    third = sketch([f"q{i}" for i in range(half)])[0]
+    merged = hll_merge([first, second, third])
+    assert is_dense(merged)
+    assert abs(hll_estimate(merged) - (3 * half - 10)) <= 3 * HLL_ERROR * 3 * half
+
+
+def test_merge_of_sparse_and_dense_matches_one_sketch_of_everything():
+    ids = [f"p{i}" for i in range(5000)]
+    (dense,) = sketch(ids[:4900])
+    (sparse,) = sketch(ids[4900:])
+    (whole,) = sketch(ids)
+    assert np.array_equal(hll_merge([dense, sparse]), whole)
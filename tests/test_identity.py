@@ -0,0 +1,66 @@
+import logging
+import pandas as pd
+from src.transform.identity import IdentityResolver, soundex
+
+
+def patients(rows):
+    columns = ["unified_patient_id", "first_name", "last_name", "DOB", "ssn", "phone", "gender", "source_db"]
+    df = pd.DataFrame(rows, columns=columns)
+    df["DOB"] = pd.to_datetime(df["DOB"])
+    return df
+
+
+ANN_A = ("P1_hospital_a", "Ann", "Lee", "1980-01-01", "123-45-6789", "+1-5551234567", "Female", "hospital_a")
+ANN_B = ("P7_hospital_b", "ann", "LEE", "1980-01-01", "123456789", "+1-5551234567", "Female", "hospital_b")
+BOB_A = ("P2_hospital_a", "Bob", "Stone", "1975-05-05", "987-65-4321", "+1-5559876543", "Male", "hospital_a")
+
+
+def ids(identity):
+    return identity.set_index("unified_patient_id")["enterprise_patient_id"].to_dict()
+
+
+def test_soundex():
+    names = pd.Series(["Robert", "Rupert", "Ashcraft", "Tymczak", "Pfister", "", None])
+    assert soundex(names)[:5].tolist() == ["R163", "R163", "A261", "T522", "P236"]
+    assert soundex(names)[5:].isna().all()
+
+
+def test_matches_the_same_patient_across_hospitals(workdir):
+    resolved = ids(IdentityResolver(state_dir="keys").resolve(patients([ANN_A, BOB_A, ANN_B])))
+    assert resolved["P1_hospital_a"] == resolved["P7_hospital_b"]
+    assert resolved["P2_hospital_a"] != resolved["P1_hospital_a"]
+
+
+def test_same_hospital_duplicates_stay_apart(workdir):
+    twin = ("P9_hospital_a",) + ANN_A[1:]
+    resolved = ids(IdentityResolver(state_dir="keys").resolve(patients([ANN_A, twin])))
+    assert resolved["P1_hospital_a"] != resolved["P9_hospital_a"]
+
+
+def test_pairs_below_the_threshold_are_not_matched(workdir):
+    # Same name, DOB and phone but a conflicting SSN: 8 agree, -5 for the SSN.
+    other = ANN_B[:4] + ("111-11-1111",) + ANN_B[5:]
+    resolved = ids(IdentityResolver(state_dir="keys").resolve(patients([ANN_A, other])))
+    assert resolved["P1_hospital_a"] != resolved["P7_hospital_b"]
+
+    resolved = ids(IdentityResolver(state_dir="other_keys", threshold=100).resolve(patients([ANN_A, ANN_B])))
+    assert resolved["P1_hospital_a"] != resolved["P7_hospital_b"]
+
+
+def test_oversized_blocks_are_skipped(workdir, caplog):
+    third = ("P8_hospital_b",) + ANN_B[1:]
+    with caplog.at_level(logging.WARNING):
+        resolved = ids(IdentityResolver(state_dir="keys", max_block=2).resolve(patients([ANN_A, ANN_B, third])))
+    assert len(set(resolved.values())) == 3
+    assert "Skipped" in caplog.text
+
+
+def test_ids_are_stable_across_incremental_runs(workdir):
+    first = ids(IdentityResolver(state_dir="keys").resolve(patients([ANN_A, BOB_A])))
+    again = ids(IdentityResolver(state_dir="keys").resolve(patients([BOB_A, ANN_A])))
+    assert again == first
+
+    # A new hospital B record joins the existing enterprise ID instead of getting a new one.
+    grown = ids(IdentityResolver(state_dir="keys").resolve(patients([ANN_A, BOB_A, ANN_B])))
+    assert grown["P7_hospital_b"] == first["P1_hospital_a"]
+    assert {key: grown[key] for key in first} == first
@@ -0,0 +1,85 @@
+import pandas as pd
+import pytest
+from src.extract.incremental import WatermarkStore, changed_mask, max_watermark, merge_batches, merge_snapshot
+from src.models.schema_definitions import apply_schema
+from src.utils.storage import LayerStore
+
+
+def transactions(ids, amounts, modified, source="hospital_a"):
+    return apply_schema(pd.DataFrame({
+        "TransactionID": ids,
+        "Amount": amounts,
+        "ModifiedDate": modified,
+        "InsertDate": modified,
+        "source_db": source
+    }), "raw", "transactions")
+
+
+def test_merge_snapshot_keeps_latest_row_per_source_and_key():
+    snapshot = pd.concat([
+        transactions(["T1", "T2"], [10.0, 20.0], ["2024-01-01", "2024-01-01"]),
+        transactions(["T1"], [99.0], ["2024-01-01"], source="hospital_b")
+    ], ignore_index=True)
+    delta = transactions(["T2", "T3"], [25.0, 30.0], ["2024-02-01", "2024-02-01"])
+
+    merged = merge_snapshot(snapshot, delta, "transactions")
+    amounts = merged.set_index(["source_db", "TransactionID"])["Amount"].to_dict()
+    assert amounts == {("hospital_a", "T1"): 10.0, ("hospital_a", "T2"): 25.0,
+                       ("hospital_a", "T3"): 30.0, ("hospital_b", "T1"): 99.0}
+
+
+def test_merge_snapshot_without_delta_keeps_snapshot():
+    snapshot = transactions(["T1"], [10.0], ["2024-01-01"])
+    assert merge_snapshot(snapshot, snapshot.iloc[:0], "transactions") is snapshot
+
+
+def test_changed_mask_and_max_watermark():
+    df = pd.DataFrame({"ModifiedDate": ["2024-01-01", "2024-03-01", None], "InsertDate": ["2024-01-01", None, "2024-02-15"]})
+    columns = ["ModifiedDate", "InsertDate"]
+    assert changed_mask(df, columns, "2024-02-01").tolist() == [False, True, True]
+    assert max_watermark(df, columns) == "2024-03-01T00:00:00"
+
+
+def test_watermarks_only_move_forward_and_persist_on_commit(workdir):
+    marks = WatermarkStore()
+    marks.stage("hospital_a", "transactions", "2024-02-01T00:00:00")
+    marks.stage("hospital_a", "transactions", "2024-01-01T00:00:00")
+    assert marks.get("hospital_a", "transactions") is None
+    marks.commit()
+    assert WatermarkStore().get("hospital_a", "transactions") == "2024-02-01T00:00:00"
+
+
+def test_merge_batches_matches_merge_snapshot():
+    snapshot = transactions(["T1", "T2", "T3"], [10.0, 20.0, 30.0], ["2024-01-01"] * 3)
+    delta = transactions(["T2", "T4", "T4"], [25.0, 40.0, 45.0], ["2024-02-01"] * 3)
+    streamed = pd.concat(list(merge_batches([snapshot.iloc[:2], snapshot.iloc[2:]], [delta.iloc[:1], delta.iloc[1:]], "transactions")))
+    expected = merge_snapshot(snapshot, delta, "transactions")
+    assert streamed.set_index("TransactionID")["Amount"].to_dict() == expected.set_index("TransactionID")["Amount"].to_dict()
+    assert streamed.set_index("TransactionID")["Amount"].to_dict() == {"T1": 10.0, "T2": 25.0, "T3": 30.0, "T4": 45.0}
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "csv"])
+def test_replacing_shard_rewrites_from_its_own_rows(workdir, fmt):
+    store = LayerStore(base_dir="data", fmt=fmt)
+    for key in ["hospital_a", "hospital_b"]:
+        store.write_shard("bronze", "transactions", transactions(["T1", "T2"], [10.0, 20.0], ["2024-01-01"] * 2, source=key), key)
+
+    with store.replacing_shard("bronze", "transactions", "hospital_a", batch_rows=1) as previous:
+        old = [batch.assign(source_db="hospital_a") for batch in previous]
+        assert len(store.read("bronze", "transactions")) == 2
+        merged = merge_batches(old, [transactions(["T2"], [25.0], ["2024-02-01"])], "transactions")
+        for i, batch in enumerate(merged):
+            store.write_shard("bronze", "transactions", batch, "hospital_a", append=i > 0)
+
+    rows = store.read("bronze", "transactions")
+    assert rows.groupby("source_db", observed=True)["Amount"].sum().to_dict() == {"hospital_a": 35.0, "hospital_b": 30.0}
+
+
+def test_replacing_shard_restores_the_shard_on_failure(workdir):
+    store = LayerStore(base_dir="data", fmt="parquet")
+    store.write_shard("bronze", "transactions", transactions(["T1"], [10.0], ["2024-01-01"]), "hospital_a")
+    with pytest.raises(RuntimeError):
+        with store.replacing_shard("bronze", "transactions", "hospital_a") as previous:
+            store.write_shard("bronze", "transactions", next(iter(previous)).iloc[:0], "hospital_a")
+            raise RuntimeError("extract failed")
+    assert store.read("bronze", "transactions")["TransactionID"].tolist() == ["T1"]
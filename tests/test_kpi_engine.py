@@ -0,0 +1,99 @@
+import sqlite3
+import pandas as pd
+import pytest
+from src.analytics.kpi_engine import LocalKPIEngine
+from src.models.aggregates import AGGREGATES, AggregateBuilder
+from src.models.fact_builder import date_keys
+
+# The KPI definitions as SQL over the gold tables; sums of no rows count as 0.
+SQL = {
+    "total_revenue": "SELECT IFNULL(SUM(amount), 0) FROM fact_transactions",
+    "total_paid": "SELECT IFNULL(SUM(paidamount), 0) FROM fact_transactions",
+    "transaction_count": "SELECT COUNT(*) FROM fact_transactions",
+    "transacting_patients": "SELECT COUNT(DISTINCT unified_patient_id) FROM fact_transactions",
+    "claim_count": "SELECT COUNT(*) FROM fact_claims",
+    "approval_rate": "SELECT COUNT(CASE WHEN claimstatus = 'Approved' THEN 1 END) * 100.0 / NULLIF(COUNT(*), 0) FROM fact_claims",
+    "denial_rate": "SELECT COUNT(CASE WHEN claimstatus = 'Denied' THEN 1 END) * 100.0 / NULLIF(COUNT(*), 0) FROM fact_claims",
+    "unique_patients": "SELECT COUNT(DISTINCT COALESCE(CAST(enterprise_patient_id AS TEXT), unified_patient_id)) "
+                       "FROM dim_patients_scd WHERE is_current"
+}
+GROUPED_SQL = {
+    "revenue_by_hospital": ("source_db", "SELECT source_db, SUM(amount) FROM fact_transactions GROUP BY source_db"),
+    "revenue_by_payor": ("payorid", "SELECT payorid, SUM(amount) FROM fact_transactions GROUP BY payorid"),
+    "revenue_by_month": ("month", "SELECT CAST(strftime('%Y%m', transaction_date) AS INTEGER), SUM(amount) "
+                                  "FROM fact_transactions GROUP BY 1")
+}
+
+
+def facts():
+    dates = pd.to_datetime(pd.Series(["2024-01-05", "2024-01-31", "2024-02-29", None, "2024-02-01"]))
+    transactions = pd.DataFrame({
+        "source_db": ["hospital_a", "hospital_a", "hospital_b", "hospital_b", "hospital_b"],
+        "payorid": ["P1", "P2", "P1", "P3", None],
+        "deptid": ["D1", "D1", "D2", "D2", "D2"],
+        "transaction_date": dates,
+        "date_key": date_keys(dates),
+        "amount": [100.0, 250.0, 80.0, 40.0, 30.0],
+        "paidamount": [100.0, 0.0, 80.0, None, 30.0],
+        "unified_patient_id": ["a-1", "a-2", "b-1", "b-1", None]
+    })
+    claims = pd.DataFrame({
+        "claimstatus": ["Approved", "Denied", "Approved", "Pending", None],
+        "payortype": ["Private", "Government", "Private", "Private", None],
+        "date_key": pd.array([20240105, 20240131, None, 20240229, 20240201], dtype="Int32"),
+        "claimamount": [100.0, 80.0, 60.0, 10.0, 5.0],
+        "paidamount": [100.0, 0.0, 60.0, 0.0, 0.0]
+    })
+    patients = pd.DataFrame({
+        "unified_patient_id": ["a-1", "b-1", "a-2", "a-2", "c-1"],
+        "enterprise_patient_id": pd.array([1, 1, None, None, 2], dtype="Int64"),
+        "is_current": [True, True, False, True, True]
+    })
+    return {"fact_transactions": transactions, "fact_claims": claims, "dim_patients_scd": patients}
+
+
+def empty_facts():
+    return {name: df.iloc[:0] for name, df in facts().items()}
+
+
+def sql_kpis(frames):
+    with sqlite3.connect(":memory:") as conn:
+        for name, df in frames.items():
+            df.to_sql(name, conn, index=False)
+        scalars = {kpi: conn.execute(query).fetchone()[0] for kpi, query in SQL.items()}
+        grouped = {kpi: dict(conn.execute(query).fetchall()) for kpi, (_, query) in GROUPED_SQL.items()}
+    return scalars, grouped
+
+
+def with_aggregates(frames):
+    builder = AggregateBuilder()
+    frames = dict(frames)
+    frames.update({name: builder.aggregate(name, frames[spec["fact"]]) for name, spec in AGGREGATES.items()})
+    return frames
+
+
+@pytest.mark.parametrize("source", [facts, empty_facts])
+@pytest.mark.parametrize("aggregated", [False, True])
+def test_local_kpis_match_their_sql_definitions(source, aggregated):
+    frames = source()
+    scalars, grouped = sql_kpis(frames)
+    kpis = LocalKPIEngine(frames=with_aggregates(frames) if aggregated else frames).compute()
+
+    for kpi, expected in scalars.items():
+        assert kpis[kpi] == pytest.approx(expected), kpi
+    for kpi, (column, _) in GROUPED_SQL.items():
+        result = kpis[kpi]
+        # Rows without a date or payor are reported under a null group, as SQL groups them.
+        local = {None if pd.isna(key) else key: value for key, value in zip(result[column], result["revenue"])}
+        assert local == pytest.approx(grouped[kpi]), kpi
+
+
+def test_rates_of_no_rows_are_null():
+    kpis = LocalKPIEngine(frames=empty_facts()).compute()
+    assert kpis["collection_rate"] is None
+    assert kpis["approval_rate"] is None and kpis["denial_rate"] is None
+
+
+def test_parity_on_hand_computed_frames():
+    parity = LocalKPIEngine(frames=with_aggregates(facts())).parity()
+    assert parity["match"].all() and len(parity) == 7
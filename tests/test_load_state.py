@@ -0,0 +1,27 @@
+import pandas as pd
+from src.load.load_state import NULL_PARTITION, LoadState, changed_partitions, partition_fingerprints, partition_keys
+
+
+def test_partition_keys_name_days_and_nulls():
+    keys = partition_keys(pd.to_datetime(pd.Series(["2024-03-01 10:30", None, "2024-12-31 00:00"])))
+    assert keys.tolist() == ["20240301", NULL_PARTITION, "20241231"]
+
+
+def test_fingerprints_ignore_row_order_and_catch_edits():
+    df = pd.DataFrame({"day": pd.to_datetime(["2024-03-01", "2024-03-01", "2024-03-02"]), "amount": [1.0, 2.0, 3.0]})
+    current = partition_fingerprints(df, partition_keys(df["day"]))
+    shuffled = df.iloc[[2, 0, 1]]
+    assert partition_fingerprints(shuffled, partition_keys(shuffled["day"])) == current
+
+    edited = df.assign(amount=[1.0, 2.5, 3.0])
+    assert changed_partitions(current, partition_fingerprints(edited, partition_keys(edited["day"]))) == ["20240301"]
+    assert changed_partitions(current, partition_fingerprints(df.iloc[:2], partition_keys(df["day"].iloc[:2]))) == ["20240302"]
+
+
+def test_load_state_round_trip(workdir):
+    state = LoadState("sqlite")
+    assert state.load("gold.t") is None
+    state.save("gold.t", "abc", {"20240301": "1:1"})
+    assert state.load("gold.t") == {"schema": "abc", "partitions": {"20240301": "1:1"}}
+    state.clear("gold.t")
+    assert state.load("gold.t") is None
@@ -0,0 +1,73 @@
+import sqlite3
+import pandas as pd
+import pytest
+from src.load.backends import SQLiteBackend
+from src.load.loader import Loader
+
+
+def transactions():
+    return pd.DataFrame({
+        "transactionid": ["T1", "T2", "T3"],
+        "transaction_date": pd.to_datetime(["2024-03-01", "2024-03-01", "2024-03-02"]),
+        "amount": [10.0, 20.0, 30.0]
+    })
+
+
+def loader(workdir, incremental):
+    return Loader(backend=SQLiteBackend(base_dir=str(workdir / "warehouse")), max_workers=1, incremental=incremental)
+
+
+def test_full_load_records_partition_state(workdir):
+    loader(workdir, False).load_table(transactions(), "fact_transactions", "transaction_date")
+    _, sent = loader(workdir, True).load_table(transactions(), "fact_transactions", "transaction_date")
+    assert sent == 0
+
+
+class FlakyBackend(SQLiteBackend):
+    def __init__(self, base_dir, errors):
+        super().__init__(base_dir)
+        self.errors = list(errors)
+        self.calls = 0
+
+    def submit(self, *args, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return super().submit(*args, **kwargs)
+
+
+def test_retries_only_lock_errors(workdir, monkeypatch):
+    monkeypatch.setattr("src.load.loader.time.sleep", lambda seconds: None)
+    backend = FlakyBackend(str(workdir / "warehouse"), [sqlite3.OperationalError("database is locked")])
+    stats = Loader(backend=backend, retries=2, incremental=False)._load_with_retry(transactions(), "fact_transactions")
+    assert stats["attempts"] == 2 and stats["rows_sent"] == 3
+
+    backend = FlakyBackend(str(workdir / "warehouse"), [sqlite3.OperationalError("no such table: fact_transactions")])
+    with pytest.raises(sqlite3.OperationalError):
+        Loader(backend=backend, retries=2, incremental=False)._load_with_retry(transactions(), "fact_transactions")
+    assert backend.calls == 1
+
+
+def test_load_tables_loads_each_table_and_reports_failures(workdir):
+    backend = SQLiteBackend(base_dir=str(workdir / "warehouse"))
+    report = Loader(backend=backend, max_workers=2, incremental=False).load_tables({
+        "fact_transactions": transactions(),
+        "dim_providers": lambda: pd.DataFrame({"providerid": ["D1", "D2"]})
+    })
+    assert sorted((stats["table"], stats["rows_sent"]) for stats in report) == [("dim_providers", 2), ("fact_transactions", 3)]
+    assert backend.read("gold.fact_transactions")["amount"].sum() == 60.0
+
+    failing = FlakyBackend(str(workdir / "warehouse"), [ValueError("bad frame")])
+    with pytest.raises(RuntimeError, match="fact_transactions"):
+        Loader(backend=failing, max_workers=1, incremental=False).load_tables({"fact_transactions": transactions()})
+
+
+def test_incremental_load_replaces_only_changed_partitions(workdir):
+    loader(workdir, True).load_table(transactions(), "fact_transactions", "transaction_date")
+    edited = transactions()
+    edited.loc[2, "amount"] = 35.0
+    _, sent = loader(workdir, True).load_table(edited, "fact_transactions", "transaction_date")
+    assert sent == 1
+
+    loaded = SQLiteBackend(base_dir=str(workdir / "warehouse")).read("gold.fact_transactions")
+    assert sorted(loaded["amount"]) == [10.0, 20.0, 35.0]
@@ -0,0 +1,115 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+import pandas as pd
+import pytest
+from src.analytics.query_cache import QueryCache, QueryExecutor
+
+REVENUE = "SELECT SUM(revenue) AS revenue FROM `project.gold.agg_daily_revenue`"
+CLAIMS = "SELECT SUM(claims) AS claims FROM `project.gold.agg_daily_claims`"
+PATIENTS = "SELECT COUNT(*) AS patients FROM `project.gold.dim_patients_scd`"
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeClient:
+    # Stands in for bigquery.Client: tables have a last-modified time, queries return one-row frames.
+    def __init__(self):
+        self.modified = {}
+        self.events = []
+
+    def get_table(self, table_id):
+        return SimpleNamespace(modified=self.modified.get(table_id, datetime(2024, 1, 1, tzinfo=timezone.utc)))
+
+    def query(self, query):
+        self.events.append(("submit", query))
+
+        def result():
+            self.events.append(("result", query))
+            return SimpleNamespace(to_dataframe=lambda: pd.DataFrame({"value": [len(query)]}))
+        return SimpleNamespace(result=result)
+
+    def submitted(self):
+        return [query for event, query in self.events if event == "submit"]
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def frame(size):
+    return pd.DataFrame({"value": range(size)})
+
+
+def test_entries_expire_after_their_ttl(workdir, clock):
+    cache = QueryCache(cache_dir="cache", ttl=60, clock=clock)
+    cache.put("a", frame(3))
+    clock.now += 59
+    assert cache.get("a")["value"].tolist() == [0, 1, 2]
+    clock.now += 2
+    assert cache.get("a") is None
+    # The expiry is persisted, so a new cache over the same directory misses too.
+    assert "a" not in QueryCache(cache_dir="cache", ttl=60, clock=clock).entries
+
+
+def test_least_recently_used_entries_are_evicted_first(workdir, clock):
+    cache = QueryCache(cache_dir="cache", ttl=3600, max_bytes=10 ** 9, clock=clock)
+    for key in ["a", "b", "c"]:
+        cache.put(key, frame(100))
+        clock.now += 1
+    cache.get("a")
+    clock.now += 1
+    cache.max_bytes = cache.entries["a"]["bytes"] + cache.entries["c"]["bytes"]
+    cache.evict()
+    assert sorted(cache.entries) == ["a", "c"]
+    assert cache.get("b") is None and cache.get("a") is not None
+
+
+def test_run_many_submits_misses_together_and_keeps_query_order(workdir, clock):
+    client = FakeClient()
+    executor = QueryExecutor(client, QueryCache(cache_dir="cache", ttl=3600, clock=clock))
+    queries = {"Revenue": REVENUE, "Claims": CLAIMS}
+    first = executor.run_many(queries)
+    # Both jobs are submitted before either result is waited on.
+    assert [event for event, _ in client.events] == ["submit", "submit", "result", "result"]
+
+    client.events.clear()
+    second = executor.run_many({"Patients": PATIENTS, **queries})
+    assert client.submitted() == [PATIENTS]
+    assert list(second) == ["Patients", "Revenue", "Claims"]
+    for name in queries:
+        pd.testing.assert_frame_equal(second[name], first[name])
+
+
+def test_changed_table_invalidates_only_its_queries(workdir, clock):
+    client = FakeClient()
+    executor = QueryExecutor(client, QueryCache(cache_dir="cache", ttl=3600, clock=clock))
+    executor.run_many({"Revenue": REVENUE, "Claims": CLAIMS})
+
+    client.events.clear()
+    client.modified["project.gold.agg_daily_claims"] = datetime(2024, 2, 1, tzinfo=timezone.utc)
+    executor.run_many({"Revenue": REVENUE, "Claims": CLAIMS})
+    assert client.submitted() == [CLAIMS]
+
+
+def test_failed_query_returns_none_and_is_not_cached(workdir, clock):
+    client = FakeClient()
+    query = client.query
+
+    def failing(sql):
+        if sql == CLAIMS:
+            raise RuntimeError("quota exceeded")
+        return query(sql)
+
+    client.query = failing
+    executor = QueryExecutor(client, QueryCache(cache_dir="cache", ttl=3600, clock=clock))
+    results = executor.run_many({"Claims": CLAIMS, "Revenue": REVENUE})
+    assert list(results) == ["Claims", "Revenue"]
+    assert results["Claims"] is None and results["Revenue"] is not None
+    assert len(executor.cache.entries) == 1
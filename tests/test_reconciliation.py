@@ -0,0 +1,76 @@
+import pandas as pd
+from src.models.reconciliation import TABLE, ClaimReconciler
+from src.models.schema_definitions import apply_schema
+
+
+def claims():
+    return apply_schema(pd.DataFrame({
+        "source_db": ["hospital_a"] * 4 + ["hospital_b"],
+        "claimid": ["C1", "C2", "C3", "C4", "C1"],
+        "unified_patient_id": ["P"] * 5,
+        "transactionid": ["T1", "T2", None, None, "T1"],
+        "claim_date": pd.to_datetime(["2024-01-05"] * 5),
+        "claimstatus": ["Paid", "Paid", "Paid", "Denied", "Paid"],
+        "payorid": ["Aetna"] * 5,
+        "claimamount": [100.0, 100.0, 100.0, 80.0, 100.0],
+        "paidamount": [100.0, 100.0, 90.0, 0.0, 100.0],
+        "deductible": [0.0, 0.0, 10.0, 0.0, 0.0],
+        "coinsurance": [0.0] * 5,
+        "copay": [0.0] * 5
+    }), "silver", "claims")
+
+
+def transactions():
+    return apply_schema(pd.DataFrame({
+        "source_db": ["hospital_a"] * 4,
+        "transactionid": ["T1", "T2", "T3", "T4"],
+        "unified_patient_id": ["P"] * 4,
+        "claimid": ["C1", None, "C3", None],
+        "transaction_date": pd.to_datetime(["2024-01-01"] * 4),
+        "amount": [100.0, 100.0, 100.0, 40.0],
+        "paidamount": [100.0, 50.0, 90.0, 40.0]
+    }), "silver", "transactions")
+
+
+def reconcile(store):
+    summary = ClaimReconciler(store, buckets=4, state_dir="data/state/reconciliation").run()
+    rows = store.read("gold", TABLE)
+    rows = rows.set_index(rows["source_db"].astype(str) + "/" + rows["claimid"].fillna(rows["transactionid"]).astype(str))
+    return summary, rows
+
+
+def test_match_types_and_statuses(store):
+    store.write("silver", "claims_cleaned", claims())
+    store.write("silver", "transactions_cleaned", transactions())
+    _, rows = reconcile(store)
+
+    assert rows["match_type"].astype(str).to_dict() == {
+        "hospital_a/C1": "matched",
+        "hospital_a/C2": "claim_to_transaction",
+        "hospital_a/C3": "transaction_to_claim",
+        "hospital_a/C4": "orphan_claim",
+        # T1 exists only in hospital_a, so hospital_b's C1 does not link to it.
+        "hospital_b/C1": "orphan_claim",
+        "hospital_a/T4": "orphan_transaction"
+    }
+    status = rows["reconciliation_status"].astype(str)
+    assert status["hospital_a/C1"] == "paid"
+    assert status["hospital_a/C2"] == "underpaid" and rows.loc["hospital_a/C2", "payment_variance"] == -50.0
+    assert status["hospital_a/C3"] == "paid"
+    assert status["hospital_a/C4"] == "unpaid"
+    assert status["hospital_a/T4"] == "unclaimed"
+
+
+def test_summary_matches_the_table_across_incremental_runs(store):
+    store.write("silver", "claims_cleaned", claims())
+    store.write("silver", "transactions_cleaned", transactions())
+    reconcile(store)
+
+    changed = claims()
+    changed.loc[changed["claimid"] == "C2", "claimamount"] = 50.0
+    store.write("silver", "claims_cleaned", changed)
+    for _ in range(2):
+        summary, rows = reconcile(store)
+        counts = rows.groupby(["match_type", "reconciliation_status"], observed=True).size()
+        assert summary.set_index(["match_type", "reconciliation_status"])["rows"].to_dict() == counts.to_dict()
+    assert rows.loc["hospital_a/C2", "reconciliation_status"] == "paid"
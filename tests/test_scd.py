@@ -0,0 +1,53 @@
+import pandas as pd
+from src.models.scd import SCD2Engine
+from src.models.surrogate_keys import SurrogateKeyMap
+
+
+def patients(**changes):
+    df = pd.DataFrame({
+        "unified_patient_id": ["hospital_a-P1", "hospital_a-P2"],
+        "enterprise_patient_id": [1, 2],
+        "first_name": ["Ann", "Bob"],
+        "last_name": ["Lee", "Ray"],
+        "DOB": pd.to_datetime(["1980-01-01", "1975-05-05"]),
+        "gender": ["Female", "Male"],
+        "phone": ["+1-5550000001", "+1-5550000002"],
+        "age": [44, 49],
+        "source_db": ["hospital_a", "hospital_a"]
+    })
+    for col, values in changes.items():
+        df[col] = values
+    return df
+
+
+def engine(store=None):
+    return SCD2Engine(store=store, keys=SurrogateKeyMap("patients"), buckets=4)
+
+
+def test_hash_diff_versions_only_tracked_changes(workdir):
+    first = engine().merge(patients(), as_of=pd.Timestamp("2024-01-01"))
+    assert len(first) == 2 and first["is_current"].all()
+
+    # A new phone is tracked and opens a version; a new age is not and does not.
+    second = engine().merge(patients(phone=["+1-5559999999", "+1-5550000002"], age=[45, 50]), history=first,
+                            as_of=pd.Timestamp("2024-02-01"))
+    ann = second[second["unified_patient_id"] == "hospital_a-P1"].sort_values("effective_date")
+    bob = second[second["unified_patient_id"] == "hospital_a-P2"]
+    assert ann["is_current"].tolist() == [False, True]
+    assert ann["end_date"].iloc[0] == pd.Timestamp("2024-02-01") and pd.isna(ann["end_date"].iloc[1])
+    assert ann["phone"].iloc[1] == "+1-5559999999"
+    assert ann["patient_key"].nunique() == 1
+    assert len(bob) == 1 and bob["is_current"].all()
+
+
+def test_apply_rewrites_only_changed_patients(store):
+    engine(store).apply(patients(), as_of=pd.Timestamp("2024-01-01"))
+    assert engine(store).apply(patients(), as_of=pd.Timestamp("2024-02-01")).empty
+
+    written = engine(store).apply(patients(last_name=["Lee", "Roy"]), as_of=pd.Timestamp("2024-03-01"))
+    assert written["unified_patient_id"].tolist() == ["hospital_a-P2", "hospital_a-P2"]
+    history = store.read("gold", "dim_patients_scd")
+    assert len(history) == 3
+    current = history[history["is_current"]].set_index("unified_patient_id")
+    assert current.loc["hospital_a-P2", "last_name"] == "Roy"
+    assert current["patient_key"].tolist() == sorted(current["patient_key"].tolist())
@@ -0,0 +1,20 @@
+import pandas as pd
+from src.models.schema_definitions import apply_schema, concat_frames, empty_frame
+
+
+def test_apply_schema_leaves_the_input_untouched():
+    raw = pd.DataFrame({"DOB": ["1980-03-15"], "Gender": ["F"]})
+    typed = apply_schema(raw, "raw", "patients")
+    assert raw["DOB"].tolist() == ["1980-03-15"]
+    assert pd.api.types.is_datetime64_any_dtype(typed["DOB"])
+
+
+def test_concat_frames_leaves_inputs_untouched_and_skips_empty_frames():
+    first = pd.DataFrame({"source_db": pd.Categorical(["hosp-a"])})
+    second = pd.DataFrame({"source_db": pd.Categorical(["hosp-b"])})
+    empty = empty_frame("raw", "patients")
+    combined = concat_frames([empty, first, second])
+    assert combined["source_db"].tolist() == ["hosp-a", "hosp-b"]
+    assert list(first["source_db"].cat.categories) == ["hosp-a"]
+
+    assert list(concat_frames([empty, empty]).columns) == list(empty.columns)
@@ -0,0 +1,63 @@
+import pytest
+from src.extract.extractor import Extractor
+from src.utils.shards import run_shard
+from src.utils.synthetic_data import SyntheticDataGenerator
+from config.db_config import load_hospitals
+
+
+@pytest.fixture
+def hospital(workdir, monkeypatch):
+    monkeypatch.setenv("USE_MYSQL", "false")
+    SyntheticDataGenerator(output_dir="data/raw", scale=0.02, hospitals=1, seed=1).generate()
+    return load_hospitals("data/raw/hospitals.json")[0]
+
+
+@pytest.mark.parametrize("stream", [False, True])
+@pytest.mark.parametrize("incremental", ["false", "true"])
+def test_shard_without_claims_file(hospital, store, monkeypatch, stream, incremental):
+    monkeypatch.setenv("INCREMENTAL_EXTRACT", incremental)
+    run_shard(hospital, stream)
+    assert len(store.read("silver", "claims_cleaned")) > 0
+
+    tables = run_shard({**hospital, "claims_file": None}, stream)["tables"].set_index("table")
+    assert tables.loc["transactions", "rows"] > 0
+    assert tables.loc["claims", "rows"] == 0
+    assert store.read("silver", "claims_cleaned").empty
+
+
+def test_silver_fingerprint_ignores_batching(hospital, monkeypatch):
+    fingerprints = []
+    for chunk_size in ["7", "1000"]:
+        monkeypatch.setenv("EXTRACT_CHUNK_SIZE", chunk_size)
+        streamed = run_shard(hospital, stream=True)["tables"].set_index("table")["fingerprint"]
+        fingerprints.append(streamed)
+    whole = run_shard(hospital, stream=False)["tables"].set_index("table")["fingerprint"]
+    assert fingerprints[0].equals(fingerprints[1])
+    assert fingerprints[0][["transactions", "claims"]].equals(whole[["transactions", "claims"]])
+
+
+def test_stream_hospital_yields_bounded_batches(hospital):
+    extractor = Extractor(chunk_size=7, hospitals=[hospital])
+    sizes = {}
+    for table, batch in extractor.stream_hospital(hospital["key"]):
+        assert 0 < len(batch) <= 7
+        assert (batch["source_db"] == hospital["key"]).all()
+        sizes.setdefault(table, []).append(len(batch))
+    whole = extractor.run(reference=False)
+    for table, batches in sizes.items():
+        assert len(batches) > 1 and sum(batches) == len(whole[table])
+
+
+def test_failed_stream_fails_the_shard(hospital, monkeypatch):
+    stream_csv = Extractor.stream_csv
+
+    def failing(self, hospital_key, table):
+        batches = stream_csv(self, hospital_key, table)
+        yield next(batches)
+        if table == "transactions":
+            raise OSError("connection lost")
+        yield from batches
+
+    monkeypatch.setattr(Extractor, "stream_csv", failing)
+    with pytest.raises(OSError):
+        run_shard(hospital, stream=True)
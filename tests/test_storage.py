@@ -0,0 +1,93 @@
+import os
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+from src.models.schema_definitions import apply_schema
+
+
+def transactions():
+    return apply_schema(pd.DataFrame({
+        "transactionid": ["T1", "T2", "T3", "T4"],
+        "source_db": ["hospital_a", "hospital_a", "hospital_b", "hospital_b"],
+        "transaction_date": pd.to_datetime(["2024-01-05", "2024-02-01", "2024-01-20", None]),
+        "amount": [10.0, 20.0, 30.0, 40.0],
+        "date_key": pd.array([20240105, 20240201, 20240120, None], dtype="Int32")
+    }), "gold", "fact_transactions")
+
+
+def daily(month_key, revenue):
+    return apply_schema(pd.DataFrame({
+        "date_key": [month_key * 100 + 1], "month_key": [month_key],
+        "source_db": ["hospital_a"], "deptid": ["D1"], "revenue": [revenue], "paid": [0.0], "transactions": [1]
+    }), "gold", "agg_daily_revenue")
+
+
+def by_id(df):
+    return df.sort_values("transactionid").reset_index(drop=True)
+
+
+def test_partitioned_round_trip_keeps_rows_and_dtypes(store):
+    df = transactions()
+    path = store.write("gold", "fact_transactions", df)
+    assert os.path.isdir(os.path.join(path, "source_db=hospital_a", "transaction_date_year=2024", "transaction_date_month=1"))
+
+    loaded = store.read("gold", "fact_transactions")
+    # Partition columns derived from the date are not handed back; source_db comes back from its directory.
+    assert sorted(loaded.columns) == sorted(df.columns)
+    loaded = by_id(loaded[df.columns])
+    pd.testing.assert_series_equal(loaded.dtypes, df.dtypes)
+    pd.testing.assert_frame_equal(loaded, by_id(df), check_categorical=False)
+
+
+def test_filters_prune_partitions(store):
+    store.write("gold", "fact_transactions", transactions())
+    filters = [("source_db", "=", "hospital_a"), ("transaction_date_month", "=", 1)]
+    assert store.read("gold", "fact_transactions", filters=filters)["transactionid"].tolist() == ["T1"]
+
+    dataset = store._dataset(store.path("gold", "fact_transactions"))
+    fragments = list(dataset.get_fragments(filter=pq.filters_to_expression(filters)))
+    assert len(fragments) == 1 and "source_db=hospital_a" in fragments[0].path
+
+
+def test_replace_partitions_only_touches_given_partitions(store):
+    store.write("gold", "agg_daily_revenue", pd.concat([daily(202401, 1.0), daily(202402, 2.0), daily(202403, 3.0)]))
+    # February is rewritten, March is listed without rows and dropped, January is left alone.
+    store.replace_partitions("gold", "agg_daily_revenue", daily(202402, 20.0), "month_key", values=[202402, 202403])
+
+    loaded = store.read("gold", "agg_daily_revenue").sort_values("month_key")
+    assert loaded["month_key"].tolist() == [202401, 202402]
+    assert loaded["revenue"].tolist() == [1.0, 20.0]
+    assert not os.path.exists(os.path.join(store.path("gold", "agg_daily_revenue"), "month_key=202403"))
+
+
+def test_shards_are_replaced_in_place(store):
+    df = transactions()
+    for key in ["hospital_a", "hospital_b"]:
+        store.write_shard("bronze", "transactions", df[df["source_db"] == key], key)
+
+    with store.replacing_shard("bronze", "transactions", "hospital_a", batch_rows=1) as previous:
+        batches = list(previous)
+        assert [len(batch) for batch in batches] == [1, 1]
+        store.write_shard("bronze", "transactions", pd.concat(batches).assign(amount=99.0), "hospital_a")
+
+    loaded = store.read("bronze", "transactions")
+    assert loaded.loc[loaded["source_db"] == "hospital_a", "amount"].tolist() == [99.0, 99.0]
+    assert loaded.loc[loaded["source_db"] == "hospital_b", "amount"].tolist() == [30.0, 40.0]
+
+
+def test_failed_shard_rewrite_restores_the_old_rows(store):
+    df = transactions()
+    store.write_shard("bronze", "transactions", df[df["source_db"] == "hospital_a"], "hospital_a")
+    with pytest.raises(OSError):
+        with store.replacing_shard("bronze", "transactions", "hospital_a") as previous:
+            store.write_shard("bronze", "transactions", next(previous).iloc[:1], "hospital_a")
+            raise OSError("connection lost")
+    assert sorted(store.read("bronze", "transactions")["transactionid"]) == ["T1", "T2"]
+
+
+def test_scan_yields_bounded_typed_batches(store):
+    df = transactions()
+    store.write("gold", "fact_transactions", df)
+    batches = list(store.scan("gold", "fact_transactions", batch_rows=1))
+    assert sum(len(batch) for batch in batches) == 4 and all(len(batch) <= 1 for batch in batches)
+    assert all(batch["source_db"].dtype == "category" and batch["amount"].dtype == "float64" for batch in batches)
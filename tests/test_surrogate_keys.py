@@ -0,0 +1,19 @@
+import numpy as np
+from src.models.surrogate_keys import SurrogateKeyMap
+
+
+def test_keys_are_stable_and_persisted(workdir):
+    keys = SurrogateKeyMap("patients")
+    first = keys.assign(["b", "a", None, "b"])
+    assert first.tolist() == [1, 0, -1, 1]
+
+    reloaded = SurrogateKeyMap("patients")
+    assert reloaded.assign(["c", "a"]).tolist() == [2, 0]
+    assert reloaded.lookup(["a", "b", "c", "d"]).tolist() == [0, 1, 2, -1]
+
+
+def test_register_keeps_existing_keys(workdir):
+    keys = SurrogateKeyMap("providers")
+    keys.register(["x", "y"], np.array([10, 11]))
+    assert keys.assign(["y", "z"]).tolist() == [11, 12]
+    assert keys.to_series(["x", None]).tolist()[0] == 10
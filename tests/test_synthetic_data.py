@@ -0,0 +1,59 @@
+import filecmp
+import json
+import os
+import pandas as pd
+import pytest
+from src.utils.synthetic_data import SyntheticDataGenerator
+
+
+def generate(path, seed=42):
+    SyntheticDataGenerator(output_dir=str(path), scale=0.05, hospitals=2, seed=seed).generate()
+    with open(os.path.join(path, "hospitals.json")) as f:
+        return json.load(f)
+
+
+def csv_files(path):
+    return sorted(os.path.relpath(os.path.join(root, name), path)
+                  for root, _, names in os.walk(path) for name in names if name.endswith(".csv"))
+
+
+@pytest.fixture(scope="module")
+def raw_dir(tmp_path_factory):
+    path = tmp_path_factory.mktemp("raw")
+    generate(path)
+    return path
+
+
+def test_same_seed_gives_identical_files(raw_dir, tmp_path):
+    generate(tmp_path)
+    files = csv_files(raw_dir)
+    assert files == csv_files(tmp_path)
+    _, mismatch, errors = filecmp.cmpfiles(raw_dir, tmp_path, files, shallow=False)
+    assert mismatch == [] and errors == []
+
+
+def test_other_seed_gives_other_data(raw_dir, tmp_path):
+    generate(tmp_path, seed=7)
+    path = os.path.join("hospital_a", "transactions.csv")
+    assert not filecmp.cmp(raw_dir / path, tmp_path / path, shallow=False)
+
+
+def test_keys_resolve_within_each_hospital(raw_dir):
+    config = json.load(open(raw_dir / "hospitals.json"))
+    for hospital in config["hospitals"]:
+        base = raw_dir / hospital["csv_dir"]
+        patients = pd.read_csv(base / "patients.csv", dtype=str)
+        patient_ids = patients["PatientID" if "PatientID" in patients.columns else "ID"]
+        providers = pd.read_csv(base / "providers.csv", dtype=str)
+        encounters = pd.read_csv(base / "encounters.csv", dtype=str)
+        transactions = pd.read_csv(base / "transactions.csv", dtype=str)
+        claims = pd.read_csv(raw_dir / hospital["claims_file"], dtype=str)
+
+        assert patient_ids.is_unique and transactions["TransactionID"].is_unique and claims["ClaimID"].is_unique
+        assert claims["TransactionID"].isin(transactions["TransactionID"]).all()
+        linked = claims.merge(transactions, on="TransactionID", suffixes=("_claim", "_transaction"))
+        assert (linked["PatientID_claim"] == linked["PatientID_transaction"]).all()
+        assert transactions["PatientID"].isin(patient_ids).all()
+        assert transactions["EncounterID"].isin(encounters["EncounterID"]).all()
+        assert transactions["ProviderID"].isin(providers["ProviderID"]).all()
+        assert encounters["PatientID"].isin(patient_ids).all()